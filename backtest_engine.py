@@ -2,6 +2,59 @@
 import numpy as np
 import polars as pl
 
+from result_cache import make_key
+from metrics import compute_metrics
+from instrumentation import instrument, symbol_from_path
+
+def _strategy_symbol(engine, *args, **kwargs):
+    return symbol_from_path(getattr(engine.strategy.data_handler, 'data_path', None))
+
+
+def _result_rows(result, *args, **kwargs):
+    return None if result is None else len(result)
+
+
+LEDGER_COLUMNS = ('EntryDate', 'ExitDate', 'Side', 'EntryPrice', 'ExitPrice',
+                  'HoldingBars', 'PnL', 'Return', 'Open')
+
+
+def extract_round_trips(dates, execution_price, position, strategy_returns):
+    """由持仓变化提取逐笔交易(每段连续的非零持仓为一笔)
+
+    持仓在变化当根K线以执行价成交：第i根K线持仓变为非零即在执行价[i]开仓，
+    持仓再次变化的第j根K线在执行价[j]平仓(反手时同一根K线平旧仓、开新仓)。
+    期末仍未平仓的交易以最后一根K线的执行价计价，Open为True。
+
+    Returns:
+        pl.DataFrame: 每笔交易一行，列见LEDGER_COLUMNS
+    """
+    n_bars = len(position)
+    # 持仓变化点划分出的各段[start, end)
+    changes = np.flatnonzero(np.diff(position)) + 1
+    starts = np.concatenate(([0], changes)) if n_bars else changes
+    ends = np.concatenate((changes, [n_bars])) if n_bars else changes  # 无K线时为空台账
+    held = position[starts] != 0
+    starts, ends = starts[held], ends[held]
+
+    exits = np.minimum(ends, n_bars - 1)
+    side = position[starts]
+    entry_price = execution_price[starts]
+    exit_price = execution_price[exits]
+    # 每笔收益由净值曲线首尾相除得到(复利，与StrategyReturn一致)
+    equity = np.concatenate(([1.0], np.cumprod(1 + strategy_returns)))
+    return pl.DataFrame({
+        'EntryDate': dates[starts],
+        'ExitDate': dates[exits],
+        'Side': side.astype(np.int8),
+        'EntryPrice': entry_price,
+        'ExitPrice': exit_price,
+        'HoldingBars': (exits - starts).astype(np.int64),
+        'PnL': side * (exit_price - entry_price),
+        'Return': equity[ends] / equity[starts] - 1,
+        'Open': ends == n_bars
+    })
+
+
 class BacktestEngine:
     """Backtesting engine for evaluating trading strategies.
 
@@ -13,32 +66,94 @@ class BacktestEngine:
         returns: Array of strategy returns
         cumulative_returns: Array of compounded returns
         trades: Array of trade records
+        cache: Optional ResultCache for backtest arrays
     """
-    def __init__(self, strategy_core):
+    def __init__(self, strategy_core, cache=None):
         self.strategy = strategy_core
-    
+        self.cache = cache
+
+    @instrument('BacktestEngine.run_backtest', symbol=_strategy_symbol,
+                rows=lambda result, self: None if result is None else len(result['Close']))
     def run_backtest(self):
         """执行回测"""
         if self.strategy.processed_data is None:
             return None
+        key = self.cache_key()
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.strategy.processed_data.update(cached)
+                return self.strategy.processed_data
         #计算回测执行价格
         execution_price = self.strategy.processed_data['ExecutionPrice']  # 使用ExecutionPrice
         position = self.strategy.processed_data['Position']
-        returns = execution_price[1:] / execution_price[:-1] - 1
-        returns = np.append(returns, 0)
+        graph = getattr(self.strategy, 'graph', None)
+        if graph is not None and graph.cached('execution_price', dtype=execution_price.dtype.name) is execution_price:
+            # 执行价格来自计算图时，逐K线收益也由计算图记忆(同一数据集上的回测共享)
+            returns = graph.get('bar_returns', dtype=execution_price.dtype.name)
+        else:
+            returns = execution_price[1:] / execution_price[:-1] - 1
+            returns = np.append(returns, 0).astype(execution_price.dtype, copy=False)
         #计算收益与累计收益
         strategy_returns = position * returns
         cumulative_returns = np.cumprod(1 + strategy_returns)
         # 返回执行价格与收益等数据
-        self.strategy.processed_data.update({
+        results = {
             'Return': returns,
             'StrategyReturn': strategy_returns,
             'CumulativeReturn': cumulative_returns
-        })
+        }
+        if key is not None:
+            self.cache.put(key, results, source=self.strategy.data_handler.data_path)
+        self.strategy.processed_data.update(results)
         return self.strategy.processed_data
 
-    def generate_trading_records(self):
-        """生成交易记录，获取所有行记录"""
+    @instrument('BacktestEngine.performance_metrics', symbol=_strategy_symbol)
+    def performance_metrics(self):
+        """回测绩效指标(年化收益/波动、夏普、索提诺、最大回撤及持续期、卡玛、胜率、换手、持仓占比)"""
+        data = self.strategy.processed_data
+        if data is None or 'StrategyReturn' not in data:
+            print("错误: 请先执行回测再计算绩效指标。")
+            return None
+        return compute_metrics(data['StrategyReturn'], data['Position'], data['CumulativeReturn'])
+
+    def cache_key(self):
+        """回测缓存键，与信号缓存键一一对应"""
+        if self.cache is None:
+            return None
+        signal_key = self.strategy.cache_key()
+        return None if signal_key is None else make_key(stage='backtest', signals=signal_key)
+
+    @instrument('BacktestEngine.trade_ledger', symbol=_strategy_symbol, rows=_result_rows)
+    def trade_ledger(self, path=None, verbose=False):
+        """逐笔交易台账：每笔开平仓一行(开平仓日期与价格、持仓K线数、盈亏)
+
+        Args:
+            path (str): 指定时将台账写入该Parquet文件
+            verbose (bool): 为True时打印台账
+        Returns:
+            pl.DataFrame: 台账，列见LEDGER_COLUMNS
+        """
+        data = self.strategy.processed_data
+        if data is None or 'StrategyReturn' not in data:
+            print("错误: 请先执行回测再生成交易台账。")
+            return None
+        ledger = extract_round_trips(data['Date'], data['ExecutionPrice'],
+                                     data['Position'], data['StrategyReturn'])
+        if path is not None:
+            ledger.write_parquet(path)
+        if verbose:
+            print(ledger)
+        return ledger
+
+    @instrument('BacktestEngine.generate_trading_records', symbol=_strategy_symbol, rows=_result_rows)
+    def generate_trading_records(self, verbose=False, to_pandas=False):
+        """生成逐K线交易记录(全部行)
+
+        Args:
+            verbose (bool): 为True时打印全部行
+            to_pandas (bool): 为True时返回pandas.DataFrame
+        """
         if self.strategy.processed_data is None:
             print("错误: 没有有效的数据，无法生成交易记录。")
             return None
@@ -55,8 +170,9 @@ class BacktestEngine:
         
         df = pl.DataFrame(records)
         
-        # 完整显示所有行，不省略
-        with pl.Config(tbl_rows=df.height):
-            print(df)
+        if verbose:
+            # 完整显示所有行，不省略
+            with pl.Config(tbl_rows=df.height):
+                print(df)
         
-        return df.to_pandas()
+        return df.to_pandas() if to_pandas else df
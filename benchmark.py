@@ -0,0 +1,561 @@
+# -*- coding: utf-8 -*-
+"""
+策略核心性能基准
+
+对比原逐元素Python循环实现与向量化内核(ewma_kernel / signal_positions)
+在不同数据规模下的耗时，并校验两者结果一致；--pipeline时在合成文件上
+逐阶段测量完整流程的耗时与内存。结果可写入JSON文件，并与基线文件比较、
+标出变慢的项目。
+
+用法：
+    python benchmark.py                      # 默认规模 10^4 ~ 10^7
+    python benchmark.py --sizes 10000 100000 --span 30
+    python benchmark.py --skip-kernels --pipeline --sizes 1000 100000 --output run.json
+    python benchmark.py --skip-kernels --pipeline --output new.json --baseline run.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+import numpy as np
+import polars as pl
+
+from strategy_core import TradingStrategyCore, ewma_kernel, crossover_signals, signal_positions
+from backtest_engine import BacktestEngine
+from parameter_sweep import ParameterSweep, summarize_runs
+from portfolio import PortfolioBacktest
+from panel import PanelData, PanelBacktest
+from data_handler import DataHandler
+from compute_graph import graph_for
+from market_store import MarketDataStore
+from wind_source import WindPySource, FakeWindPy, fetch_many
+from visualization import StrategyVisualizer
+from exit_rules import apply_exit_rules, HAS_NUMBA
+
+MAX_DAILY_ROWS = (date(9999, 12, 31) - date(1990, 1, 1)).days  # 日线日期可表示的最大行数
+
+
+def make_prices(n, seed=0):
+    """生成几何随机游走的合成价格序列"""
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+
+
+def synthetic_dates(n_rows):
+    """合成日期列：行数不超过MAX_DAILY_ROWS时为'%Y-%m-%d'日线，否则为'%Y-%m-%d %H:%M:%S'分钟线"""
+    start = datetime(1990, 1, 1)
+    if n_rows <= MAX_DAILY_ROWS:
+        return pl.date_range(start.date(), start.date() + timedelta(days=n_rows - 1),
+                             eager=True).dt.strftime('%Y-%m-%d')
+    return pl.datetime_range(start, start + timedelta(minutes=n_rows - 1), '1m',
+                             eager=True).dt.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def write_synthetic_file(path, n_rows, file_type='parquet', seed=0):
+    """生成与data/AUFI_WI.parquet同结构的合成行情文件(date为字符串，见synthetic_dates)"""
+    rng = np.random.default_rng(seed)
+    close = make_prices(n_rows, seed)
+    open_ = close * (1 + rng.normal(0, 0.002, n_rows))
+    frame = pl.DataFrame({
+        'date': synthetic_dates(n_rows),
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + rng.uniform(0, 0.005, n_rows)),
+        'low': np.minimum(open_, close) * (1 - rng.uniform(0, 0.005, n_rows)),
+        'close': close,
+        'settle': (open_ + close) / 2,
+        'volume': rng.integers(1e4, 1e6, n_rows).astype(np.float64),
+        'oi': rng.integers(1e4, 1e6, n_rows).astype(np.float64),
+        'amt': rng.uniform(1e9, 1e11, n_rows),
+    })
+    if file_type == 'csv':
+        frame.write_csv(path)
+    else:
+        frame.write_parquet(path)
+    return path
+
+
+def loop_ewma_positions(close_prices, span, long_only):
+    """原逐元素循环实现(基线代码的原样副本，仅作基准对照，勿改用新内核；测试用副本见tests/reference_loop.py)
+
+    Returns:
+        tuple: (ewma, trading_signal, position)
+    """
+    alpha = 2 / (span + 1)
+    ewma = np.zeros_like(close_prices)
+    ewma[0] = close_prices[0]
+    for i in range(1, len(close_prices)):
+        ewma[i] = alpha * close_prices[i] + (1 - alpha) * ewma[i-1]
+
+    prev_close = np.roll(close_prices, 1)
+    prev_ewma = np.roll(ewma, 1)
+    prev_close[0] = np.nan  # 第一个元素设为nan避免误判
+    prev_ewma[0] = np.nan
+    trading_signal = np.zeros_like(close_prices)
+    trading_signal[(close_prices > ewma) & (prev_close < prev_ewma)] = 1  # 买入信号
+    trading_signal[(close_prices < ewma) & (prev_close > prev_ewma)] = -1  # 卖出信号
+
+    position = np.zeros_like(close_prices)
+    for i, signal in enumerate(trading_signal[:-1]):  # 少循环一次
+        if signal == 1:
+            position[i+1] = 1
+        elif signal == -1:
+            position[i+1] = 0 if long_only else -1
+        else:
+            position[i+1] = position[i]  # 保持原有持仓
+    return ewma, trading_signal, position
+
+
+def vectorized_ewma_positions(close_prices, span, long_only):
+    """向量化内核实现"""
+    ewma = ewma_kernel(close_prices, span)
+    trading_signal = crossover_signals(close_prices, ewma)
+    position = signal_positions(trading_signal, long_only=long_only)
+    return ewma, trading_signal, position
+
+
+def _timeit(func, *args, repeat=1):
+    """返回最短耗时(秒)与最后一次结果"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _measure(func, *args, trace_memory=False):
+    """单次执行的墙钟时间与CPU时间；trace_memory为True时改为测量Python/NumPy分配的内存峰值
+
+    tracemalloc本身会显著拖慢Python代码，故计时与内存分两次执行。polars在原生代码中
+    的分配不经过tracemalloc，另记录进程常驻内存峰值(ru_maxrss)。
+    """
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            result = func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {'peak_alloc_mb': peak / 1024**2,
+                'max_rss_mb': _max_rss_mb()}, result
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    result = func(*args)
+    return {'wall_s': time.perf_counter() - start,
+            'cpu_s': time.process_time() - cpu_start}, result
+
+
+def _max_rss_mb():
+    """进程常驻内存峰值(MB)；resource模块仅POSIX可用，Windows上返回None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss在macOS上以字节计，在Linux等系统上以KB计
+    return rss / 1024**2 if sys.platform == 'darwin' else rss / 1024
+
+
+def bench_pipeline_stages(n_rows, file_type='parquet', span=30, repeat=3):
+    """在合成文件上逐阶段测量完整流程(计时执行repeat次取各阶段最短耗时，内存另执行一次)
+
+    阶段：加载文件、preprocess_data、两种EWMA策略的generate_signals、run_backtest、
+    generate_trading_records、trade_ledger、无界面绘图写入PNG。
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_synthetic_file(os.path.join(tmp, f'SYM.{file_type}'), n_rows, file_type)
+        runs = [_run_pipeline(path, file_type, span, os.path.join(tmp, 'plots'), False)
+                for _ in range(repeat)]
+        timing = {stage: {field: min(run[stage][field] for run in runs) for field in runs[0][stage]}
+                  for stage in runs[0]}
+        memory = _run_pipeline(path, file_type, span, os.path.join(tmp, 'plots'), True)
+    return [
+        {'stage': stage, 'rows': n_rows, 'file_type': file_type, **timing[stage], **memory[stage]}
+        for stage in timing
+    ]
+
+
+def _run_pipeline(path, file_type, span, plot_dir, trace_memory):
+    """执行一遍完整流程，返回各阶段的测量结果"""
+    stats = {}
+
+    def record(stage, func, *args):
+        stats[stage], result = _measure(func, *args, trace_memory=trace_memory)
+        return result
+
+    data_loader = record('load', DataHandler, path, file_type)
+    record('preprocess_data', data_loader.preprocess_data)
+    for strategy_type in ('EWMA', 'EWMA_LONG_ONLY'):
+        # 清空共享计算图，各阶段都测量完整计算而不是复用上一阶段记忆的节点
+        graph_for(data_loader).clear()
+        strategy = TradingStrategyCore(data_loader, strategy_type=strategy_type, span=span)
+        record(f'generate_signals[{strategy_type}]', strategy.generate_signals)
+    engine = BacktestEngine(strategy)
+    record('run_backtest', engine.run_backtest)
+    record('generate_trading_records', engine.generate_trading_records)
+    record('trade_ledger', engine.trade_ledger)
+    visualizer = StrategyVisualizer(strategy, data_loader, output_dir=plot_dir)
+    record('plot_results', visualizer.plot_results)
+    return stats
+
+
+def run_metadata():
+    """运行环境信息，写入结果文件便于比较不同运行"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'polars': pl.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def compare_results(current, baseline, threshold=0.2, min_seconds=0.005):
+    """与基线结果比较，返回变慢超过threshold比例的项目
+
+    同一分组内非计时字段完全相同的行视为同一项目，逐个比较以'_s'结尾的计时字段；
+    差值小于min_seconds的波动不计。
+    """
+    regressions = []
+    for section, rows in current['sections'].items():
+        base_rows = baseline.get('sections', {}).get(section, [])
+        for row in rows:
+            key = {k: v for k, v in row.items() if not k.endswith('_s') and not isinstance(v, float)}
+            base = next((r for r in base_rows
+                         if {k: v for k, v in r.items() if k in key} == key), None)
+            if base is None:
+                continue
+            for field, value in row.items():
+                if not field.endswith('_s') or field not in base:
+                    continue
+                if value > base[field] * (1 + threshold) and value - base[field] > min_seconds:
+                    regressions.append({'section': section, **key, 'field': field,
+                                        'baseline': base[field], 'current': value,
+                                        'ratio': value / base[field]})
+    return regressions
+
+
+def bench_strategy_kernels(sizes, span=30, long_only=True):
+    """在不同规模下比较循环与向量化实现"""
+    rows = []
+    for n in sizes:
+        close_prices = make_prices(n)
+        loop_time, (loop_ewma, loop_sig, loop_pos) = _timeit(loop_ewma_positions, close_prices, span, long_only)
+        vec_time, (vec_ewma, vec_sig, vec_pos) = _timeit(vectorized_ewma_positions, close_prices, span, long_only,
+                                                         repeat=3)
+        # 校验结果一致
+        if not (np.allclose(loop_ewma, vec_ewma, rtol=1e-12, atol=0) and np.array_equal(loop_sig, vec_sig)
+                and np.array_equal(loop_pos, vec_pos)):
+            raise AssertionError(f"向量化结果与循环实现不一致(n={n})")
+        rows.append({
+            'bars': n,
+            'loop_s': loop_time,
+            'vectorized_s': vec_time,
+            'speedup': loop_time / vec_time if vec_time > 0 else float('inf'),
+        })
+    return rows
+
+
+class _SyntheticData:
+    """与DataHandler接口一致的合成数据(仅供基准使用)"""
+    def __init__(self, n, seed=0):
+        self.close = make_prices(n, seed)
+        self.open = np.roll(self.close, 1)
+        self.open[0] = self.close[0]
+        self.dates = np.arange(n)
+        self.high = np.maximum(self.open, self.close)
+        self.low = np.minimum(self.open, self.close)
+
+
+def bench_parameter_sweep(n_bars, spans, long_only=True):
+    """比较逐个参数回测(含相同指标计算)与批量参数扫描的耗时"""
+    data = _SyntheticData(n_bars)
+    strategy_type = 'EWMA_LONG_ONLY' if long_only else 'EWMA'
+
+    def per_span():
+        finals = []
+        for span in spans:
+            strategy = TradingStrategyCore(data, strategy_type=strategy_type, span=span)
+            strategy.generate_signals()
+            result = BacktestEngine(strategy).run_backtest()
+            metrics = summarize_runs(result['Position'][None], result['StrategyReturn'][None],
+                                     result['CumulativeReturn'][None])
+            finals.append(metrics['FinalReturn'][0])
+        return np.array(finals)
+
+    loop_time, loop_final = _timeit(per_span)
+    sweep_time, table = _timeit(ParameterSweep(data, strategy_type).run, spans)
+    if not np.array_equal(loop_final, table['FinalReturn'].to_numpy()):
+        raise AssertionError("批量扫描结果与逐个回测不一致")
+    return {'bars': n_bars, 'spans': len(spans), 'per_span_s': loop_time, 'sweep_s': sweep_time}
+
+
+def bench_portfolio_scaling(n_symbols, n_bars, workers_list):
+    """在合成品种目录上测量组合回测从1到N个进程的扩展性"""
+    rows = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        for i in range(n_symbols):
+            write_synthetic_file(os.path.join(data_dir, f'SYM{i:03d}.parquet'), n_bars, seed=i)
+        portfolio = PortfolioBacktest.from_directory(data_dir, strategy_type='EWMA_LONG_ONLY', span=30)
+        for workers in workers_list:
+            elapsed, _ = _timeit(portfolio.run, None, None, workers)
+            rows.append({'symbols': n_symbols, 'bars': n_bars, 'workers': workers, 'seconds': elapsed})
+    return rows
+
+
+def bench_panel(n_symbols, n_bars, strategy_type='EWMA_LONG_ONLY', span=30):
+    """比较逐品种流程(单进程PortfolioBacktest)与对齐面板一次回测全部品种的耗时，并校验组合净值一致"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        for i in range(n_symbols):
+            write_synthetic_file(os.path.join(data_dir, f'SYM{i:03d}.parquet'), n_bars, seed=i)
+        portfolio = PortfolioBacktest.from_directory(data_dir, strategy_type=strategy_type, span=span)
+        per_symbol_s, expected = _timeit(portfolio.run, None, None, 1)
+
+        def run_panel():
+            return PanelBacktest(PanelData.from_directory(data_dir), strategy_type, span=span).run()
+        panel_s, result = _timeit(run_panel)
+    assert np.allclose(result['CumulativeReturn'].to_numpy(), expected['CumulativeReturn'].to_numpy())
+    return {'symbols': n_symbols, 'bars': n_bars, 'per_symbol_s': per_symbol_s, 'panel_s': panel_s}
+
+
+def bench_data_loading(n_rows, file_type='parquet', window=250):
+    """比较全量加载与惰性加载(窄日期窗口、仅open/close两列)的耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_synthetic_file(os.path.join(tmp, f'SYM.{file_type}'), n_rows, file_type)
+        start = datetime.combine(date(1990, 1, 1) + timedelta(days=n_rows - window), datetime.min.time())
+
+        def eager():
+            return DataHandler(path, file_type=file_type).preprocess_data(start_date=start)
+
+        def lazy():
+            return DataHandler(path, file_type=file_type, lazy=True).preprocess_data(
+                start_date=start, columns=['open', 'close'])
+
+        eager_time, eager_data = _timeit(eager, repeat=3)
+        lazy_time, lazy_data = _timeit(lazy, repeat=3)
+        if not np.array_equal(eager_data.close, lazy_data.close):
+            raise AssertionError("惰性加载结果与全量加载不一致")
+    return {'rows': n_rows, 'file_type': file_type, 'eager_s': eager_time, 'lazy_s': lazy_time}
+
+
+def bench_store_cold_start(n_symbols, n_bars):
+    """比较逐个解析单品种文件与合并存储映射加载全部品种的耗时"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = os.path.join(tmp, 'data')
+        os.makedirs(data_dir)
+        for i in range(n_symbols):
+            write_synthetic_file(os.path.join(data_dir, f'SYM{i:03d}.parquet'), n_bars, seed=i)
+        store_dir = os.path.join(tmp, 'store')
+        MarketDataStore.build(data_dir, store_dir)
+        symbols = [f'SYM{i:03d}' for i in range(n_symbols)]
+
+        def from_files():
+            return [DataHandler(os.path.join(data_dir, f'{s}.parquet'), file_type='parquet')
+                    .preprocess_data() for s in symbols]
+
+        def from_store():
+            store = MarketDataStore(store_dir)
+            return [DataHandler.from_store(store, s) for s in symbols]
+
+        files_time, _ = _timeit(from_files, repeat=3)
+        store_time, _ = _timeit(from_store, repeat=3)
+    return {'symbols': n_symbols, 'bars': n_bars, 'files_s': files_time, 'store_s': store_time}
+
+
+def bench_wind_fetch(n_symbols, n_bars, latency=0.05, batch_size=10, max_workers=8):
+    """以本地替身FakeWindPy(每次请求固定延迟)比较逐品种串行获取与分批并发获取"""
+    with tempfile.TemporaryDirectory() as data_dir:
+        symbols = [f'SYM{i:03d}.WI' for i in range(n_symbols)]
+        for i, symbol in enumerate(symbols):
+            write_synthetic_file(os.path.join(data_dir, f'SYM{i:03d}_WI.parquet'), n_bars, seed=i)
+        start_dates = {symbol: date(1990, 1, 1) for symbol in symbols}
+        end_date = date(1990, 1, 1) + timedelta(days=n_bars - 1)
+        source = WindPySource(FakeWindPy(data_dir, latency=latency))
+
+        def serial():
+            return list(fetch_many(source, start_dates, end_date, batch_size=1, max_workers=1))
+
+        def batched():
+            return list(fetch_many(source, start_dates, end_date,
+                                   batch_size=batch_size, max_workers=max_workers))
+
+        serial_time, _ = _timeit(serial)
+        batched_time, results = _timeit(batched)
+        if len(results) != n_symbols or any(error is not None for _, _, error in results):
+            raise AssertionError("并发获取结果不完整")
+    return {'symbols': n_symbols, 'latency': latency, 'serial_s': serial_time, 'batched_s': batched_time}
+
+
+def bench_exit_rules(n_bars, n_sets, span=30):
+    """比较平仓规则的解释器逐K线循环、NumPy批量实现与numba编译内核(已安装时)
+
+    参数组在止损/止盈/移动止损/最长持仓期的网格中循环取值；编译内核先预热一次，
+    耗时不含编译时间。
+    """
+    data = _SyntheticData(n_bars)
+    execution_price = (data.open + data.close) / 2
+    trading_signal = crossover_signals(data.close, ewma_kernel(data.close, span))
+    grid = np.array([(sl, tp, ts, mh) for sl in (0, 0.01, 0.03) for tp in (0, 0.05, 0.1)
+                     for ts in (0, 0.02) for mh in (0, 20)], dtype=np.float64)
+    grid = grid[np.arange(n_sets) % len(grid)]
+    params = dict(stop_loss=grid[:, 0], take_profit=grid[:, 1], trailing_stop=grid[:, 2], max_holding=grid[:, 3])
+
+    def run(engine):
+        return apply_exit_rules(trading_signal, execution_price, data.high, data.low, engine=engine, **params)
+
+    row = {'bars': n_bars, 'sets': n_sets}
+    row['python_s'], expected = _timeit(run, 'python')
+    engines = ['numpy'] + (['numba'] if HAS_NUMBA else [])
+    if HAS_NUMBA:
+        run('numba')  # 预热(编译)
+    for engine in engines:
+        row[f'{engine}_s'], result = _timeit(run, engine, repeat=3)
+        if not all(np.array_equal(a, b) for a, b in zip(result, expected)):
+            raise AssertionError(f"平仓规则{engine}实现与解释器循环不一致")
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="策略核心性能基准")
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10**4, 10**5, 10**6, 10**7])
+    parser.add_argument('--span', type=int, default=30)
+    parser.add_argument('--skip-kernels', action='store_true',
+                        help="不运行循环与向量化内核对比")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="额外逐阶段测量完整流程(各规模，见--file-types)")
+    parser.add_argument('--file-types', nargs='+', default=['parquet', 'csv'],
+                        choices=['parquet', 'csv'])
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="流程计时重复次数，各阶段取最短耗时")
+    parser.add_argument('--sweep-spans', type=int, default=0,
+                        help="大于0时额外测试批量参数扫描(span取2..N+1)")
+    parser.add_argument('--portfolio-symbols', type=int, default=0,
+                        help="大于0时额外测试组合回测的多进程扩展性")
+    parser.add_argument('--portfolio-bars', type=int, default=5000)
+    parser.add_argument('--panel-symbols', type=int, default=0,
+                        help="对齐面板与逐品种流程对比的品种数(0为不测)")
+    parser.add_argument('--store-symbols', type=int, default=0,
+                        help="大于0时额外测试合并存储的冷启动加载(每品种--portfolio-bars行)")
+    parser.add_argument('--load', action='store_true',
+                        help="额外测试全量加载与惰性加载(各规模取最后250行)")
+    parser.add_argument('--fetch-symbols', type=int, default=0,
+                        help="大于0时额外测试本地替身数据源上的分批并发获取(每品种--portfolio-bars行)")
+    parser.add_argument('--exit-sets', type=int, default=0,
+                        help="大于0时额外测试平仓规则内核(该数量的参数组，各规模)")
+    parser.add_argument('--output', help="将结果写入该JSON文件")
+    parser.add_argument('--baseline', help="与该JSON结果文件比较，变慢的项目以非零状态退出")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="判定变慢的耗时增长比例(默认0.2即20%%)")
+    args = parser.parse_args()
+    sections = {}
+
+    if not args.skip_kernels:
+        sections['kernels'] = bench_strategy_kernels(args.sizes, span=args.span)
+        print(f"{'bars':>10} {'loop(s)':>10} {'vector(s)':>10} {'speedup':>9}")
+        for row in sections['kernels']:
+            print(f"{row['bars']:>10} {row['loop_s']:>10.4f} {row['vectorized_s']:>10.4f} {row['speedup']:>8.1f}x")
+
+    if args.pipeline:
+        sections['pipeline'] = []
+        print(f"\n{'rows':>10} {'type':>8} {'stage':<32} {'wall(s)':>9} {'cpu(s)':>9} "
+              f"{'alloc(MB)':>10} {'rss(MB)':>9}")
+        for n in args.sizes:
+            for file_type in args.file_types:
+                for row in bench_pipeline_stages(n, file_type, span=args.span, repeat=args.repeat):
+                    sections['pipeline'].append(row)
+                    rss = '' if row['max_rss_mb'] is None else f"{row['max_rss_mb']:.0f}"
+                    print(f"{row['rows']:>10} {row['file_type']:>8} {row['stage']:<32} {row['wall_s']:>9.4f} "
+                          f"{row['cpu_s']:>9.4f} {row['peak_alloc_mb']:>10.1f} {rss:>9}")
+
+    if args.sweep_spans > 0:
+        spans = list(range(2, args.sweep_spans + 2))
+        sections['sweep'] = [bench_parameter_sweep(n, spans) for n in args.sizes]
+        print(f"\n{'bars':>10} {'spans':>6} {'per-span(s)':>12} {'sweep(s)':>10}")
+        for row in sections['sweep']:
+            print(f"{row['bars']:>10} {row['spans']:>6} {row['per_span_s']:>12.4f} {row['sweep_s']:>10.4f}")
+
+    if args.portfolio_symbols > 0:
+        cores = os.cpu_count() or 1
+        workers_list = sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+        print(f"\n{'symbols':>8} {'bars':>8} {'workers':>8} {'seconds':>9} {'speedup':>8}")
+        rows = bench_portfolio_scaling(args.portfolio_symbols, args.portfolio_bars, workers_list)
+        sections['portfolio'] = rows
+        for row in rows:
+            speedup = rows[0]['seconds'] / row['seconds']
+            print(f"{row['symbols']:>8} {row['bars']:>8} {row['workers']:>8} {row['seconds']:>9.3f} {speedup:>7.1f}x")
+
+    if args.panel_symbols > 0:
+        row = bench_panel(args.panel_symbols, args.portfolio_bars, span=args.span)
+        sections['panel'] = [row]
+        print(f"\n{'symbols':>8} {'bars':>8} {'per-symbol(s)':>14} {'panel(s)':>10}")
+        print(f"{row['symbols']:>8} {row['bars']:>8} {row['per_symbol_s']:>14.4f} {row['panel_s']:>10.4f}")
+
+    if args.load:
+        sections['load'] = []
+        print(f"\n{'rows':>10} {'type':>8} {'eager(s)':>10} {'lazy(s)':>10}")
+        # 惰性加载按DATE_FORMAT解析日线日期，超出日线范围的规模不参与
+        for n in [n for n in args.sizes if n <= MAX_DAILY_ROWS]:
+            for file_type in ('parquet', 'csv'):
+                row = bench_data_loading(n, file_type)
+                sections['load'].append(row)
+                print(f"{row['rows']:>10} {row['file_type']:>8} {row['eager_s']:>10.4f} {row['lazy_s']:>10.4f}")
+
+
+    if args.store_symbols > 0:
+        row = bench_store_cold_start(args.store_symbols, args.portfolio_bars)
+        sections['store'] = [row]
+        print(f"\n{'symbols':>8} {'bars':>8} {'files(s)':>10} {'store(s)':>10}")
+        print(f"{row['symbols']:>8} {row['bars']:>8} {row['files_s']:>10.4f} {row['store_s']:>10.4f}")
+
+    if args.fetch_symbols > 0:
+        row = bench_wind_fetch(args.fetch_symbols, args.portfolio_bars)
+        sections['fetch'] = [row]
+        print(f"\n{'symbols':>8} {'latency':>8} {'serial(s)':>10} {'batched(s)':>11}")
+        print(f"{row['symbols']:>8} {row['latency']:>8.3f} {row['serial_s']:>10.4f} {row['batched_s']:>11.4f}")
+
+    if args.exit_sets > 0:
+        sections['exit_rules'] = [bench_exit_rules(n, args.exit_sets, span=args.span) for n in args.sizes]
+        print(f"\n{'bars':>10} {'sets':>6} {'python(s)':>10} {'numpy(s)':>10} {'numba(s)':>10}")
+        for row in sections['exit_rules']:
+            numba_time = f"{row['numba_s']:>10.4f}" if 'numba_s' in row else f"{'-':>10}"
+            print(f"{row['bars']:>10} {row['sets']:>6} {row['python_s']:>10.4f} {row['numpy_s']:>10.4f} {numba_time}")
+
+    report = {'metadata': run_metadata(), 'sections': sections}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=1)
+        print(f"\n结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(report, baseline, args.threshold)
+        print(f"\n与基线 {args.baseline} (commit {baseline['metadata'].get('commit')}) 比较：")
+        for item in regressions:
+            label = ' '.join(f'{k}={v}' for k, v in item.items()
+                             if k not in ('section', 'field', 'baseline', 'current', 'ratio'))
+            print(f"  变慢 [{item['section']}] {label} {item['field']}: "
+                  f"{item['baseline']:.4f}s -> {item['current']:.4f}s ({item['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("  未发现变慢的项目")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+from data_handler import DataHandler, dataset_files
+from strategy_core import TradingStrategyCore, ewma_kernel, crossover_signals, _format_date
+from strategy_result import StrategyResult
+from instrumentation import instrument, stage, symbol_from_path
+
+DEFAULT_CHUNK_ROWS = 500_000  # 每块读取的行数
+INPUT_COLUMNS = ('open', 'close')  # 策略与回测只需要的行情列
+
+
+def carry_positions(trading_signal, long_only=False, prev_signal=0.0, prev_position=0.0):
+    """由一块信号生成持仓与隔日执行的信号，承接上一块末根K线的信号与持仓
+
+    首块(prev_signal=0, prev_position=0)的结果与signal_positions一致。
+
+    Returns:
+        tuple: (持仓, 隔日执行的信号)
+    """
+    n = len(trading_signal)
+    executed = np.empty(n, dtype=np.float64)
+    if n:
+        executed[0] = prev_signal  # 上一块末根K线的信号在本块首根K线执行
+        executed[1:] = trading_signal[:-1]
+    target = np.maximum(executed, 0) if long_only else executed
+    last_signal_idx = np.maximum.accumulate(np.where(executed != 0, np.arange(n), -1))
+    # 本块内尚未出现信号的位置沿用上一块的持仓
+    position = np.where(last_signal_idx >= 0, target[np.maximum(last_signal_idx, 0)], prev_position)
+    return position, executed
+
+
+class ChunkedBacktest:
+    """Out-of-core EWMA crossover backtest over chunked bar data.
+
+    Reads a Parquet/CSV file (with its delta parts) in chunks through a
+    streaming scan, and carries the missing-value fill, EWMA, signal,
+    position and equity state across chunk boundaries. Each chunk is
+    returned as a StrategyResult or appended to a Parquet file as one row
+    group, so peak memory depends on chunk_rows rather than the history
+    length. Results are identical to DataHandler + TradingStrategyCore +
+    BacktestEngine on the whole file.
+
+    Attributes:
+        data_path: Path of the market data file
+        file_type: 'parquet' or 'csv'
+        strategy_type: 'EWMA' or 'EWMA_LONG_ONLY'
+        span: EWMA span
+        indicator_name: Indicator column name, same as TradingStrategyCore
+        chunk_rows: Rows per chunk
+        dtype: Float dtype of result arrays
+        state: Carried state after the last processed bar
+        summary: Row/chunk counts, final return and max drawdown of the last run
+    """
+    def __init__(self, data_path, file_type='parquet', strategy_type='EWMA',
+                 chunk_rows=DEFAULT_CHUNK_ROWS, dtype=np.float64, **kwargs):
+        if strategy_type not in TradingStrategyCore.STREAMING_TYPES:
+            raise ValueError(f"策略类型{strategy_type}不支持分块回测")
+        if file_type not in ('parquet', 'csv'):
+            raise ValueError("不支持的file_type类型，请使用'csv'或'parquet'")
+        # 周期参数与指标名与TradingStrategyCore保持一致
+        strategy = TradingStrategyCore(None, strategy_type=strategy_type, **kwargs)
+        self.data_path = data_path
+        self.file_type = file_type
+        self.strategy_type = strategy_type
+        self.strategy_params = kwargs
+        self.span = strategy.span
+        self.indicator_name = strategy.indicator_name
+        self.chunk_rows = chunk_rows
+        self.dtype = np.dtype(dtype)
+        self.state = None
+        self.summary = None
+
+    def _scan(self):
+        if self.file_type == 'csv':
+            return pl.scan_csv(self.data_path)
+        files = dataset_files(self.data_path)
+        return pl.scan_parquet(files if len(files) > 1 else self.data_path)
+
+    def _read_chunks(self):
+        """流式读取日期与开收盘价，每次返回一块DataFrame"""
+        scan = self._scan().select(['date', *INPUT_COLUMNS])
+        for chunk in scan.collect_batches(chunk_size=self.chunk_rows, engine='streaming'):
+            if chunk.height:
+                yield chunk
+
+    def _first_valid(self, columns):
+        """各列首个有效值(全量后向填充时开头缺失值取该值)，只在首块开头有缺失时读取"""
+        first = self._scan().select([
+            pl.col(col).fill_nan(None).drop_nulls().first() for col in columns
+        ]).collect(engine='streaming')
+        return {col: first[col][0] for col in columns}
+
+    def _fill_chunk(self, chunk, carry):
+        """缺失值填充与日期转换，结果与DataHandler全量预处理一致
+
+        块内前向填充后，块首残留的缺失值取上一块的最后有效值；
+        第一个有效值之前的缺失值取全量首个有效值，仍无则填0。
+        """
+        if chunk['date'].is_null().any():
+            raise ValueError("日期列date包含缺失值")
+        numeric = [col for col, dtype in chunk.schema.items()
+                   if col != 'date' and dtype in DataHandler.NUMERIC_DTYPES]
+        chunk = chunk.with_columns([pl.col(col).fill_nan(None) for col in numeric])
+        missing = [col for col in numeric if col not in carry and chunk[col][0] is None]
+        if missing:
+            # 全列无有效值时记为None，不再重复读取
+            carry.update(self._first_valid(missing))
+        filled = chunk.with_columns([DataHandler._date_expr(chunk.schema)] + [
+            pl.col(col).fill_null(strategy='forward').fill_null(carry.get(col)).fill_null(0)
+            if carry.get(col) is not None else
+            pl.col(col).fill_null(strategy='forward').fill_null(0)
+            for col in numeric
+        ])
+        # 记录本块最后的有效值供下一块使用
+        for col in numeric:
+            last = chunk[col].drop_nulls()
+            if last.len():
+                carry[col] = last[-1]
+        return filled
+
+    def _strategy_chunk(self, dates, open_prices, close_prices, state):
+        """计算一块的指标、信号、持仓与行动状态，承接上一块状态
+
+        Returns:
+            tuple: (StrategyResult, 末根K线的float64 EWMA)
+        """
+        execution_price = (open_prices + close_prices) / 2
+        if state is None:
+            ewma = ewma_kernel(close_prices, self.span)
+            trading_signal = crossover_signals(close_prices, ewma)
+            prev_signal = prev_position = 0.0
+        else:
+            # 将上一根K线的EWMA作为首个值参与递推，与整段递推逐位一致
+            ewma = ewma_kernel(np.concatenate(([state['ewma']], close_prices)), self.span)[1:]
+            trading_signal = crossover_signals(np.concatenate(([state['close']], close_prices)),
+                                               np.concatenate(([state['ewma']], ewma)))[1:]
+            prev_signal, prev_position = state['signal'], state['position']
+        position, executed = carry_positions(trading_signal, self.strategy_type == 'EWMA_LONG_ONLY',
+                                             prev_signal, prev_position)
+        result = StrategyResult(
+            self.indicator_name, self.dtype,
+            Date=dates,
+            Close=close_prices,
+            ExecutionPrice=execution_price,
+            TradingSignal=trading_signal,
+            Position=position,
+            ActionCodes=executed.astype(np.int8)
+        )
+        result[self.indicator_name] = ewma
+        return result, ewma[-1]
+
+    def _backtest_chunk(self, result, next_price, equity):
+        """计算一块的收益与累计净值；next_price为下一块首根K线的执行价格，末块为None"""
+        execution_price = result['ExecutionPrice']
+        if next_price is None:
+            returns = np.append(execution_price[1:] / execution_price[:-1] - 1, 0)
+        else:
+            prices = np.append(execution_price, next_price).astype(execution_price.dtype, copy=False)
+            returns = prices[1:] / prices[:-1] - 1
+        returns = returns.astype(execution_price.dtype, copy=False)
+        strategy_returns = result['Position'] * returns
+        # 从上一块末的净值继续累乘，与整段cumprod逐位一致
+        start = np.array([equity], dtype=strategy_returns.dtype)
+        cumulative_returns = np.cumprod(np.concatenate((start, 1 + strategy_returns)))[1:]
+        result.update({
+            'Return': returns,
+            'StrategyReturn': strategy_returns,
+            'CumulativeReturn': cumulative_returns
+        })
+        return result
+
+    def iter_results(self, start_date=None, end_date=None):
+        """逐块执行策略与回测，每块返回一个StrategyResult
+
+        每块的最后一根K线需要下一块的执行价格计算收益，因此每块在读入下一块后返回。
+
+        Args:
+            start_date (datetime): 起始日期(可选)
+            end_date (datetime): 结束日期(可选)
+        """
+        self.state = None
+        self.summary = {'rows': 0, 'chunks': 0, 'FinalReturn': None, 'MaxDrawdown': None}
+        carry = {}
+        equity, peak, max_drawdown = 1.0, 1.0, 0.0  # 高点以初始资金为起点
+        pending = None
+        predicate = None
+        if start_date:
+            predicate = pl.col('date') >= start_date
+        if end_date:
+            upper = pl.col('date') <= end_date
+            predicate = upper if predicate is None else predicate & upper
+
+        def finish(result, next_price):
+            nonlocal equity, peak, max_drawdown
+            result = self._backtest_chunk(result, next_price, equity)
+            cumulative_returns = result['CumulativeReturn']
+            equity = cumulative_returns[-1]
+            running_max = np.maximum.accumulate(np.maximum(cumulative_returns, peak))
+            peak = running_max[-1]
+            max_drawdown = min(max_drawdown, float((cumulative_returns / running_max - 1).min()))
+            self.summary['rows'] += len(cumulative_returns)
+            self.summary['chunks'] += 1
+            self.summary['FinalReturn'] = float(equity - 1)
+            self.summary['MaxDrawdown'] = max_drawdown
+            return result
+
+        for chunk in self._read_chunks():
+            with stage('ChunkedBacktest.chunk', rows=chunk.height):
+                # 先按全量数据填充缺失值，再筛选日期区间(与全量预处理顺序一致)
+                chunk = self._fill_chunk(chunk, carry)
+                if predicate is not None:
+                    chunk = chunk.filter(predicate)
+                if chunk.height == 0:
+                    continue
+                result, ewma = self._strategy_chunk(chunk['date'].to_numpy(), chunk['open'].to_numpy(),
+                                                    chunk['close'].to_numpy(), self.state)
+                self._record_state(result, ewma)
+                ready = None
+                if pending is not None:
+                    ready = finish(pending, result['ExecutionPrice'][0])
+                pending = result
+            if ready is not None:
+                yield ready
+        if pending is not None:
+            yield finish(pending, None)
+
+    def _record_state(self, result, ewma):
+        """记录块末K线的状态，格式与TradingStrategyCore.state一致
+
+        EWMA使用未转换精度的float64值，float32结果下跨块递推仍与整段一致。
+        """
+        close = float(result['Close'][-1])
+        ewma = float(ewma)
+        self.state = {
+            'strategy_type': self.strategy_type,
+            'span': self.span,
+            'bars': (self.state['bars'] if self.state else 0) + len(result['Close']),
+            'last_date': _format_date(result['Date'][-1]),
+            'close': close,
+            'ewma': ewma,
+            'side': float(np.sign(close - ewma)),
+            'signal': float(result['TradingSignal'][-1]),
+            'position': float(result['Position'][-1])
+        }
+
+    @instrument('ChunkedBacktest.run', symbol=lambda self, *args, **kwargs: symbol_from_path(self.data_path))
+    def run(self, output_path, start_date=None, end_date=None):
+        """分块回测并逐块追加写入Parquet文件(每块一个row group)
+
+        输出列与StrategyResult.to_arrays()一致(行动状态为int8编码ActionCodes)。
+        结束后可用TradingStrategyCore.from_state(self.state)继续逐根增量更新。
+
+        Args:
+            output_path (str): 结果Parquet文件路径
+            start_date (datetime): 起始日期(可选)
+            end_date (datetime): 结束日期(可选)
+        Returns:
+            dict: 行数、块数、最终收益(FinalReturn)与最大回撤(MaxDrawdown)
+        """
+        writer = None
+        try:
+            for result in self.iter_results(start_date, end_date):
+                table = pl.DataFrame(result.to_arrays()).to_arrow()
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+        return self.summary
@@ -0,0 +1,270 @@
+"""
+按数据集记忆化的计算图
+
+执行价格、逐K线收益、各指标与信号都是图中的命名节点，节点值按(节点名, 参数)
+记忆化在数据集(DataHandler)对应的ComputeGraph中。同一数据集上运行多个策略
+变体时，公共的中间结果(执行价格、同一周期的EWMA、收益等)只计算一次。
+
+每个节点记录计算时各输入节点的版本：行情字段节点以数组对象本身为版本
+(重新预处理或截取后数组对象改变)，派生节点重新计算后版本递增。取值时只有
+输入版本变化的节点才会重新计算，其余直接返回记忆的结果。
+
+节点值设为只读，供多个策略结果共享而不复制。
+
+新增节点：
+    @register_node('my_node', inputs=lambda span: [('close', {}), ('ewma', {'span': span})])
+    def my_node(close, ewma, span):
+        return close - ewma
+"""
+
+import itertools
+import weakref
+from collections import Counter, OrderedDict
+import numpy as np
+
+from indicators import INDICATORS, compute_indicators, indicator_params
+from instrumentation import stage
+
+SOURCE_FIELDS = ('dates', 'open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+DEFAULT_MAX_BYTES = 512 * 1024**2  # 派生节点记忆的内存上限
+
+# 节点名 -> (计算函数, 输入: params -> [(节点名, 参数字典)])
+NODES = {}
+
+# 数据集 -> 计算图(数据集对象释放后计算图随之释放)
+_GRAPHS = weakref.WeakKeyDictionary()
+
+
+def register_node(name, inputs=()):
+    """注册派生节点，被装饰函数按inputs的顺序接收各输入节点的值，以及节点参数(关键字)
+
+    Args:
+        name (str): 节点名
+        inputs (Callable | Sequence[str]): params -> [(节点名, 参数字典)]，
+            或无参数输入节点名的序列
+    """
+    if not callable(inputs):
+        names = tuple(inputs)
+        inputs = lambda **params: [(node, {}) for node in names]
+
+    def decorator(func):
+        NODES[name] = (func, inputs)
+        return func
+    return decorator
+
+
+def graph_for(data_handler):
+    """数据集共享的计算图(同一DataHandler上的所有策略与回测共用)
+
+    不支持弱引用的数据源(如dict)每次返回新的计算图。
+    """
+    try:
+        graph = _GRAPHS.get(data_handler)
+    except TypeError:
+        return ComputeGraph(data_handler)
+    if graph is None:
+        graph = ComputeGraph(data_handler)
+        _GRAPHS[data_handler] = graph
+    return graph
+
+
+def _freeze(params):
+    """参数字典转为可哈希的键"""
+    return tuple(sorted((key, _freeze(value) if isinstance(value, dict) else value)
+                        for key, value in params.items()))
+
+
+def _readonly(value):
+    """节点值设为只读(多输出节点逐个数组设置)，返回占用字节数"""
+    arrays = value.values() if isinstance(value, dict) else [value]
+    nbytes = 0
+    for array in arrays:
+        if isinstance(array, np.ndarray):
+            array.flags.writeable = False
+            nbytes += array.nbytes
+    return nbytes
+
+
+class _Entry:
+    """记忆的节点值、版本与计算时的输入版本"""
+    __slots__ = ('value', 'version', 'inputs', 'nbytes')
+
+    def __init__(self, value, version, inputs, nbytes):
+        self.value = value
+        self.version = version
+        self.inputs = inputs
+        self.nbytes = nbytes
+
+
+class ComputeGraph:
+    """Memoized dependency graph of intermediate results over one dataset.
+
+    Source nodes are the DataHandler arrays; derived nodes are registered in
+    NODES. A node is recomputed only when the version of one of its inputs
+    changed since it was memoized. Derived values are evicted in
+    least-recently-used order once their total size exceeds max_bytes.
+
+    The graph holds only a weak reference to a DataHandler source, so the
+    handler (and with it the graph in graph_for's map) is released normally.
+
+    Attributes:
+        source: DataHandler (or object/dict with the same array fields)
+        max_bytes: Upper bound of memoized derived bytes
+        evaluations: Counter of computations per node name
+        hits: Number of lookups answered from the memo
+    """
+    def __init__(self, source, max_bytes=DEFAULT_MAX_BYTES):
+        try:
+            self._source_ref = weakref.ref(source)
+        except TypeError:
+            # 不支持弱引用的数据源(如dict)直接持有
+            self._source_ref = lambda: source
+        self.max_bytes = max_bytes
+        self.evaluations = Counter()
+        self.hits = 0
+        self._memo = OrderedDict()
+        self._versions = itertools.count(1)
+        self._bytes = 0
+
+    @property
+    def source(self):
+        """数据源，已释放时为None"""
+        return self._source_ref()
+
+    def get(self, name, **params):
+        """节点值，输入未变化时直接返回记忆的结果"""
+        return self._resolve(name, params).value
+
+    def cached(self, name, **params):
+        """已记忆且输入未变化时返回节点值，否则返回None(不计算该节点)"""
+        entry = self._lookup(name, params)[2]
+        return None if entry is None else entry.value
+
+    def indicators(self, requests):
+        """与compute_indicators相同的输入输出，各指标按(指标名, 参数)记忆
+
+        未记忆或输入已变化的指标在同一次polars查询中计算。
+        """
+        results = {}
+        stale = {}
+        for key, (name, params) in requests.items():
+            node_params = {'name': name, 'params': indicator_params(name, **params)}
+            node_key, deps, entry = self._lookup('indicator', node_params)
+            if entry is None:
+                stale[key] = (name, node_params['params'], node_key, deps)
+            else:
+                results[key] = entry.value
+        if stale:
+            results.update({key: entry.value for key, entry in self._compute_indicators(stale).items()})
+        return {key: results[key] for key in requests}
+
+    def clear(self):
+        """清空记忆的全部节点"""
+        self._memo.clear()
+        self._bytes = 0
+
+    @property
+    def stats(self):
+        """节点计算次数与命中次数"""
+        return {
+            'evaluations': dict(self.evaluations),
+            'hits': self.hits,
+            'nodes': sum(1 for key in self._memo if key[0] not in SOURCE_FIELDS),
+            'bytes': self._bytes
+        }
+
+    def _source(self, field):
+        """行情字段节点：数组对象改变时版本改变"""
+        source = self.source
+        if source is None:
+            raise ReferenceError("计算图的数据源已释放")
+        values = source.get(field) if isinstance(source, dict) else getattr(source, field, None)
+        key = (field, ())
+        entry = self._memo.get(key)
+        if entry is None or entry.value is not values:
+            entry = _Entry(values, next(self._versions), (), 0)
+            self._memo[key] = entry
+        return entry
+
+    def _inputs(self, name, params):
+        if name == 'indicator':
+            return [(field, {}) for field in INDICATORS[params['name']][1]]
+        if name not in NODES:
+            raise ValueError(f"未注册的计算节点: {name}")
+        return NODES[name][1](**params)
+
+    def _lookup(self, name, params):
+        """解析输入节点(必要时计算)并检查本节点是否仍有效
+
+        Returns:
+            tuple: (节点键, 输入节点条目, 有效时为记忆条目，否则为None)
+        """
+        deps = [self._resolve(dep, dep_params) for dep, dep_params in self._inputs(name, params)]
+        key = (name, _freeze(params))
+        entry = self._memo.get(key)
+        if entry is not None and entry.inputs == tuple(dep.version for dep in deps):
+            self.hits += 1
+            self._memo.move_to_end(key)
+            return key, deps, entry
+        return key, deps, None
+
+    def _resolve(self, name, params):
+        if name in SOURCE_FIELDS:
+            return self._source(name)
+        key, deps, entry = self._lookup(name, params)
+        if entry is not None:
+            return entry
+        if name == 'indicator':
+            return self._compute_indicators({None: (params['name'], params['params'], key, deps)})[None]
+        with stage(f'graph.{name}'):
+            value = NODES[name][0](*[dep.value for dep in deps], **params)
+        self.evaluations[name] += 1
+        return self._store(key, value, deps)
+
+    def _compute_indicators(self, stale):
+        """在一次查询中计算多个指标节点并记忆
+
+        Args:
+            stale (dict): 键 -> (指标名, 参数, 节点键, 输入节点条目)
+        Returns:
+            dict: 键 -> 记忆条目
+        """
+        with stage('graph.indicator', rows=len(stale)):
+            values = compute_indicators(self.source, {
+                key: (name, params) for key, (name, params, _, _) in stale.items()
+            })
+        self.evaluations['indicator'] += len(stale)
+        return {key: self._store(node_key, values[key], deps)
+                for key, (_, _, node_key, deps) in stale.items()}
+
+    def _store(self, key, value, deps):
+        old = self._memo.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        entry = _Entry(value, next(self._versions), tuple(dep.version for dep in deps), _readonly(value))
+        self._memo[key] = entry
+        self._bytes += entry.nbytes
+        self._evict(key)
+        return entry
+
+    def _evict(self, keep):
+        """超出内存上限时按最久未使用的顺序移除派生节点(保留刚写入的节点)"""
+        for key in list(self._memo):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep or key[0] in SOURCE_FIELDS:
+                continue
+            self._bytes -= self._memo.pop(key).nbytes
+
+
+@register_node('execution_price', inputs=('open', 'close'))
+def execution_price(open_prices, close_prices, dtype='float64'):
+    """执行价格：开盘与收盘的平均价(按结果精度保存)"""
+    return ((open_prices + close_prices) / 2).astype(dtype, copy=False)
+
+
+@register_node('bar_returns', inputs=lambda dtype='float64': [('execution_price', {'dtype': dtype})])
+def bar_returns(price, dtype='float64'):
+    """逐K线收益：下一根K线执行价/本K线执行价-1，末根为0(与BacktestEngine.run_backtest一致)"""
+    returns = price[1:] / price[:-1] - 1
+    return np.append(returns, 0).astype(price.dtype, copy=False)
@@ -1,5 +1,22 @@
+import copy
+import glob
+import os
+from datetime import datetime
 import polars as pl
 
+from result_cache import file_digest
+from instrumentation import instrument, symbol_from_path
+
+DELTA_DIR = '_delta'  # 增量分片目录(位于数据文件同目录下)
+
+
+def dataset_files(data_path):
+    """单品种数据文件列表：主文件及其后追加的增量分片(_delta/<文件名>/part-*.parquet)"""
+    stem = os.path.splitext(os.path.basename(data_path))[0]
+    delta_dir = os.path.join(os.path.dirname(data_path), DELTA_DIR, stem)
+    return [data_path] + sorted(glob.glob(os.path.join(delta_dir, 'part-*.parquet')))
+
+
 class DataHandler:
     """Data loading and preprocessing module for trading strategy system.
 
@@ -15,18 +32,34 @@ class DataHandler:
         low: Numpy array of low prices
         volume: Numpy array of trading volumes
     """
-    def __init__(self, data_path, file_type='csv'):
+    ARRAY_FIELDS = ('dates', 'open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+
+    PRICE_COLUMNS = ('open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+    NUMERIC_DTYPES = (pl.Float64, pl.Float32, pl.Int64, pl.Int32)
+    DATE_FORMAT = '%Y-%m-%d'  # 惰性模式下文本日期列的格式(与wind_data.py写入格式一致)
+
+    @instrument('DataHandler.load', symbol=lambda self, data_path, *args, **kwargs: symbol_from_path(data_path),
+                rows=lambda result, self, *args, **kwargs: None if self.lazy else self.raw_data.height)
+    def __init__(self, data_path, file_type='csv', lazy=False):
         """
         :param data_path: 文件路径
         :param file_type: 文件类型 ('csv' 或 'parquet')
+        :param lazy: 为True时只建立惰性扫描，日期筛选与列选择下推到读取阶段
         """
+        self.data_path = data_path
         self.file_type = file_type
+        self.lazy = lazy
         if file_type == 'csv':
-            self.raw_data = pl.read_csv(data_path)
+            self.source_files = [data_path]
+            self.raw_data = pl.scan_csv(data_path) if lazy else pl.read_csv(data_path)
         elif file_type == 'parquet':
-            self.raw_data = pl.read_parquet(data_path)
+            # 主文件与增量分片一起读取
+            self.source_files = dataset_files(data_path)
+            source = self.source_files if len(self.source_files) > 1 else data_path
+            self.raw_data = pl.scan_parquet(source) if lazy else pl.read_parquet(source)
         else:
             raise ValueError("不支持的file_type类型，请使用'csv'或'parquet'")
+        self._source_stat = self._stat(self.source_files)
             
         # 初始化数据字段
         self.dates = None
@@ -38,59 +71,225 @@ class DataHandler:
         self.volume = None
         self.oi = None
         self.amt = None
+        # 数据来源信息(用于结果缓存键)
+        self.start_date = None
+        self.end_date = None
+        self.row_range = None
+        self._source_digest = None
+
+    @classmethod
+    def from_store(cls, store, symbol, start_date=None, end_date=None, columns=None):
+        """从合并存储(MarketDataStore)加载单品种，数组为映射文件的零拷贝视图
+
+        结果与对该品种单文件调用preprocess_data一致，无需再调用preprocess_data。
+        """
+        columns = list(cls.PRICE_COLUMNS if columns is None else columns)
+        handler = cls.__new__(cls)
+        handler.data_path = None
+        handler.source_files = []
+        handler.file_type = 'store'
+        handler.lazy = False
+        handler.raw_data = None
+        handler.row_range = None
+        handler._source_stat = None
+        handler._source_digest = f'{store.version}:{symbol}'
+
+        frame = store.symbol_frame(symbol)
+        start_date, end_date = cls._clip_dates(start_date, end_date,
+                                               frame['date'].min(), frame['date'].max())
+        handler.start_date = start_date
+        handler.end_date = end_date
+        arrays = store.load(symbol, start_date, end_date, columns)
+        handler.dates = arrays['date']
+        for col in cls.PRICE_COLUMNS:
+            setattr(handler, col, arrays.get(col))
+        return handler
 
-    def preprocess_data(self, start_date=None, end_date=None):
+    @instrument('DataHandler.preprocess_data', symbol=lambda self, *args, **kwargs: symbol_from_path(self.data_path),
+                rows=lambda result, self, *args, **kwargs: len(self.dates))
+    def preprocess_data(self, start_date=None, end_date=None, columns=None):
         """预处理数据
         Args:
             start_date (datetime.date): 起始日期(可选)
             end_date (datetime.date): 结束日期(可选)
+            columns (Sequence[str]): 需要转换的行情列(可选)，默认全部；未选择的字段为None
         """
-        # 检查并处理缺失值和NaN
-        for col in self.raw_data.columns:
-            if col == 'date':
-                # 日期列不允许有缺失值
-                if self.raw_data[col].is_null().any():
-                    raise ValueError(f"日期列{col}包含缺失值")
-            else:
-                # 只对数值列处理NaN
-                if self.raw_data[col].dtype in (pl.Float64, pl.Float32, pl.Int64, pl.Int32):
-                    self.raw_data = self.raw_data.with_columns(
-                        pl.col(col).fill_nan(None) # 将NaN转换为None
-                                  .fill_null(strategy='forward') # 前向填充
-                                  .fill_null(strategy='backward') # 后向填充
-                                  .fill_null(0) # 最后将剩余的NaN填充为0
-                    )
-
-        # 转换日期列为datetime类型
-        self.raw_data = self.raw_data.with_columns(
-            pl.col('date').str.to_datetime()
-        )
+        columns = list(self.PRICE_COLUMNS if columns is None else columns)
+        unknown = [col for col in columns if col not in self.PRICE_COLUMNS]
+        if unknown:
+            raise ValueError(f"不支持的行情列: {unknown}")
+
+        if self.lazy:
+            self.raw_data = self._collect_lazy(self.raw_data, start_date, end_date, columns)
+        else:
+            self.raw_data = self._preprocess_eager(self.raw_data, start_date, end_date)
+
+        # 转换数据为numpy格式
+        self.dates = self.raw_data['date'].to_numpy()  # 直接使用已转换的日期列
+        for col in self.PRICE_COLUMNS:
+            setattr(self, col, self.raw_data[col].to_numpy() if col in columns else None)
+        return self  # 添加返回自身以支持链式调用
+
+    def _preprocess_eager(self, data, start_date, end_date):
+        """全量数据预处理：先填充缺失值再按日期筛选"""
+        # 日期列不允许有缺失值
+        if data['date'].is_null().any():
+            raise ValueError("日期列date包含缺失值")
+        # 所有数值列的缺失值填充与日期转换合并为一次with_columns
+        data = data.with_columns([
+            self._fill_expr(col) for col, dtype in data.schema.items()
+            if col != 'date' and dtype in self.NUMERIC_DTYPES
+        ] + [self._date_expr(data.schema)])
 
         # 获取数据中的实际日期范围
-        min_date = self.raw_data['date'].min()
-        max_date = self.raw_data['date'].max()
+        start_date, end_date = self._clip_dates(start_date, end_date,
+                                                data['date'].min(), data['date'].max())
+        # 日期范围筛选
+        predicate = self._date_predicate(start_date, end_date)
+        return data if predicate is None else data.filter(predicate)
+
+    def _collect_lazy(self, scan, start_date, end_date, columns):
+        """惰性预处理：列选择、日期筛选与缺失值填充合并为一个查询计划
+
+        文本日期列需为DATE_FORMAT格式：先在原始字符串上按字典序粗筛(可下推到读取阶段，
+        只解析窗口内的日期)，解析后再精确筛选。填充结果与全量预处理一致：窗口首尾仍有
+        缺失时，再取窗口外最近的有效值补齐。
+        """
+        is_text = scan.collect_schema()['date'] == pl.String
+        numeric = [col for col, dtype in scan.collect_schema().items()
+                   if col in columns and dtype in self.NUMERIC_DTYPES]
+        scan = scan.select(['date', *columns])
+
+        # 实际日期范围只需读取日期列
+        if start_date or end_date:
+            bounds = scan.select(pl.col('date').min().alias('min'),
+                                 pl.col('date').max().alias('max')).collect()
+            min_date, max_date = bounds['min'][0], bounds['max'][0]
+            if is_text:
+                min_date = datetime.strptime(min_date, self.DATE_FORMAT)
+                max_date = datetime.strptime(max_date, self.DATE_FORMAT)
+            start_date, end_date = self._clip_dates(start_date, end_date, min_date, max_date)
+        predicate = self._date_predicate(start_date, end_date)
 
-        # 自动调整超出范围的日期
+        if is_text:
+            prefilter = None
+            if start_date:
+                prefilter = pl.col('date') >= start_date.strftime(self.DATE_FORMAT)
+            if end_date:
+                upper = pl.col('date') <= end_date.strftime(self.DATE_FORMAT)
+                prefilter = upper if prefilter is None else prefilter & upper
+            window = scan if prefilter is None else scan.filter(prefilter)
+            parse = pl.col('date').str.to_datetime(self.DATE_FORMAT)
+            window = window.with_columns(parse)
+            scan = scan.with_columns(parse)
+        else:
+            scan = scan.with_columns(pl.col('date').cast(pl.Datetime))
+            window = scan
+        if predicate is not None:
+            window = window.filter(predicate)
+
+        # 先只做窗口内的前向填充，检查窗口首尾是否残留缺失
+        window = window.with_columns([
+            pl.col(col).fill_nan(None).fill_null(strategy='forward') for col in numeric
+        ]).collect()
+        if window['date'].is_null().any():
+            raise ValueError("日期列date包含缺失值")
+
+        fills = {}
+        leading = [col for col in numeric if window.height and window[col][0] is None]
+        if leading and start_date:
+            # 窗口前最近的有效值(全量前向填充时会使用该值)
+            before = scan.filter(pl.col('date') < start_date).select([
+                pl.col(col).fill_nan(None).drop_nulls().last() for col in leading
+            ]).collect()
+            fills.update({col: before[col][0] for col in leading if before[col][0] is not None})
+        trailing = [col for col in numeric if col not in fills
+                    and window.height and window[col].null_count() == window.height]
+        if trailing and end_date:
+            # 窗口内全为缺失且窗口前也无有效值时，全量后向填充会使用窗口后第一个有效值
+            after = scan.filter(pl.col('date') > end_date).select([
+                pl.col(col).fill_nan(None).drop_nulls().first() for col in trailing
+            ]).collect()
+            fills.update({col: after[col][0] for col in trailing if after[col][0] is not None})
+
+        return window.with_columns([
+            pl.col(col).fill_null(fills[col]) if col in fills else pl.col(col)
+            for col in numeric
+        ]).with_columns([
+            pl.col(col).fill_null(strategy='backward').fill_null(0) for col in numeric
+        ])
+
+    @staticmethod
+    def _fill_expr(col):
+        """数值列缺失值处理表达式"""
+        return (pl.col(col).fill_nan(None) # 将NaN转换为None
+                           .fill_null(strategy='forward') # 前向填充
+                           .fill_null(strategy='backward') # 后向填充
+                           .fill_null(0)) # 最后将剩余的NaN填充为0
+
+    @staticmethod
+    def _date_expr(schema):
+        """转换日期列为datetime类型(已是日期类型时保持不变)"""
+        if schema['date'] == pl.String:
+            return pl.col('date').str.to_datetime()
+        return pl.col('date').cast(pl.Datetime)
+
+    @staticmethod
+    def _clip_dates(start_date, end_date, min_date, max_date):
+        """自动调整超出数据范围的日期"""
         if start_date and start_date < min_date:
             start_date = None
         if end_date and end_date > max_date:
             end_date = None
+        return start_date, end_date
 
-        # 日期范围筛选
-        if start_date or end_date:
-            if start_date:
-                self.raw_data = self.raw_data.filter(pl.col('date') >= start_date)
-            if end_date:
-                self.raw_data = self.raw_data.filter(pl.col('date') <= end_date)
+    def _date_predicate(self, start_date, end_date):
+        """日期范围筛选条件，并记录实际使用的日期区间"""
+        self.start_date = start_date
+        self.end_date = end_date
+        predicate = None
+        if start_date:
+            predicate = pl.col('date') >= start_date
+        if end_date:
+            upper = pl.col('date') <= end_date
+            predicate = upper if predicate is None else predicate & upper
+        return predicate
 
-        # 转换数据为numpy格式            
-        self.dates = self.raw_data['date'].to_numpy()  # 直接使用已转换的日期列
-        self.open = self.raw_data['open'].to_numpy()
-        self.high = self.raw_data['high'].to_numpy()
-        self.low = self.raw_data['low'].to_numpy()
-        self.close = self.raw_data['close'].to_numpy()
-        self.settle = self.raw_data['settle'].to_numpy()
-        self.volume = self.raw_data['volume'].to_numpy()
-        self.oi = self.raw_data['oi'].to_numpy()
-        self.amt = self.raw_data['amt'].to_numpy()
-        return self  # 添加返回自身以支持链式调用
+    def window(self, start, stop):
+        """按行号截取[start, stop)区间，返回共享底层数组的新DataHandler(零拷贝视图)
+
+        Args:
+            start (int): 起始行号
+            stop (int): 结束行号(不含)
+        """
+        if self.dates is None:
+            raise ValueError("请先调用preprocess_data再截取数据")
+        view = copy.copy(self)
+        for field in self.ARRAY_FIELDS:
+            values = getattr(self, field)
+            setattr(view, field, None if values is None else values[start:stop])
+        offset = self.row_range[0] if self.row_range else 0
+        view.row_range = (offset + start, offset + start + len(view.dates))
+        return view
+
+    def fingerprint(self):
+        """数据版本标识：源文件内容哈希、预处理日期区间与截取区间
+
+        源文件在加载后被改写时返回None(已加载数据与文件内容不再对应)
+        """
+        if self.data_path is not None and self._stat(self.source_files) != self._source_stat:
+            return None
+        if self._source_digest is None:
+            self._source_digest = ':'.join(file_digest(path) for path in self.source_files)
+        return {
+            'source': self._source_digest,
+            'file_type': self.file_type,
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'row_range': self.row_range
+        }
+
+    @staticmethod
+    def _stat(paths):
+        """各文件的大小与修改时间"""
+        return [(path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in paths]
@@ -0,0 +1,252 @@
+"""
+路径相关的平仓规则：止损、止盈、移动止损与最长持仓期
+
+这些规则依赖入场价与持仓期间的最高/最低价，无法沿时间轴整体向量化。
+逐K线循环写成一个内核函数：安装numba时即时编译(按参数组并行)，未安装时
+参数组较多则使用NumPy实现(沿时间轴循环、在参数组维度上整块运算)，较少则
+以解释器直接执行同一内核(engine='python')。三种实现结果逐位一致。
+
+未安装numba时两者的耗时(2万根K线，单核)：NumPy约0.6秒且几乎不随参数组数
+变化，解释器约每组30毫秒，16~32组之间持平，故auto在不超过PYTHON_MAX_SETS
+组时选择解释器。
+
+规则与信号一样在下一根K线执行：第i根K线的最高/最低价触发规则时，持仓
+保持到第i根K线，第i+1根K线起平仓(按执行价格成交)，之后空仓直到下一个信号。
+"""
+
+import numpy as np
+import polars as pl
+
+from metrics import metrics_table
+
+try:
+    import numba
+except ImportError:  # numba为可选依赖
+    numba = None
+
+HAS_NUMBA = numba is not None
+prange = numba.prange if HAS_NUMBA else range
+
+# 平仓原因编码：标记在平仓前最后一根持仓K线上
+EXIT_NONE, EXIT_SIGNAL, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TRAILING, EXIT_MAX_HOLDING = range(6)
+EXIT_LABELS = np.array(['', 'signal', 'stop_loss', 'take_profit', 'trailing_stop', 'max_holding'])
+EXIT_PARAMS = ('stop_loss', 'take_profit', 'trailing_stop', 'max_holding')
+ENGINES = ('auto', 'numba', 'numpy', 'python')
+PYTHON_MAX_SETS = 16  # 未安装numba时，不超过该参数组数由解释器执行内核(快于NumPy)
+
+
+def _exit_kernel(trading_signal, price, high, low, long_only,
+                 stop_loss, take_profit, trailing_stop, max_holding, position, reason):
+    """逐参数组、逐K线推进持仓(写入position与reason)；可由numba编译
+
+    规则同时触发时的优先级：止损 > 移动止损 > 止盈 > 最长持仓期。
+    """
+    n_sets, n = position.shape
+    for k in prange(n_sets):
+        side = 0.0
+        entry = 0.0
+        best = 0.0
+        held = 0
+        exit_next = False
+        for i in range(n):
+            executed = trading_signal[k, i - 1] if i > 0 else 0.0
+            new_side = 0.0 if exit_next else side
+            if executed == 1:
+                new_side = 1.0
+            elif executed == -1:
+                new_side = 0.0 if long_only else -1.0
+            if side != 0.0 and new_side != side and not exit_next:
+                reason[k, i - 1] = EXIT_SIGNAL  # 信号平仓或反手
+            if new_side != 0.0 and (new_side != side or exit_next):
+                entry = price[i]
+                best = price[i]
+                held = 0
+            side = new_side
+            exit_next = False
+
+            if side > 0:
+                held += 1
+                if low[i] <= entry * (1 - stop_loss[k]):
+                    reason[k, i] = EXIT_STOP_LOSS
+                elif low[i] <= best * (1 - trailing_stop[k]):
+                    reason[k, i] = EXIT_TRAILING
+                elif high[i] >= entry * (1 + take_profit[k]):
+                    reason[k, i] = EXIT_TAKE_PROFIT
+                elif held >= max_holding[k]:
+                    reason[k, i] = EXIT_MAX_HOLDING
+                best = max(best, high[i])
+            elif side < 0:
+                held += 1
+                if high[i] >= entry * (1 + stop_loss[k]):
+                    reason[k, i] = EXIT_STOP_LOSS
+                elif high[i] >= best * (1 + trailing_stop[k]):
+                    reason[k, i] = EXIT_TRAILING
+                elif low[i] <= entry * (1 - take_profit[k]):
+                    reason[k, i] = EXIT_TAKE_PROFIT
+                elif held >= max_holding[k]:
+                    reason[k, i] = EXIT_MAX_HOLDING
+                best = min(best, low[i])
+            exit_next = reason[k, i] != EXIT_NONE
+            position[k, i] = side
+
+
+_compiled_kernel = numba.njit(parallel=True, nogil=True, cache=True)(_exit_kernel) if HAS_NUMBA else None
+
+
+def _exit_numpy(trading_signal, price, high, low, long_only,
+                stop_loss, take_profit, trailing_stop, max_holding, position, reason):
+    """与_exit_kernel相同的规则，沿时间轴循环、在参数组维度上整块运算
+
+    无信号的K线跳过开平仓判断，全部参数组空仓时跳过规则判断。
+    """
+    n_sets, n = position.shape
+    side = np.zeros(n_sets)
+    entry = np.zeros(n_sets)
+    best = np.zeros(n_sets)
+    held = np.zeros(n_sets, dtype=np.int64)
+    exit_next = np.zeros(n_sets, dtype=bool)
+    exit_any = False
+    short_side = 0.0 if long_only else -1.0
+    has_signal = (trading_signal != 0).any(axis=0)
+    # 各规则的价格倍数，与内核中的(1 - stop_loss[k])等取值相同
+    long_stop, short_stop = 1 - stop_loss, 1 + stop_loss
+    long_trail, short_trail = 1 - trailing_stop, 1 + trailing_stop
+    long_take, short_take = 1 + take_profit, 1 - take_profit
+    for i in range(n):
+        prev = side
+        if exit_any:
+            side = np.where(exit_next, 0.0, side)
+        if i > 0 and has_signal[i - 1]:
+            executed = trading_signal[:, i - 1]
+            side = np.where(executed == 1, 1.0, np.where(executed == -1, short_side, side))
+            reason[(prev != 0) & (side != prev) & ~exit_next, i - 1] = EXIT_SIGNAL
+            entering = (side != 0) & ((side != prev) | exit_next)
+            entry[entering] = price[i]
+            best[entering] = price[i]
+            held[entering] = 0
+        position[:, i] = side
+
+        is_long, is_short = side > 0, side < 0
+        active = is_long | is_short
+        if not active.any():
+            exit_next[:] = False
+            exit_any = False
+            continue
+        held += active
+        hi, lo = high[i], low[i]
+        # 按优先级从低到高覆盖
+        code = np.where(active & (held >= max_holding), EXIT_MAX_HOLDING, EXIT_NONE)
+        code = np.where((is_long & (hi >= entry * long_take)) | (is_short & (lo <= entry * short_take)),
+                        EXIT_TAKE_PROFIT, code)
+        code = np.where((is_long & (lo <= best * long_trail)) | (is_short & (hi >= best * short_trail)),
+                        EXIT_TRAILING, code)
+        code = np.where((is_long & (lo <= entry * long_stop)) | (is_short & (hi >= entry * short_stop)),
+                        EXIT_STOP_LOSS, code)
+        reason[:, i] = code
+        exit_next = code != EXIT_NONE
+        exit_any = exit_next.any()
+        best = np.where(is_long, np.maximum(best, hi), np.where(is_short, np.minimum(best, lo), best))
+
+
+def _param_array(values, n_sets):
+    """参数转为每组一个值的数组，None或0表示不启用该规则(取np.inf)"""
+    values = np.broadcast_to(np.asarray(np.inf if values is None else values, dtype=np.float64), (n_sets,))
+    return np.where(values > 0, values, np.inf)
+
+
+def apply_exit_rules(trading_signal, execution_price, high, low, stop_loss=None, take_profit=None,
+                     trailing_stop=None, max_holding=None, long_only=False, engine='auto'):
+    """在交易信号上叠加平仓规则，返回持仓与平仓原因
+
+    规则参数可为标量或每个参数组一个值的数组(多组参数一次批量计算)；
+    trading_signal也可为(参数组数 × 长度)矩阵，如批量扫描得到的各span信号。
+
+    Args:
+        trading_signal (np.ndarray): 1/0/-1信号(隔日执行)
+        execution_price (np.ndarray): 执行价格，入场价按其计
+        high, low (np.ndarray): 最高价与最低价，用于判断规则是否触发
+        stop_loss (float | np.ndarray): 止损比例(相对入场价)，如0.05
+        take_profit (float | np.ndarray): 止盈比例(相对入场价)
+        trailing_stop (float | np.ndarray): 移动止损比例(相对入场后的最优价)
+        max_holding (int | np.ndarray): 最长持仓K线数
+        long_only (bool): True时卖出信号平仓为0，否则做空为-1
+        engine (str): 'auto'(有numba时编译执行，否则按参数组数选择python或numpy)、
+            'numba'、'numpy'或'python'
+    Returns:
+        tuple: (持仓, 平仓原因编码int8)；任一输入为多组时为(参数组数 × 长度)矩阵，否则为一维
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"不支持的engine: {engine}")
+    if engine == 'numba' and not HAS_NUMBA:
+        raise ImportError("engine='numba'需要安装numba")
+    params = [stop_loss, take_profit, trailing_stop, max_holding]
+    batched = np.ndim(trading_signal) == 2 or any(np.ndim(value) > 0 for value in params)
+    n = np.shape(trading_signal)[-1]
+    n_sets = max([np.shape(trading_signal)[0] if np.ndim(trading_signal) == 2 else 1]
+                 + [np.size(value) for value in params if np.ndim(value) > 0])
+
+    trading_signal = np.ascontiguousarray(np.broadcast_to(np.asarray(trading_signal, dtype=np.float64), (n_sets, n)))
+    price, high, low = (np.ascontiguousarray(values, dtype=np.float64) for values in (execution_price, high, low))
+    stop_loss, take_profit, trailing_stop, max_holding = (_param_array(value, n_sets) for value in params)
+    max_holding = np.where(np.isfinite(max_holding), max_holding, 0).astype(np.int64)
+    max_holding[max_holding == 0] = np.iinfo(np.int64).max
+
+    position = np.zeros((n_sets, n), dtype=np.float64)
+    reason = np.zeros((n_sets, n), dtype=np.int8)
+    args = (trading_signal, price, high, low, long_only,
+            stop_loss, take_profit, trailing_stop, max_holding, position, reason)
+    if engine == 'auto':
+        engine = 'numba' if HAS_NUMBA else 'python' if n_sets <= PYTHON_MAX_SETS else 'numpy'
+    if engine == 'numba':
+        _compiled_kernel(*args)
+    elif engine == 'python':
+        _exit_kernel(*args)
+    else:
+        with np.errstate(invalid='ignore', over='ignore'):
+            _exit_numpy(*args)
+    if batched:
+        return position, reason
+    return position[0], reason[0]
+
+
+def decode_exit_reasons(codes):
+    """平仓原因编码转为字符串(''/'signal'/'stop_loss'/...)"""
+    return EXIT_LABELS[np.asarray(codes, dtype=np.intp)]
+
+
+def exit_rule_sweep(strategy_core, engine='auto', **grid):
+    """在已生成信号的策略上批量评估多组平仓规则参数
+
+    Args:
+        strategy_core (TradingStrategyCore): 已调用generate_signals的策略
+        engine (str): 见apply_exit_rules
+        **grid: 规则参数 -> 等长的参数值序列，如stop_loss=[0.02, 0.05], max_holding=[20, 20]
+    Returns:
+        pl.DataFrame: 每行一组参数及其绩效指标(含按原因统计的平仓次数)
+    """
+    unknown = [key for key in grid if key not in EXIT_PARAMS]
+    if unknown:
+        raise ValueError(f"不支持的平仓规则参数: {unknown}")
+    data = strategy_core.processed_data
+    if data is None:
+        raise ValueError("请先调用generate_signals再评估平仓规则")
+    handler = strategy_core.data_handler
+    if handler.high is None or handler.low is None:
+        raise ValueError("平仓规则需要high与low列，请在预处理时加载")
+    grid = {key: np.atleast_1d(np.asarray(values, dtype=np.float64)) for key, values in grid.items()}
+    n_sets = max((len(values) for values in grid.values()), default=1)
+    grid = {key: np.broadcast_to(values, (n_sets,)) for key, values in grid.items()}
+
+    execution_price = np.asarray(data['ExecutionPrice'], dtype=np.float64)
+    long_only = (strategy_core.strategy_type == 'EWMA_LONG_ONLY'
+                 or strategy_core.strategy_params.get('long_only', False))
+    position, reason = apply_exit_rules(
+        np.broadcast_to(data['TradingSignal'], (n_sets, len(execution_price))),
+        execution_price, handler.high, handler.low, long_only=long_only, engine=engine, **grid)
+    # 与BacktestEngine.run_backtest相同的收益计算
+    returns = np.append(execution_price[1:] / execution_price[:-1] - 1, 0)
+    table = metrics_table(position * returns, position)
+    counts = {f'Exits_{EXIT_LABELS[code]}': (reason == code).sum(axis=1)
+              for code in range(EXIT_SIGNAL, len(EXIT_LABELS))}
+    return pl.concat([pl.DataFrame({key: np.asarray(values) for key, values in grid.items()}),
+                      table.drop('Run'), pl.DataFrame(counts)], how='horizontal')
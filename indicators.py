@@ -0,0 +1,197 @@
+"""
+技术指标库
+
+每个指标注册为polars表达式构造函数，输入为行情列(open/high/low/close/settle/
+volume/oi/amt)。策略需要的全部指标在compute_indicators中放入同一个select，
+由polars一次查询完成：各指标共用同一份输入列，公共子表达式(如close的差分)
+只计算一次，不同指标之间并行执行，不再逐个指标循环遍历数据。
+
+新增指标：
+    @register_indicator('MY_IND', inputs=('close',), defaults={'span': 10})
+    def my_indicator(span):
+        return pl.col('close').rolling_mean(span)  # 多输出时返回{后缀: 表达式}
+"""
+
+import numpy as np
+import polars as pl
+
+# 指标名 -> (表达式构造函数, 输入列, 默认参数)
+INDICATORS = {}
+SERIES_COLUMN = '_series'  # 二维输入时的序列编号列
+
+
+def register_indicator(name, inputs, defaults=None):
+    """注册指标表达式构造函数
+
+    Args:
+        name (str): 指标名(大写，如'SMA')
+        inputs (Sequence[str]): 使用的行情列
+        defaults (dict): 参数默认值，参数顺序即列名中参数值的顺序
+    """
+    def decorator(builder):
+        INDICATORS[name] = (builder, tuple(inputs), dict(defaults or {}))
+        return builder
+    return decorator
+
+
+def indicator_params(name, **params):
+    """合并默认参数，参数名不在默认参数中时报错"""
+    if name not in INDICATORS:
+        raise ValueError(f"未注册的指标: {name}")
+    defaults = INDICATORS[name][2]
+    unknown = [key for key in params if key not in defaults]
+    if unknown:
+        raise ValueError(f"指标{name}不支持参数: {unknown}")
+    return {**defaults, **params}
+
+
+def indicator_outputs(name, **params):
+    """指标输出：(列名前缀, {后缀: 表达式})，单输出指标的后缀为None
+
+    列名前缀为指标名加各参数值，如'SMA_20'；多输出指标的列名再加后缀，如'BOLLINGER_20_2_UPPER'。
+    """
+    params = indicator_params(name, **params)
+    base = '_'.join([name] + [f'{value:g}' if isinstance(value, float) else str(value)
+                              for value in params.values()])
+    exprs = INDICATORS[name][0](**params)
+    if isinstance(exprs, pl.Expr):
+        return base, {None: exprs}
+    return base, exprs
+
+
+def column_name(base, suffix):
+    return base if suffix is None else f'{base}_{suffix}'
+
+
+def compute_indicators(source, requests):
+    """在一次polars查询中计算多个指标
+
+    Args:
+        source (DataHandler | Mapping[str, np.ndarray]): 行情数组来源(DataHandler的
+            open/high/low/close/settle/volume/oi/amt字段，或同名键的字典)；
+            数组为(序列数 × 长度)矩阵时按行分别计算，如面板中每个品种一行
+        requests (Mapping[str, tuple]): 键 -> (指标名, 参数字典)
+    Returns:
+        dict: 键 -> 单输出指标为float64数组，多输出指标为{后缀: 数组}，形状与输入相同；
+            窗口未满的前段为NaN
+    """
+    exprs = {}
+    outputs = {}
+    inputs = set()
+    for key, (name, params) in requests.items():
+        base, parts = indicator_outputs(name, **params)
+        outputs[key] = (base, list(parts))
+        # 同一指标同一参数被多次请求时只计算一次
+        exprs.update({column_name(base, suffix): expr for suffix, expr in parts.items()})
+        inputs.update(INDICATORS[name][1])
+
+    arrays = {}
+    for col in sorted(inputs):
+        values = source.get(col) if isinstance(source, dict) else getattr(source, col, None)
+        if values is None:
+            raise ValueError(f"指标需要行情列{col}，请在预处理时加载该列")
+        arrays[col] = np.asarray(values, dtype=np.float64)
+    shape = next(iter(arrays.values())).shape if arrays else (0,)
+    if len(shape) == 2:
+        # 多个序列(如多个品种)首尾相接为一列，按序列分组计算，仍为一次查询
+        arrays = {col: values.reshape(-1) for col, values in arrays.items()}
+        arrays[SERIES_COLUMN] = np.repeat(np.arange(shape[0]), shape[1])
+        exprs = {col: expr.over(SERIES_COLUMN) for col, expr in exprs.items()}
+    frame = pl.DataFrame(arrays).lazy().select([
+        expr.cast(pl.Float64).fill_null(np.nan).alias(col) for col, expr in exprs.items()
+    ]).collect()
+
+    def column(name):
+        return frame[name].to_numpy().reshape(shape)
+
+    results = {}
+    for key, (base, suffixes) in outputs.items():
+        if suffixes == [None]:
+            results[key] = column(base)
+        else:
+            results[key] = {suffix: column(column_name(base, suffix)) for suffix in suffixes}
+    return results
+
+
+@register_indicator('SMA', inputs=('close',), defaults={'span': 20})
+def sma(span):
+    """简单移动平均"""
+    return pl.col('close').rolling_mean(span)
+
+
+def ewma_expr(expr, span):
+    """EWMA表达式(adjust=False)：ewma[0]=x[0], ewma[i]=ewma[i-1]+alpha*(x[i]-ewma[i-1])，alpha=2/(span+1)
+
+    策略内核(ewma_kernel等)、EWMA指标与增量更新共用这一递推，舍入逐位一致；
+    从某根K线的EWMA接续递推与整段计算的结果也逐位一致(分块回测依赖这一点)。
+    """
+    return expr.ewm_mean(span=span, adjust=False)
+
+
+@register_indicator('EWMA', inputs=('close',), defaults={'span': 30})
+def ewma(span):
+    """指数移动平均(与ewma_kernel一致)"""
+    return ewma_expr(pl.col('close'), span)
+
+
+@register_indicator('RSI', inputs=('close',), defaults={'period': 14})
+def rsi(period):
+    """相对强弱指标(Wilder平滑，alpha=1/period)，取值0~100"""
+    change = pl.col('close').diff().fill_null(0)
+    gain = change.clip(lower_bound=0).ewm_mean(alpha=1 / period, adjust=False)
+    loss = (-change).clip(lower_bound=0).ewm_mean(alpha=1 / period, adjust=False)
+    # 无下跌时为100，区间内无涨跌(如首根K线)时为中性值50
+    return (pl.when(loss > 0).then(100 - 100 / (1 + gain / loss))
+              .when(gain > 0).then(100.0)
+              .otherwise(50.0))
+
+
+@register_indicator('BOLLINGER', inputs=('close',), defaults={'span': 20, 'k': 2.0})
+def bollinger(span, k):
+    """布林带：中轨为简单移动平均，上下轨为中轨±k倍滚动标准差"""
+    mid = pl.col('close').rolling_mean(span)
+    width = k * pl.col('close').rolling_std(span)
+    return {'MID': mid, 'UPPER': mid + width, 'LOWER': mid - width}
+
+
+def true_range():
+    """真实波幅：max(最高-最低, |最高-前收|, |最低-前收|)，首根K线为最高-最低"""
+    prev_close = pl.col('close').shift(1)
+    return pl.max_horizontal(pl.col('high') - pl.col('low'),
+                             (pl.col('high') - prev_close).abs(),
+                             (pl.col('low') - prev_close).abs())
+
+
+@register_indicator('ATR', inputs=('high', 'low', 'close'), defaults={'period': 14})
+def atr(period):
+    """平均真实波幅(Wilder平滑)"""
+    return true_range().ewm_mean(alpha=1 / period, adjust=False)
+
+
+@register_indicator('DONCHIAN', inputs=('high', 'low'), defaults={'window': 20})
+def donchian(window):
+    """唐奇安通道：window根K线内的最高价与最低价(含当根)"""
+    upper = pl.col('high').rolling_max(window)
+    lower = pl.col('low').rolling_min(window)
+    return {'UPPER': upper, 'LOWER': lower, 'MID': (upper + lower) / 2}
+
+
+@register_indicator('VWAP', inputs=('amt', 'volume'), defaults={'window': 20, 'multiplier': 1.0})
+def vwap(window, multiplier):
+    """成交量加权均价：滚动成交额/滚动成交量/合约乘数
+
+    期货成交额包含合约乘数(如黄金1000、白银15)，multiplier设为该值后与价格同一量纲；
+    window为0时从首根K线累计。
+    """
+    if window:
+        amt, volume = pl.col('amt').rolling_sum(window), pl.col('volume').rolling_sum(window)
+    else:
+        amt, volume = pl.col('amt').cum_sum(), pl.col('volume').cum_sum()
+    return pl.when(volume > 0).then(amt / volume / multiplier)
+
+
+@register_indicator('OI_MOMENTUM', inputs=('oi',), defaults={'period': 5})
+def oi_momentum(period):
+    """持仓量动量：持仓量相对period根K线前的变化率"""
+    previous = pl.col('oi').shift(period)
+    return pl.when(previous > 0).then(pl.col('oi') / previous - 1)
@@ -0,0 +1,273 @@
+"""
+流程阶段计时与内存统计
+
+在DataHandler、TradingStrategyCore、BacktestEngine、StrategyVisualizer及
+wind_data.py的各阶段埋点，记录墙钟时间、CPU时间、内存分配峰值与处理行数，
+可按品种区分。结果可写为JSON，或写为trace-event格式在chrome://tracing、
+Perfetto等工具中按时间线查看。
+
+默认关闭，此时埋点只做一次全局开关判断；设置环境变量TRADING_INSTRUMENT=1
+(需要内存峰值时设为'memory')或调用enable()开启。长时间运行(如模拟交易服务)
+时逐条记录只保留最近max_records条，按阶段与品种的汇总则累计全部记录。
+
+用法：
+    import instrumentation
+    instrumentation.enable(trace_memory=True)
+    with instrumentation.stage('my_stage', symbol='AUFI_WI') as s:
+        ...
+        s.rows = 1000
+    instrumentation.write_trace('trace.json')
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+DEFAULT_MAX_RECORDS = 100_000  # 逐条记录保留的上限(超出时丢弃最早的记录)
+
+_state = {'enabled': False, 'trace_memory': False}
+_records = deque(maxlen=DEFAULT_MAX_RECORDS)
+_totals = {}  # (阶段名, 品种) -> 汇总，不受逐条记录上限影响
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+
+
+def enable(trace_memory=False, max_records=None):
+    """开启埋点；trace_memory为True时用tracemalloc统计每个阶段的内存分配峰值(有额外开销，
+    只统计Python与NumPy的分配，不含polars/Arrow在Rust侧的分配)；max_records指定时
+    修改逐条记录保留的上限(保留已有记录中最近的部分)"""
+    global _records
+    if max_records is not None:
+        with _lock:
+            _records = deque(_records, maxlen=max_records)
+    _state['enabled'] = True
+    _state['trace_memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    """关闭埋点(已记录的结果保留)"""
+    _state['enabled'] = False
+    if _state['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _state['trace_memory'] = False
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+def reset():
+    """清空已记录的结果"""
+    with _lock:
+        _records.clear()
+        _totals.clear()
+
+
+def records():
+    """已记录的阶段列表(按结束顺序，最多保留最近max_records条)"""
+    with _lock:
+        return list(_records)
+
+
+def symbol_from_path(path):
+    """数据文件路径 -> 品种名(文件名去掉扩展名)"""
+    return None if path is None else os.path.splitext(os.path.basename(path))[0]
+
+
+class _NullStage:
+    """关闭时使用的空阶段，不做任何记录"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """One timed stage; nested stages inherit the enclosing symbol.
+
+    Attributes:
+        name: Stage name, e.g. 'DataHandler.preprocess_data'
+        symbol: Symbol the stage works on, None if unknown
+        rows: Number of rows processed, set inside the with block
+        attrs: Extra JSON-serializable fields
+    """
+    __slots__ = ('name', 'symbol', 'rows', 'attrs', '_start', '_cpu', '_peak', '_parent_peak', '_base')
+
+    def __init__(self, name, symbol=None, rows=None, **attrs):
+        self.name = name
+        self.symbol = symbol
+        self.rows = rows
+        self.attrs = attrs
+
+    def __enter__(self):
+        stack = _stack()
+        if self.symbol is None and stack:
+            self.symbol = stack[-1].symbol
+        if _state['trace_memory'] and tracemalloc.is_tracing():
+            # 外层阶段的峰值先保存，再为本阶段重新计峰值
+            self._base, self._parent_peak = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        else:
+            self._parent_peak = None
+        self._peak = 0
+        stack.append(self)
+        self._cpu = time.thread_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        cpu = time.thread_time() - self._cpu
+        stack = _stack()
+        stack.pop()
+        record = {
+            'name': self.name,
+            'symbol': self.symbol,
+            'rows': self.rows,
+            'start_s': self._start - _origin,
+            'wall_s': end - self._start,
+            'cpu_s': cpu,
+            'peak_mb': None,
+            'depth': len(stack),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'error': None if exc_type is None else exc_type.__name__,
+            **self.attrs
+        }
+        if self._parent_peak is not None:
+            peak = max(self._peak, tracemalloc.get_traced_memory()[1])
+            # 相对进入阶段时已分配内存的增量峰值
+            record['peak_mb'] = (peak - self._base) / 1024**2
+            # 本阶段峰值计入外层阶段，并恢复外层阶段此前的峰值
+            if stack:
+                stack[-1]._peak = max(stack[-1]._peak, peak, self._parent_peak)
+        with _lock:
+            _records.append(record)
+            _accumulate(record)
+        return False
+
+
+def _accumulate(record):
+    """将一条记录计入按阶段与品种的汇总(调用方持有_lock)"""
+    key = (record['name'], record['symbol'])
+    t = _totals.get(key)
+    if t is None:
+        t = _totals[key] = {'name': record['name'], 'symbol': record['symbol'], 'calls': 0,
+                            'wall_s': 0.0, 'cpu_s': 0.0, 'peak_mb': None, 'rows': 0}
+    t['calls'] += 1
+    t['wall_s'] += record['wall_s']
+    t['cpu_s'] += record['cpu_s']
+    t['rows'] += record['rows'] or 0
+    if record['peak_mb'] is not None:
+        t['peak_mb'] = max(t['peak_mb'] or 0.0, record['peak_mb'])
+
+
+def _stack():
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def stage(name, symbol=None, rows=None, **attrs):
+    """阶段上下文管理器；关闭时返回空阶段"""
+    if not _state['enabled']:
+        return _NULL_STAGE
+    return Stage(name, symbol, rows, **attrs)
+
+
+def instrument(name=None, rows=None, symbol=None):
+    """方法/函数埋点装饰器
+
+    Args:
+        name (str): 阶段名，默认为函数的限定名
+        rows (Callable): rows(result, *args, **kwargs) -> 行数(可选)
+        symbol (Callable): symbol(*args, **kwargs) -> 品种名(可选)，默认沿用外层阶段
+    """
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _state['enabled']:
+                return func(*args, **kwargs)
+            with Stage(stage_name, symbol(*args, **kwargs) if symbol else None) as s:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    s.rows = rows(result, *args, **kwargs)
+            return result
+        return wrapper
+    return decorator
+
+
+def summary():
+    """按阶段与品种汇总次数、总耗时、CPU时间、最大内存峰值与行数(含已超出逐条记录上限的记录)"""
+    with _lock:
+        totals = [dict(t) for t in _totals.values()]
+    return sorted(totals, key=lambda t: -t['wall_s'])
+
+
+def write_json(path):
+    """写入全部阶段记录与汇总"""
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'records': records(), 'summary': summary()}, f, ensure_ascii=False, indent=1)
+    return path
+
+
+def write_trace(path):
+    """写入trace-event格式(chrome://tracing、Perfetto可直接打开)"""
+    events = []
+    for r in records():
+        args = {k: v for k, v in r.items()
+                if k not in ('name', 'start_s', 'wall_s', 'pid', 'tid', 'depth') and v is not None}
+        events.append({
+            'name': r['name'] if r['symbol'] is None else f"{r['name']} [{r['symbol']}]",
+            'cat': r['name'].split('.')[0],
+            'ph': 'X',
+            'ts': r['start_s'] * 1e6,
+            'dur': r['wall_s'] * 1e6,
+            'pid': r['pid'],
+            'tid': r['tid'],
+            'args': args
+        })
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f, ensure_ascii=False)
+    return path
+
+
+def export(prefix):
+    """写出<prefix>.json(记录与汇总)与<prefix>.trace.json(trace-event)，并打印汇总"""
+    write_json(f'{prefix}.json')
+    write_trace(f'{prefix}.trace.json')
+    print_summary()
+    print(f"埋点结果已写入 {prefix}.json 与 {prefix}.trace.json")
+
+
+def print_summary():
+    """打印汇总表"""
+    print(f"{'stage':<40} {'symbol':<12} {'calls':>6} {'wall(s)':>9} {'cpu(s)':>9} "
+          f"{'peak(MB)':>9} {'rows':>10}")
+    for t in summary():
+        peak = '' if t['peak_mb'] is None else f"{t['peak_mb']:.1f}"
+        print(f"{t['name']:<40} {str(t['symbol'] or ''):<12} {t['calls']:>6} {t['wall_s']:>9.4f} "
+              f"{t['cpu_s']:>9.4f} {peak:>9} {t['rows']:>10}")
+
+
+_env = os.environ.get('TRADING_INSTRUMENT', '').lower()
+if _env and _env not in ('0', 'false', 'no'):
+    enable(trace_memory=_env == 'memory')
@@ -0,0 +1,413 @@
+"""
+配置驱动的批量回测
+
+任务文件(JSON)描述 品种 × 策略 × 参数 × 日期区间 的组合，例如：
+
+    {
+        "data_dir": "data",
+        "file_type": "parquet",
+        "symbols": ["AUFI_WI", "AGFI_WI"],
+        "strategies": [
+            {"type": "EWMA_LONG_ONLY", "params": {"span": [20, 30, 60]}},
+            {"type": "RSI", "params": {"period": 14}, "charts": true}
+        ],
+        "date_ranges": [["2020-01-01", "2025-05-20"], [null, null]],
+        "dtype": "float64",
+        "ledger": false,
+        "output_dir": "runs/example"
+    }
+
+参数值为列表时按网格展开；symbols省略时使用data_dir下的全部文件；file_type为
+'store'时data_dir为合并存储(MarketDataStore)目录。charts/ledger/equity/chart_format
+可在顶层或单个策略中指定。指定"results_store"目录时，每个任务的元数据与指标
+(equity为true时含净值曲线)追加到该结果存储(ResultsStore)，批次名为"campaign"
+(默认取任务文件名)。
+
+任务按估计耗时(数据行数)从长到短提交到进程池，每完成一个任务即追加到
+输出目录下的checkpoint.jsonl，中断后再次运行会跳过已完成的任务。
+只有需要图表的任务才会导入绘图模块(matplotlib)。
+
+    python job_runner.py jobs.json --workers 4
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import polars as pl
+
+from data_handler import DataHandler, dataset_files
+from strategy_core import TradingStrategyCore, STRATEGIES
+from backtest_engine import BacktestEngine
+from market_store import MarketDataStore
+from result_cache import make_key
+from results_store import ResultsStore, run_record
+
+DEFAULT_OUTPUT_DIR = 'runs'
+JOB_OPTIONS = ('charts', 'ledger', 'equity', 'chart_format')
+STORE_BATCH_SIZE = 1000  # 结果存储每批写入的任务数(检查点在结果写入后记录)
+
+# 进程内已打开的合并存储(同一进程的多个任务共用一次映射)
+_STORES = {}
+# 数据源 -> 行数(估计任务耗时用)
+_SOURCE_ROWS = {}
+
+
+def _parse_date(value):
+    """任务文件中的日期(ISO字符串或null)"""
+    return None if value is None else datetime.fromisoformat(value)
+
+
+def _param_grid(params):
+    """参数字典按列表值展开为网格"""
+    names = list(params)
+    values = [v if isinstance(v, list) else [v] for v in params.values()]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def _symbol_paths(data_dir, file_type, symbols=None):
+    """品种 -> 数据路径(合并存储时为存储目录)"""
+    if file_type == 'store':
+        available = {s: data_dir for s in MarketDataStore(data_dir).symbols()}
+    else:
+        suffix = f'.{file_type}'
+        available = {
+            name[:-len(suffix)]: os.path.join(data_dir, name)
+            for name in sorted(os.listdir(data_dir)) if name.endswith(suffix)
+        }
+    if symbols is None:
+        return available
+    missing = [s for s in symbols if s not in available]
+    if missing:
+        raise ValueError(f"数据目录中缺少品种: {missing}")
+    return {s: available[s] for s in symbols}
+
+
+def _check_strategy(strategy_type, params):
+    """提前检查策略类型与参数，避免任务在进程池中才失败"""
+    if strategy_type not in STRATEGIES and \
+            not hasattr(TradingStrategyCore, f'_generate_{strategy_type.lower()}_signals'):
+        raise ValueError(f"不支持的策略类型: {strategy_type}")
+    TradingStrategyCore(None, strategy_type=strategy_type, **params)
+
+
+def expand_jobs(spec, output_dir=None):
+    """任务文件内容展开为任务列表
+
+    Args:
+        spec (dict): 任务文件内容(见模块说明)
+        output_dir (str): 输出目录，默认取spec['output_dir']
+    Returns:
+        list[dict]: 每个 品种 × 策略参数 × 日期区间 一个任务
+    """
+    file_type = spec.get('file_type', 'parquet')
+    output_dir = output_dir or spec.get('output_dir', DEFAULT_OUTPUT_DIR)
+    paths = _symbol_paths(spec.get('data_dir', 'data'), file_type, spec.get('symbols'))
+    date_ranges = spec.get('date_ranges', [[None, None]])
+    dtype = np.dtype(spec.get('dtype', 'float64')).name
+    campaign = spec.get('campaign') if spec.get('results_store') else None
+    defaults = {'charts': False, 'ledger': False, 'equity': False, 'chart_format': 'png',
+                **{k: spec[k] for k in JOB_OPTIONS if k in spec}}
+
+    jobs = []
+    for strategy in spec.get('strategies', [{'type': 'EWMA'}]):
+        options = {**defaults, **{k: strategy[k] for k in JOB_OPTIONS if k in strategy}}
+        for params in _param_grid(strategy.get('params', {})):
+            _check_strategy(strategy['type'], params)
+            for (symbol, data_path), (start, end) in itertools.product(paths.items(), date_ranges):
+                key = make_key(stage='job', symbol=symbol, strategy_type=strategy['type'],
+                               params=params, start_date=start, end_date=end, dtype=dtype)
+                jobs.append({
+                    'id': key[:16],
+                    'symbol': symbol,
+                    'data_path': data_path,
+                    'file_type': file_type,
+                    'strategy_type': strategy['type'],
+                    'params': params,
+                    'start_date': start,
+                    'end_date': end,
+                    'dtype': dtype,
+                    'output_dir': output_dir,
+                    'campaign': campaign,
+                    **options
+                })
+    return jobs
+
+
+def _store(root):
+    if root not in _STORES:
+        _STORES[root] = MarketDataStore(root)
+    return _STORES[root]
+
+
+def estimate_rows(job):
+    """任务的估计耗时：数据源的行数(含增量分片，只读文件元数据，同一数据源只读一次)"""
+    source = (job['data_path'], job['symbol'] if job['file_type'] == 'store' else None)
+    if source not in _SOURCE_ROWS:
+        if job['file_type'] == 'store':
+            index = _store(job['data_path']).index.get(job['symbol'], [])
+            _SOURCE_ROWS[source] = sum(stop - start for _, start, stop in index)
+        elif job['file_type'] == 'parquet':
+            _SOURCE_ROWS[source] = pl.scan_parquet(dataset_files(job['data_path'])).select(pl.len()).collect().item()
+        else:
+            # CSV没有行数元数据，按文件大小估计
+            _SOURCE_ROWS[source] = os.path.getsize(job['data_path'])
+    return _SOURCE_ROWS[source]
+
+
+def _load(job):
+    start_date, end_date = _parse_date(job['start_date']), _parse_date(job['end_date'])
+    if job['file_type'] == 'store':
+        return DataHandler.from_store(_store(job['data_path']), job['symbol'], start_date, end_date)
+    data_loader = DataHandler(job['data_path'], file_type=job['file_type'])
+    data_loader.preprocess_data(start_date=start_date, end_date=end_date)
+    return data_loader
+
+
+def run_job(job):
+    """执行单个任务(进程池任务)
+
+    Returns:
+        dict: 任务记录(任务字段、行数、耗时、绩效指标及写入的文件)
+    """
+    started = time.perf_counter()
+    data_loader = _load(job)
+    strategy = TradingStrategyCore(data_loader, strategy_type=job['strategy_type'],
+                                   dtype=job['dtype'], **job['params'])
+    strategy.generate_signals()
+    backtester = BacktestEngine(strategy)
+    backtester.run_backtest()
+    metrics = backtester.performance_metrics()
+
+    files = []
+    if job['ledger']:
+        ledger_dir = os.path.join(job['output_dir'], 'ledgers')
+        os.makedirs(ledger_dir, exist_ok=True)
+        path = os.path.join(ledger_dir, f"{job['id']}.parquet")
+        backtester.trade_ledger(path=path)
+        files.append(path)
+    if job['charts']:
+        # 仅在需要图表时导入绘图模块，无图表的批量任务不加载matplotlib
+        from visualization import StrategyVisualizer
+        visualizer = StrategyVisualizer(strategy, data_loader, fmt=job['chart_format'],
+                                        output_dir=os.path.join(job['output_dir'], 'charts'),
+                                        name=f"{job['symbol']}_{job['id']}")
+        files.extend(visualizer.plot_results())
+
+    record = {
+        'id': job['id'],
+        'status': 'done',
+        'rows': len(data_loader.dates),
+        'elapsed': time.perf_counter() - started,
+        'metrics': {name: value.item() if hasattr(value, 'item') else value
+                    for name, value in metrics.items()},
+        'files': files
+    }
+    if job['campaign'] is not None:
+        # 结果存储的记录由主进程统一写入(不写入检查点)
+        record['result'] = run_record(strategy, symbol=job['symbol'], campaign=job['campaign'],
+                                      equity=job['equity'])
+    return record
+
+
+class JobRunner:
+    """Config-driven batch of backtest jobs with checkpoint and resume.
+
+    Jobs are the expansion of symbols × strategy parameters × date ranges of a
+    job file. Pending jobs are submitted to a spawn process pool in order of
+    decreasing estimated cost (data rows), so the longest jobs do not end up
+    last on an otherwise idle pool. Every finished job is appended to a JSON
+    Lines checkpoint in output_dir; a rerun skips jobs already recorded as done.
+    With a results store, runs are written to it in batches and a batch is
+    checkpointed only after it has been written.
+
+    Attributes:
+        jobs: List of job dicts (see expand_jobs)
+        output_dir: Directory holding the checkpoint, summary, ledgers and charts
+        results_store: Optional ResultsStore directory receiving every finished run
+        records: Job id -> record of finished or failed jobs
+    """
+    CHECKPOINT_FILE = 'checkpoint.jsonl'
+    SUMMARY_FILE = 'summary.parquet'
+
+    def __init__(self, jobs, output_dir=DEFAULT_OUTPUT_DIR, results_store=None):
+        self.jobs = list(jobs)
+        self.output_dir = output_dir
+        self.results_store = results_store
+        self.records = {}
+        self._uncommitted = []
+
+    @classmethod
+    def from_file(cls, path, output_dir=None, results_store=None):
+        """由JSON任务文件构建，output_dir/results_store默认取任务文件中的设置"""
+        with open(path, encoding='utf-8') as f:
+            spec = json.load(f)
+        output_dir = output_dir or spec.get('output_dir', DEFAULT_OUTPUT_DIR)
+        spec['results_store'] = results_store or spec.get('results_store')
+        spec.setdefault('campaign', os.path.splitext(os.path.basename(path))[0])
+        return cls(expand_jobs(spec, output_dir), output_dir, spec['results_store'])
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.output_dir, self.CHECKPOINT_FILE)
+
+    def load_checkpoint(self):
+        """读取检查点中的任务记录(后写入的记录为准，忽略中断时未写完的末行)"""
+        self.records = {}
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    self.records[record['id']] = record
+        return self.records
+
+    def pending(self):
+        """未完成的任务，按估计耗时从长到短排序"""
+        jobs = [job for job in self.jobs if self.records.get(job['id'], {}).get('status') != 'done']
+        return sorted(jobs, key=estimate_rows, reverse=True)
+
+    def run(self, max_workers=None, resume=True, verbose=True):
+        """执行全部未完成的任务并写出汇总表
+
+        Args:
+            max_workers (int): 进程数，默认使用全部CPU核心；为1时在当前进程内串行执行
+            resume (bool): 为True时跳过检查点中已完成的任务，否则清空检查点重新运行
+            verbose (bool): 为True时逐个打印完成的任务
+        Returns:
+            pl.DataFrame: 全部任务的汇总表(见summary)
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        if resume:
+            self.load_checkpoint()
+        else:
+            self.records = {}
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        jobs = self.pending()
+        if verbose:
+            print(f"共{len(self.jobs)}个任务，已完成{len(self.jobs) - len(jobs)}个，待运行{len(jobs)}个")
+
+        store = None
+        if self.results_store is not None:
+            store = ResultsStore(self.results_store, batch_size=STORE_BATCH_SIZE)
+        with open(self.checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            if checkpoint.tell() and not self._ends_with_newline():
+                checkpoint.write('\n')  # 中断时未写完的末行单独成行，不与新记录相连
+            try:
+                if max_workers == 1:
+                    for job in jobs:
+                        self._finish(checkpoint, store, job, *self._call(job), verbose)
+                else:
+                    executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                                   mp_context=multiprocessing.get_context('spawn'))
+                    try:
+                        # 按排序顺序提交，进程池按提交顺序分派，耗时长的任务先开始
+                        futures = {executor.submit(run_job, job): job for job in jobs}
+                        for future in as_completed(futures):
+                            error = future.exception()
+                            record = None if error is not None else future.result()
+                            self._finish(checkpoint, store, futures[future], record, error, verbose)
+                    except BaseException:
+                        # 中断时取消尚未开始的任务
+                        executor.shutdown(wait=False, cancel_futures=True)
+                        raise
+                    executor.shutdown()
+            finally:
+                # 已完成的任务写入结果存储与检查点
+                self._commit(checkpoint, store)
+
+        summary = self.summary()
+        summary.write_parquet(os.path.join(self.output_dir, self.SUMMARY_FILE))
+        return summary
+
+    def _ends_with_newline(self):
+        with open(self.checkpoint_path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b'\n'
+
+    @staticmethod
+    def _call(job):
+        try:
+            return run_job(job), None
+        except Exception as error:
+            return None, error
+
+    def _finish(self, checkpoint, store, job, record, error, verbose):
+        """记录一个任务的结果(失败的任务在下次运行时重试)
+
+        无结果存储时立即写入检查点，否则每STORE_BATCH_SIZE个任务写入结果存储后再写入检查点。
+        """
+        if error is not None:
+            record = {'id': job['id'], 'status': 'failed', 'error': repr(error)}
+        if 'result' in record:
+            store.add_record(*record.pop('result'))
+        self.records[job['id']] = record
+        self._uncommitted.append(record)
+        if store is None or len(self._uncommitted) >= store.batch_size:
+            self._commit(checkpoint, store)
+        if verbose:
+            label = f"{job['symbol']} {job['strategy_type']} {job['params']} {job['start_date']}~{job['end_date']}"
+            if error is not None:
+                print(f"失败 {label}: {error!r}")
+            else:
+                print(f"完成 {label} ({record['rows']}行, {record['elapsed']:.2f}s)")
+
+    def _commit(self, checkpoint, store):
+        """写入缓冲的结果存储记录，再将对应任务追加到检查点并落盘"""
+        if store is not None:
+            store.flush()
+        for record in self._uncommitted:
+            checkpoint.write(json.dumps(record) + '\n')
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+        self._uncommitted = []
+
+    def summary(self):
+        """任务汇总表：每个任务一行，含任务字段、状态、耗时与绩效指标"""
+        rows = []
+        for job in self.jobs:
+            record = self.records.get(job['id'], {})
+            rows.append({
+                'id': job['id'],
+                'symbol': job['symbol'],
+                'strategy_type': job['strategy_type'],
+                'params': json.dumps(job['params'], sort_keys=True),
+                'start_date': job['start_date'],
+                'end_date': job['end_date'],
+                'status': record.get('status', 'pending'),
+                'rows': record.get('rows'),
+                'elapsed': record.get('elapsed'),
+                **{name: float(value) for name, value in record.get('metrics', {}).items()}
+            })
+        return pl.DataFrame(rows, infer_schema_length=None)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按任务文件批量运行回测")
+    parser.add_argument('job_file', help="JSON任务文件")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="进程数，默认使用全部CPU核心；为1时串行执行")
+    parser.add_argument('--output-dir', help="输出目录，默认取任务文件中的output_dir")
+    parser.add_argument('--results-store', help="结果存储目录，默认取任务文件中的results_store")
+    parser.add_argument('--fresh', action='store_true', help="忽略检查点，重新运行全部任务")
+    args = parser.parse_args(argv)
+
+    runner = JobRunner.from_file(args.job_file, output_dir=args.output_dir,
+                                 results_store=args.results_store)
+    summary = runner.run(max_workers=args.workers, resume=not args.fresh)
+    failed = summary.filter(pl.col('status') != 'done').height
+    print(f"汇总表已写入 {os.path.join(runner.output_dir, runner.SUMMARY_FILE)}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
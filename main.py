@@ -1,25 +1,39 @@
+import os
+import sys
 from datetime import datetime
 from data_handler import DataHandler
 from strategy_core import TradingStrategyCore
 from backtest_engine import BacktestEngine
-from visualization import StrategyVisualizer
+from result_cache import ResultCache
+import instrumentation
 
 if __name__ == "__main__":
+    # 指定任务文件时按任务文件批量运行(python main.py jobs.json [--workers N] [--fresh])
+    if len(sys.argv) > 1:
+        import job_runner
+        sys.exit(job_runner.main())
+    # 绘图模块(matplotlib)较重，仅在需要画图时导入
+    from visualization import StrategyVisualizer
     # 初始化数据处理
     # 从自定义表名读取
     # 使用绝对路径或正确相对路径
     data_loader = DataHandler("data/AUFI_WI.parquet", file_type='parquet')
     data_loader.preprocess_data(
-    start_date=datetime(2020,1,1), 
+    start_date=datetime(2020,1,1),
     end_date=datetime(2025,5,20)
     )
+    # 设置环境变量TRADING_CACHE=1时启用信号与回测结果缓存(相同数据、日期区间与参数时直接复用)
+    cache = ResultCache() if os.environ.get('TRADING_CACHE', '').lower() in ('1', 'true', 'yes') else None
     # 初始化策略核心
-    strategy = TradingStrategyCore(data_loader, strategy_type='EWMA_LONG_ONLY', span=30)
+    strategy = TradingStrategyCore(data_loader, strategy_type='EWMA_LONG_ONLY', cache=cache, span=30)
     # 初始化其他模块
-    backtester = BacktestEngine(strategy)
+    backtester = BacktestEngine(strategy, cache=cache)
     visualizer = StrategyVisualizer(strategy, data_loader)
     # 执行流程
     strategy.generate_signals()
     backtester.run_backtest()
-    trade_record = backtester.generate_trading_records()  # 改为通过回测引擎调用
+    trade_ledger = backtester.trade_ledger(verbose=True)  # 逐笔交易台账
     visualizer.plot_results()
+    # 设置环境变量TRADING_INSTRUMENT=1(或memory)时输出各阶段耗时
+    if instrumentation.is_enabled():
+        instrumentation.export("pipeline_profile")
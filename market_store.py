@@ -0,0 +1,265 @@
+import gc
+import glob
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+import polars as pl
+import pyarrow as pa
+
+from data_handler import DataHandler, dataset_files
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(__file__), "data", "store")  # 默认合并存储目录
+FIELDS = ('open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+SCHEMA = {'symbol': pl.String, 'date': pl.Datetime('us'), **{f: pl.Float64 for f in FIELDS}}
+
+
+def normalize_frame(frame, symbol=None):
+    """统一为存储结构：symbol、date(Datetime)及float64行情列，按symbol、date排序"""
+    if symbol is not None:
+        frame = frame.with_columns(pl.lit(symbol).alias('symbol'))
+    date = pl.col('date')
+    if frame.schema['date'] == pl.String:
+        date = date.str.to_datetime('%Y-%m-%d')
+    return (frame.with_columns(date.cast(pl.Datetime('us')),
+                               *[pl.col(f).cast(pl.Float64, strict=False) for f in FIELDS])
+                 .select(list(SCHEMA))
+                 .sort(['symbol', 'date']))
+
+
+class MarketDataStore:
+    """Consolidated memory-mapped market data store for all symbols.
+
+    Rows of every symbol live in uncompressed Arrow IPC part files sorted by
+    (symbol, date). Parts are memory-mapped on open, so per-symbol arrays are
+    zero-copy NumPy views into the mapped file. New data is appended as a new
+    part file; compact() merges all parts back into one.
+
+    compact() releases this instance's mappings before deleting the merged
+    parts. A part that cannot be deleted yet because arrays loaded from it
+    are still alive elsewhere (Windows refuses to delete mapped files) is
+    listed in the stale file, skipped by every store on that directory, and
+    deleted on a later refresh.
+
+    Attributes:
+        root: Directory holding the part files
+        parts: List of memory-mapped part DataFrames
+        index: Dict mapping symbol to list of (part number, row start, row stop)
+    """
+    PART_PATTERN = 'part-*.arrow'
+    STALE_FILE = 'stale.json'
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.parts = []
+        self.index = {}
+        self.version = None
+        self._maps = []
+        self.refresh()
+
+    def refresh(self):
+        """重新映射全部分片文件并建立品种索引"""
+        self.close()
+        stale = self._purge_stale()
+        paths = sorted(path for path in glob.glob(os.path.join(self.root, self.PART_PATTERN))
+                       if os.path.basename(path) not in stale)
+        self.parts = [self._map_part(path) for path in paths]
+        self.index = {}
+        for part_no, part in enumerate(self.parts):
+            # 分片内按symbol排序，每个品种对应一段连续行
+            runs = (part.select(pl.col('symbol'))
+                        .with_row_index('row')
+                        .group_by('symbol', maintain_order=True)
+                        .agg(pl.col('row').min().alias('start'), pl.col('row').max().alias('stop')))
+            for symbol, start, stop in runs.iter_rows():
+                self.index.setdefault(symbol, []).append((part_no, start, stop + 1))
+        digest = hashlib.blake2b(digest_size=16)
+        for path in paths:
+            stat = os.stat(path)
+            digest.update(f'{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+        self.version = digest.hexdigest()
+        return self
+
+    def symbols(self):
+        """存储中的全部品种"""
+        return sorted(self.index)
+
+    def symbol_frame(self, symbol):
+        """品种的全部历史(单分片时为零拷贝切片，多分片时合并并以后写入的数据为准)"""
+        if symbol not in self.index:
+            raise KeyError(f"存储中没有品种: {symbol}")
+        slices = [self.parts[p].slice(start, stop - start) for p, start, stop in self.index[symbol]]
+        if len(slices) == 1:
+            return slices[0]
+        return (pl.concat(slices)
+                  .unique('date', keep='last', maintain_order=True)
+                  .sort('date'))
+
+    def load(self, symbol, start_date=None, end_date=None, columns=FIELDS):
+        """读取品种在日期区间内的数组
+
+        Args:
+            symbol (str): 品种名(与data/下文件名一致，如'AUFI_WI')
+            start_date (datetime): 起始日期(可选)
+            end_date (datetime): 结束日期(可选)
+            columns (Sequence[str]): 需要的行情列
+        Returns:
+            dict: 'date'及各行情列 -> numpy数组；区间内无缺失值时为映射文件的只读视图
+        """
+        frame = self.symbol_frame(symbol)
+        dates = frame['date'].to_numpy()
+        lo = np.searchsorted(dates, np.datetime64(start_date, 'us'), 'left') if start_date else 0
+        hi = np.searchsorted(dates, np.datetime64(end_date, 'us'), 'right') if end_date else len(dates)
+
+        window = frame.slice(lo, hi - lo)
+        if any(window[col].null_count() or window[col].is_nan().any() for col in columns):
+            # 区间内有缺失时，在品种全部历史上按DataHandler规则填充后再截取(产生拷贝)
+            window = frame.with_columns([DataHandler._fill_expr(col) for col in columns]) \
+                          .slice(lo, hi - lo)
+        return {'date': window['date'].to_numpy(),
+                **{col: window[col].to_numpy() for col in columns}}
+
+    def append(self, frame, symbol=None, compact_threshold=None):
+        """追加数据为新的分片文件
+
+        多个品种的新数据应合并为一个frame一次追加(每次追加产生一个分片，打开存储时
+        需映射全部分片)。
+
+        Args:
+            frame (pl.DataFrame): 含date及行情列；多品种时需含symbol列
+            symbol (str): 单品种数据的品种名(可选)
+            compact_threshold (int): 追加后分片数超过该值时自动合并(可选)
+        """
+        frame = normalize_frame(frame, symbol)
+        if frame.is_empty():
+            return self
+        os.makedirs(self.root, exist_ok=True)
+        existing = glob.glob(os.path.join(self.root, self.PART_PATTERN))
+        path = self._next_part_path(existing)
+        self._write(frame, path)
+        stale = self._load_stale()
+        live = [p for p in existing if os.path.basename(p) not in stale]
+        if compact_threshold is not None and len(live) + 1 > compact_threshold:
+            return self.compact()
+        return self.refresh()
+
+    def compact(self):
+        """将全部分片合并为一个文件(同品种同日期以后写入的数据为准)"""
+        stale = self._load_stale()
+        paths = sorted(path for path in glob.glob(os.path.join(self.root, self.PART_PATTERN))
+                       if os.path.basename(path) not in stale)
+        if len(paths) <= 1:
+            return self
+        # 读取为内存拷贝(不映射)，合并结果写为编号最大的新分片，旧分片删除前不影响读者
+        merged = (pl.concat([self._read_part(p) for p in paths])
+                    .unique(['symbol', 'date'], keep='last', maintain_order=True)
+                    .sort(['symbol', 'date']))
+        self._write(merged, self._next_part_path(paths))
+        del merged
+        # 先释放本实例的映射再删除旧分片
+        self.close()
+        self._save_stale(stale | {os.path.basename(path) for path in paths})
+        return self.refresh()
+
+    def close(self):
+        """释放本实例对分片文件的映射(由load得到、仍在使用的数组会保持其映射)"""
+        self.parts = []
+        self.index = {}
+        for source in self._maps:
+            source.close()
+        self._maps = []
+        gc.collect()
+
+    def _next_part_path(self, existing):
+        numbers = [int(os.path.basename(p)[5:-6]) for p in existing]
+        return os.path.join(self.root, f'part-{max(numbers, default=-1) + 1:05d}.arrow')
+
+    def _load_stale(self):
+        """已合并、待删除的分片文件名"""
+        try:
+            with open(os.path.join(self.root, self.STALE_FILE), encoding='utf-8') as f:
+                return set(json.load(f))
+        except (OSError, ValueError):
+            return set()
+
+    def _save_stale(self, names):
+        path = os.path.join(self.root, self.STALE_FILE)
+        if not names:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        tmp = f'{path}.tmp{os.getpid()}'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(sorted(names), f)
+        os.replace(tmp, path)
+
+    def _purge_stale(self):
+        """删除已合并的旧分片；仍被映射(如Windows上仍有数组引用)而无法删除的留待下次
+
+        Returns:
+            set: 仍未删除的分片文件名
+        """
+        stale = self._load_stale()
+        if not stale:
+            return stale
+        remaining = set()
+        for name in stale:
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining.add(name)
+        self._save_stale(remaining)
+        return remaining
+
+    @staticmethod
+    def _read_part(path):
+        """将IPC文件读入内存(不映射，文件读完即关闭)"""
+        with pa.OSFile(path, 'rb') as source:
+            return pl.from_arrow(pa.ipc.open_file(source).read_all())
+
+    def _map_part(self, path):
+        """内存映射IPC文件，返回引用映射内存的DataFrame(不拷贝数据)"""
+        source = pa.memory_map(path, 'r')
+        self._maps.append(source)
+        table = pa.ipc.open_file(source).read_all()
+        return pl.from_arrow(table, rechunk=False)
+
+    @staticmethod
+    def _write(frame, path):
+        """写入未压缩的IPC文件(单块，保证映射后可零拷贝)"""
+        tmp = f'{path}.tmp{os.getpid()}'
+        frame.rechunk().write_ipc(tmp, compression='uncompressed')
+        os.replace(tmp, path)
+
+    @classmethod
+    def build(cls, data_dir, root=DEFAULT_STORE_DIR, file_type='parquet'):
+        """由data/下的单品种文件构建合并存储(覆盖已有分片)"""
+        suffix = f'.{file_type}'
+        frames = []
+        for name in sorted(os.listdir(data_dir)):
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(data_dir, name)
+            raw = pl.read_parquet(dataset_files(path)) if file_type == 'parquet' else pl.read_csv(path)
+            frames.append(normalize_frame(raw, name[:-len(suffix)]))
+        os.makedirs(root, exist_ok=True)
+        for path in glob.glob(os.path.join(root, cls.PART_PATTERN)):
+            os.remove(path)
+        stale_path = os.path.join(root, cls.STALE_FILE)
+        if os.path.exists(stale_path):
+            os.remove(stale_path)
+        if frames:
+            cls._write(pl.concat(frames).sort(['symbol', 'date']),
+                       os.path.join(root, 'part-00000.arrow'))
+        return cls(root)
+
+
+if __name__ == "__main__":
+    # 用法: python market_store.py [数据目录] [存储目录]
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "data")
+    store_dir = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE_DIR
+    store = MarketDataStore.build(data_dir, store_dir)
+    print(f"已写入{len(store.symbols())}个品种至 {store_dir}")
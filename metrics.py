@@ -0,0 +1,114 @@
+import numpy as np
+import polars as pl
+
+TRADING_DAYS_PER_YEAR = 252
+
+METRIC_NAMES = ('FinalReturn', 'AnnualReturn', 'AnnualVolatility', 'Sharpe', 'Sortino',
+                'MaxDrawdown', 'MaxDrawdownDuration', 'Calmar', 'HitRate')
+POSITION_METRIC_NAMES = ('Trades', 'Turnover', 'Exposure')
+
+
+def compute_metrics(strategy_returns, position=None, cumulative_returns=None,
+                    periods_per_year=TRADING_DAYS_PER_YEAR):
+    """由收益序列计算绩效指标，按最后一维归约
+
+    一维输入为单次回测，二维输入为(回测数 × 长度)矩阵，每行一次回测；
+    全部指标均为整块数组运算，不逐行循环。
+
+    Args:
+        strategy_returns (np.ndarray): 每期策略收益
+        position (np.ndarray): 每期持仓(可选)，提供时额外计算Trades/Turnover/Exposure
+        cumulative_returns (np.ndarray): 累计净值(可选)，默认由收益累乘得到
+        periods_per_year (int): 每年期数
+    Returns:
+        dict: 指标名 -> 一维输入时为标量，二维输入时为每行一个值的数组
+    """
+    returns = np.atleast_2d(np.asarray(strategy_returns, dtype=np.float64))
+    single = np.ndim(strategy_returns) == 1
+    if cumulative_returns is None:
+        equity = np.cumprod(1 + returns, axis=1)
+    else:
+        equity = np.atleast_2d(np.asarray(cumulative_returns, dtype=np.float64))
+    n_bars = returns.shape[1]
+    if n_bars == 0:
+        metrics = _empty_metrics(len(returns), position is not None)
+        return {name: values[0] for name, values in metrics.items()} if single else metrics
+    years = n_bars / periods_per_year
+
+    mean = returns.mean(axis=1)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0) ** 2, axis=1)) * np.sqrt(periods_per_year)
+    # 净值高点以初始资金1.0为起点，首期即亏损时也计入回撤
+    running_max = np.maximum.accumulate(np.maximum(equity, 1.0), axis=1)
+    drawdown = equity / running_max - 1
+    max_drawdown = drawdown.min(axis=1)
+    # 回撤持续期：距上一个净值新高的期数(初始资金视为第-1期的高点)
+    index = np.arange(n_bars)
+    last_peak = np.maximum.accumulate(np.where(drawdown < 0, -1, index), axis=1)
+    wins = (returns > 0).sum(axis=1)
+    active = (returns != 0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual_return = np.power(equity[:, -1], 1 / years) - 1
+        volatility = returns.std(axis=1) * np.sqrt(periods_per_year)
+        metrics = {
+            'FinalReturn': equity[:, -1] - 1,
+            'AnnualReturn': annual_return,
+            'AnnualVolatility': volatility,
+            'Sharpe': np.where(volatility > 0, mean * periods_per_year / volatility, np.nan),
+            'Sortino': np.where(downside > 0, mean * periods_per_year / downside, np.nan),
+            'MaxDrawdown': max_drawdown,
+            'MaxDrawdownDuration': (index - last_peak).max(axis=1).astype(np.int64),
+            'Calmar': np.where(max_drawdown < 0, annual_return / -max_drawdown, np.nan),
+            'HitRate': np.where(active > 0, wins / active, np.nan)
+        }
+
+    if position is not None:
+        position = np.atleast_2d(np.asarray(position, dtype=np.float64))
+        changes = np.abs(np.diff(position, axis=1))
+        metrics.update({
+            'Trades': (changes != 0).sum(axis=1).astype(np.int64),
+            'Turnover': changes.sum(axis=1) / years,  # 年化换手(持仓变动绝对值之和)
+            'Exposure': (position != 0).mean(axis=1)
+        })
+    if single:
+        return {name: values[0] for name, values in metrics.items()}
+    return metrics
+
+
+def _empty_metrics(n_runs, with_position):
+    """无K线(如日期区间内没有交易日)时的指标：收益与回撤为0，计数为0，比率类指标为NaN"""
+    zeros, nan = np.zeros(n_runs), np.full(n_runs, np.nan)
+    counts = np.zeros(n_runs, dtype=np.int64)
+    metrics = {
+        'FinalReturn': zeros,
+        'AnnualReturn': nan,
+        'AnnualVolatility': nan,
+        'Sharpe': nan,
+        'Sortino': nan,
+        'MaxDrawdown': zeros,
+        'MaxDrawdownDuration': counts,
+        'Calmar': nan,
+        'HitRate': nan
+    }
+    if with_position:
+        metrics.update({'Trades': counts, 'Turnover': nan, 'Exposure': nan})
+    return metrics
+
+
+def metrics_table(strategy_returns, position=None, labels=None, label_name='Run',
+                  periods_per_year=TRADING_DAYS_PER_YEAR):
+    """批量回测的指标表，每行一次回测
+
+    Args:
+        strategy_returns (np.ndarray): (回测数 × 长度)收益矩阵
+        position (np.ndarray): 同形状的持仓矩阵(可选)
+        labels (Sequence): 每行的标识(如参数值)，默认行号
+        label_name (str): 标识列名
+    Returns:
+        pl.DataFrame: 标识列及各指标列
+    """
+    metrics = compute_metrics(np.atleast_2d(strategy_returns),
+                              None if position is None else np.atleast_2d(position),
+                              periods_per_year=periods_per_year)
+    n_runs = len(metrics['FinalReturn'])
+    labels = np.arange(n_runs) if labels is None else labels
+    return pl.DataFrame({label_name: labels, **metrics})
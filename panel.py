@@ -0,0 +1,458 @@
+"""
+多品种对齐面板与截面策略
+
+PanelData把数据目录(或合并存储)中的全部品种在一次polars查询中读入，按所有品种
+交易日的并集对齐为(日期数 × 品种数)的二维数组，每个字段一个。各品种自身K线的
+缺失值填充规则与DataHandler.preprocess_data相同(先按品种前向、后向填充再补0，
+之后再筛选日期)；品种在某日无K线(上市前、退市后、节假日不同)时为NaN。
+
+PanelBacktest在整个面板上一次完成全部品种的回测：
+    - 时间序列策略(EWMA及STRATEGIES中注册的类型)：各品种按自身K线排成
+      (品种数 × 最长K线数)矩阵，指标与信号按行一次计算，结果与逐品种运行
+      TradingStrategyCore + BacktestEngine一致；
+    - 截面策略(XS_MOMENTUM)：按日期在品种之间排序，做多动量最强、做空最弱的品种；
+    - sizing='volatility'时按各品种近期波动率缩放仓位(目标波动率)。
+"""
+
+import os
+import numpy as np
+import polars as pl
+
+from data_handler import DataHandler, dataset_files
+from strategy_core import (TradingStrategyCore, STRATEGIES, ewma_rows, crossover_signals,
+                           signal_positions)
+from indicators import compute_indicators
+from market_store import MarketDataStore, FIELDS
+from metrics import TRADING_DAYS_PER_YEAR, metrics_table
+from portfolio import combine_returns, symbol_weights
+
+CROSS_SECTIONAL_TYPES = {
+    # 截面策略类型 -> 默认参数
+    'XS_MOMENTUM': {'lookback': 60, 'rebalance': 20, 'quantile': 0.2, 'long_only': False},
+}
+SIZING_METHODS = (None, 'volatility')
+
+
+def forward_fill(values, listed=None):
+    """沿第一维(日期)前向填充NaN；listed为False的位置(上市前/退市后)保持NaN"""
+    n = len(values)
+    last = np.maximum.accumulate(np.where(np.isnan(values), -1, np.arange(n)[:, None]), axis=0)
+    filled = np.where(last >= 0, np.take_along_axis(values, np.maximum(last, 0), axis=0), np.nan)
+    if listed is not None:
+        filled[~listed] = np.nan
+    return filled
+
+
+def cross_sectional_rank(scores):
+    """每个日期在品种之间排序，返回(0, 1]的分位排名，最大值为1；NaN不参与排序
+
+    并列时按品种顺序排列。
+    """
+    finite = np.isfinite(scores)
+    order = np.argsort(np.where(finite, scores, np.inf), axis=1, kind='stable')
+    ranks = np.empty(scores.shape, dtype=np.float64)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1, dtype=np.float64)[None, :], axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(finite, ranks / finite.sum(axis=1, keepdims=True), np.nan)
+
+
+def volatility_scale(returns, target_vol, window, max_leverage, periods_per_year=TRADING_DAYS_PER_YEAR):
+    """按近期波动率计算仓位倍数 target_vol / 年化波动率，上限max_leverage
+
+    第i根K线的持仓在第i-1根K线收盘后决定，此时已知的最后一个收益为
+    returns[i-2](第i-1根K线的执行价格)，因此波动率取到returns[i-2]为止；
+    波动率尚未可得的前段倍数为0(不持仓)。
+
+    Args:
+        returns (np.ndarray): (序列数 × 长度)的逐K线收益，按行计算
+    Returns:
+        np.ndarray: 同形状的仓位倍数
+    """
+    frame = pl.DataFrame(np.ascontiguousarray(returns.T), schema=[str(i) for i in range(len(returns))])
+    volatility = frame.select(pl.all().rolling_std(window)).to_numpy().T * np.sqrt(periods_per_year)
+    scale = np.zeros(returns.shape)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale[:, 2:] = np.minimum(target_vol / volatility[:, :-2], max_leverage)
+    return np.nan_to_num(scale, nan=0.0)
+
+
+def _symbol_scan(path, file_type):
+    """单品种文件(含增量分片)的惰性扫描"""
+    if file_type == 'csv':
+        return pl.scan_csv(path)
+    files = dataset_files(path)
+    return pl.scan_parquet(files if len(files) > 1 else path)
+
+
+def fill_grouped(values, starts, stops):
+    """按品种分段的缺失值填充，与DataHandler._fill_expr一致：段内前向填充、再后向填充，仍缺失时为0
+
+    Args:
+        values (np.ndarray): 各品种首尾相接的一维数组(NaN为缺失)
+        starts, stops (np.ndarray): 每个元素所在品种段的起止下标[start, stop)
+    """
+    n = len(values)
+    present = ~np.isnan(values)
+    if present.all():
+        return values
+    index = np.arange(n)
+    previous = np.maximum.accumulate(np.where(present, index, -1))
+    following = np.minimum.accumulate(np.where(present, index, n)[::-1])[::-1]
+    use_previous = previous >= starts
+    use_following = ~use_previous & (following < stops)
+    source = np.where(use_previous, previous, np.where(use_following, following, 0))
+    return np.where(use_previous | use_following, values[source], 0.0) if n else values.copy()
+
+
+class PanelData:
+    """Calendar-aligned (dates × symbols) panel of market data.
+
+    Every field is a 2-D float64 array on the union trading calendar of all
+    symbols, NaN where a symbol has no bar. The bars of each symbol are also
+    available left-aligned as a (symbols × bars) matrix (stacked()), on which
+    per-symbol time-series computations run row-wise in one call.
+
+    Attributes:
+        symbols: List of symbol names (column order)
+        dates: Union trading calendar (datetime64)
+        fields: Dict mapping field name to a (dates × symbols) array
+        valid: Boolean (dates × symbols) mask of bars present in the data
+        lengths: Number of bars of each symbol
+        rows: (symbols × max bars) calendar row of each symbol bar, -1 for padding
+        paths: Dict mapping symbol name to its data file (empty for store panels)
+    """
+    def __init__(self, symbols, codes, dates, values, paths=None):
+        """
+        :param symbols: 品种名列表
+        :param codes: 每行的品种序号(与symbols对应)，按(品种, 日期)排序
+        :param dates: 每行的日期(datetime64)
+        :param values: 行情列名 -> 每行的值(已填充缺失值)
+        :param paths: 品种名 -> 数据文件路径(可选)
+        """
+        self.symbols = list(symbols)
+        self.paths = dict(paths or {})
+        if len(dates) > 1 and np.any((codes[1:] == codes[:-1]) & (dates[1:] == dates[:-1])):
+            raise ValueError("同一品种存在重复日期")
+        self.dates = np.unique(dates)
+        row = np.searchsorted(self.dates, dates)
+        n_dates, n_symbols = len(self.dates), len(self.symbols)
+
+        flat = row * n_symbols + codes
+        self.valid = np.zeros((n_dates, n_symbols), dtype=bool)
+        self.valid.reshape(-1)[flat] = True
+        self.fields = {}
+        for field in FIELDS:
+            aligned = np.full((n_dates, n_symbols), np.nan)
+            aligned.reshape(-1)[flat] = values[field]
+            self.fields[field] = aligned
+
+        # 各品种自身K线在日历中的行号(左对齐，末尾以-1补齐)
+        self.lengths = np.bincount(codes, minlength=n_symbols)
+        offsets = np.concatenate(([0], np.cumsum(self.lengths)[:-1]))
+        self.rows = np.full((n_symbols, self.lengths.max(initial=0)), -1, dtype=np.int64)
+        self.rows[codes, np.arange(len(codes)) - offsets[codes]] = row
+        self._own = self.rows >= 0
+        self._stacked_index = np.where(self._own, self.rows * n_symbols + np.arange(n_symbols)[:, None], 0)
+
+    @classmethod
+    def from_directory(cls, data_dir, symbols=None, file_type='parquet', start_date=None, end_date=None):
+        """从数据目录加载，symbols为文件名(不含扩展名)列表，默认使用目录下全部文件"""
+        suffix = f'.{file_type}'
+        available = {
+            name[:-len(suffix)]: os.path.join(data_dir, name)
+            for name in sorted(os.listdir(data_dir)) if name.endswith(suffix)
+        }
+        if symbols is not None:
+            missing = [s for s in symbols if s not in available]
+            if missing:
+                raise ValueError(f"数据目录中缺少品种文件: {missing}")
+            available = {s: available[s] for s in symbols}
+        scans = [_symbol_scan(path, file_type) for path in available.values()]
+        return cls._build(list(available), scans, start_date, end_date, available)
+
+    @classmethod
+    def from_store(cls, store_dir, symbols=None, start_date=None, end_date=None):
+        """从合并存储(MarketDataStore)加载，symbols默认使用存储中的全部品种"""
+        store = MarketDataStore(store_dir)
+        available = store.symbols()
+        if symbols is not None:
+            missing = [s for s in symbols if s not in available]
+            if missing:
+                raise ValueError(f"合并存储中缺少品种: {missing}")
+            available = list(symbols)
+        scans = [store.symbol_frame(symbol).lazy() for symbol in available]
+        return cls._build(available, scans, start_date, end_date)
+
+    @classmethod
+    def _build(cls, symbols, scans, start_date, end_date, paths=None):
+        """全部品种在一个查询中读取，按品种填充缺失值(与DataHandler一致)后再筛选日期"""
+        if not scans:
+            raise ValueError("没有可加载的品种")
+        schemas = [scan.collect_schema() for scan in scans]
+        # 全部为文本日期时先读入原始字符串，每个不同的日期只解析一次
+        text_dates = all(schema['date'] == pl.String for schema in schemas)
+        frame = pl.concat([
+            scan.select(
+                pl.lit(code, dtype=pl.Int64).alias('_sym'),
+                pl.col('date') if text_dates else DataHandler._date_expr(schema).cast(pl.Datetime('us')),
+                *[pl.col(f).cast(pl.Float64, strict=False) if f in schema
+                  else pl.lit(None, dtype=pl.Float64).alias(f) for f in FIELDS]
+            ) for code, (scan, schema) in enumerate(zip(scans, schemas))
+        ]).collect()
+        if frame['date'].is_null().any():
+            raise ValueError("日期列date包含缺失值")
+        if text_dates:
+            parsed = frame.select(pl.col('date').unique()).with_columns(
+                DataHandler._date_expr(frame.schema).cast(pl.Datetime('us')).alias('_date'))
+            frame = (frame.join(parsed, on='date', how='left', maintain_order='left')
+                          .drop('date').rename({'_date': 'date'}))
+
+        codes = frame['_sym'].to_numpy()
+        counts = np.bincount(codes, minlength=len(symbols))
+        stops = np.cumsum(counts)
+        starts, stops = (stops - counts)[codes], stops[codes]
+        values = {f: fill_grouped(frame[f].fill_nan(None).to_numpy().astype(np.float64), starts, stops)
+                  for f in FIELDS}
+        dates = frame['date'].to_numpy()
+
+        keep = np.ones(len(dates), dtype=bool)
+        if start_date:
+            keep &= dates >= np.datetime64(start_date)
+        if end_date:
+            keep &= dates <= np.datetime64(end_date)
+        order = np.flatnonzero(keep)
+        # 文件内日期未排序时按(品种, 日期)重排
+        if len(order) > 1:
+            kept_codes, kept_dates = codes[order], dates[order]
+            if np.any((kept_codes[1:] == kept_codes[:-1]) & (kept_dates[1:] < kept_dates[:-1])):
+                order = order[np.lexsort((kept_dates, kept_codes))]
+        return cls(symbols, codes[order], dates[order], {f: v[order] for f, v in values.items()}, paths)
+
+    def __getattr__(self, name):
+        # 行情字段可直接以属性访问，如panel.close
+        fields = self.__dict__.get('fields', {})
+        if name in fields:
+            return fields[name]
+        raise AttributeError(name)
+
+    @property
+    def listed(self):
+        """品种首根K线至末根K线之间的日期(含节假日)为True"""
+        n = len(self.dates)
+        first = np.argmax(self.valid, axis=0)
+        last = n - 1 - np.argmax(self.valid[::-1], axis=0)
+        index = np.arange(n)[:, None]
+        return (index >= first) & (index <= last) & self.valid.any(axis=0)
+
+    def stacked(self, values):
+        """日历对齐的(日期数 × 品种数)数组转为各品种自身K线左对齐的(品种数 × 最长K线数)矩阵，末尾补NaN
+
+        values可为字段名或同形状数组。
+        """
+        values = self.fields[values] if isinstance(values, str) else values
+        stacked = np.take(values, self._stacked_index)
+        stacked[~self._own] = np.nan
+        return stacked
+
+    def aligned(self, stacked, fill=False):
+        """stacked的逆变换：各品种K线放回日历对应行
+
+        Args:
+            stacked (np.ndarray): (品种数 × 最长K线数)矩阵
+            fill (bool): 为True时无K线的日期沿用该品种上一根K线的值(上市前/退市后仍为NaN)
+        """
+        values = np.full(self.valid.shape, np.nan)
+        values.reshape(-1)[self._stacked_index[self._own]] = stacked[self._own]
+        return forward_fill(values, self.listed) if fill else values
+
+    def handler(self, symbol):
+        """单品种的DataHandler(数组取自面板中该品种有K线的日期，无需再调用preprocess_data)"""
+        col = self.symbols.index(symbol)
+        own = self.valid[:, col]
+        handler = DataHandler.__new__(DataHandler)
+        handler.data_path = self.paths.get(symbol)
+        handler.source_files = [] if handler.data_path is None else dataset_files(handler.data_path)
+        handler.file_type = 'panel'
+        handler.lazy = False
+        handler.raw_data = None
+        handler.row_range = None
+        handler._source_stat = DataHandler._stat(handler.source_files)
+        handler._source_digest = None if handler.data_path else f'panel:{symbol}'
+        handler.start_date = handler.end_date = None
+        handler.dates = self.dates[own]
+        for col_name in DataHandler.PRICE_COLUMNS:
+            setattr(handler, col_name, self.fields[col_name][own, col])
+        return handler
+
+
+class StackedFields:
+    """各品种自身K线左对齐的行情，以DataHandler同名属性访问(如data.close)，首次访问时生成"""
+    def __init__(self, panel):
+        self._panel = panel
+
+    def __getattr__(self, name):
+        if name not in FIELDS:
+            raise AttributeError(name)
+        values = self._panel.stacked(name)
+        setattr(self, name, values)
+        return values
+
+
+def _check_cross_sectional_params(params):
+    """截面策略参数检查：回看期与调仓间隔为正整数；分位数大于0，多空时不超过0.5(多空组不重叠)"""
+    for name in ('lookback', 'rebalance'):
+        value = params[name]
+        if isinstance(value, bool) or not isinstance(value, (int, np.integer)) or value < 1:
+            raise ValueError(f"参数{name}必须为不小于1的整数: {value!r}")
+    upper = 1.0 if params['long_only'] else 0.5
+    if not 0 < params['quantile'] <= upper:
+        raise ValueError(f"参数quantile必须在(0, {upper}]之间: {params['quantile']!r}")
+
+
+class PanelBacktest:
+    """Vectorized backtest of one strategy over every symbol of a panel.
+
+    Time-series strategies run on the stacked (symbols × bars) layout, so the
+    signals of all symbols come from one broadcasted call and match per-symbol
+    TradingStrategyCore + BacktestEngine runs bar for bar. Cross-sectional
+    strategies rank symbols on the aligned calendar. Per-symbol returns are
+    combined like PortfolioBacktest (weights normalized over the symbols
+    trading on each date).
+
+    Attributes:
+        panel: PanelData instance
+        strategy_type: 'EWMA', 'EWMA_LONG_ONLY', a STRATEGIES type or a CROSS_SECTIONAL_TYPES type
+        strategy_params: Strategy parameters
+        weights: Dict of symbol weights, None for equal weight
+        sizing: None (unit positions) or 'volatility' (target volatility scaling)
+        target_vol: Annualized target volatility per symbol when sizing='volatility'
+        vol_window: Bars in the rolling volatility estimate
+        max_leverage: Upper bound of the volatility scale factor
+        positions: (dates × symbols) positions after run()
+        symbol_returns: Wide DataFrame of per-symbol strategy returns (Date + one column per symbol)
+        portfolio: DataFrame with Date, PortfolioReturn and CumulativeReturn
+    """
+    def __init__(self, panel, strategy_type='EWMA', weights=None, sizing=None, target_vol=0.10,
+                 vol_window=20, max_leverage=2.0, **kwargs):
+        if sizing not in SIZING_METHODS:
+            raise ValueError(f"不支持的仓位方法: {sizing}")
+        if strategy_type in CROSS_SECTIONAL_TYPES:
+            defaults = CROSS_SECTIONAL_TYPES[strategy_type]
+            unknown = [key for key in kwargs if key not in defaults]
+            if unknown:
+                raise ValueError(f"策略{strategy_type}不支持参数: {unknown}")
+            self.strategy_params = {**defaults, **kwargs}
+            _check_cross_sectional_params(self.strategy_params)
+        elif strategy_type in TradingStrategyCore.STREAMING_TYPES or strategy_type in STRATEGIES:
+            # 参数校验与默认值与TradingStrategyCore一致
+            strategy = TradingStrategyCore(None, strategy_type=strategy_type, **kwargs)
+            self.strategy_params = strategy.strategy_params
+            self.span = getattr(strategy, 'span', None)
+        else:
+            raise ValueError(f"不支持的策略类型: {strategy_type}")
+        self.panel = panel
+        self.strategy_type = strategy_type
+        self.weights = weights
+        self.sizing = sizing
+        self.target_vol = target_vol
+        self.vol_window = vol_window
+        self.max_leverage = max_leverage
+        self.positions = None
+        self.symbol_returns = None
+        self.portfolio = None
+
+
+    def _bar_returns(self, data):
+        """各品种逐K线收益(与BacktestEngine.run_backtest相同：下一根K线执行价/本K线执行价-1，末根为0)"""
+        execution_price = (data.open + data.close) / 2
+        returns = np.zeros(execution_price.shape)
+        own_next = np.arange(execution_price.shape[1] - 1) < (self.panel.lengths[:, None] - 1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            returns[:, :-1] = np.where(own_next, execution_price[:, 1:] / execution_price[:, :-1] - 1, 0.0)
+        return returns
+
+    def _time_series_positions(self, data):
+        """全部品种按行一次生成信号与持仓((品种数 × 最长K线数))"""
+        params = self.strategy_params
+        if self.strategy_type in TradingStrategyCore.STREAMING_TYPES:
+            trading_signal = crossover_signals(data.close, ewma_rows(data.close, self.span))
+            long_only = self.strategy_type == 'EWMA_LONG_ONLY'
+        else:
+            spec = STRATEGIES[self.strategy_type]
+            values = compute_indicators(data, spec.indicators(params))
+            trading_signal = spec.rule(data, values, params)
+            long_only = params['long_only']
+        return signal_positions(trading_signal, long_only=long_only)
+
+    def _cross_sectional_positions(self, data):
+        """截面动量：每rebalance个日期按lookback根K线动量排序，做多前quantile、做空后quantile
+
+        当日无K线的品种沿用其上一根K线的动量参与排序；信号在下一个日期执行，持仓保持到下次调仓。
+        """
+        params = self.strategy_params
+        lookback = params['lookback']
+        close = data.close
+        momentum = np.full(close.shape, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            momentum[:, lookback:] = close[:, lookback:] / close[:, :-lookback] - 1
+        scores = self.panel.aligned(momentum, fill=True)
+        rank = cross_sectional_rank(scores)
+
+        target = np.full(rank.shape, np.nan)
+        rebalance = np.arange(0, len(rank), params['rebalance'])
+        chosen = np.where(rank[rebalance] > 1 - params['quantile'], 1.0, 0.0)
+        if not params['long_only']:
+            chosen = np.where(rank[rebalance] <= params['quantile'], -1.0, chosen)
+        target[rebalance] = chosen
+        target = np.nan_to_num(forward_fill(target))
+        # 信号隔日执行
+        positions = np.zeros(target.shape)
+        positions[1:] = target[:-1]
+        return positions
+
+    def run(self):
+        """在全部品种上回测并合成组合净值
+
+        Returns:
+            pl.DataFrame: 组合每日收益与累计净值
+        """
+        panel = self.panel
+        data = StackedFields(panel)
+        returns = self._bar_returns(data)
+        scale = None
+        if self.sizing == 'volatility':
+            scale = volatility_scale(returns, self.target_vol, self.vol_window, self.max_leverage)
+
+        if self.strategy_type in CROSS_SECTIONAL_TYPES:
+            positions = self._cross_sectional_positions(data)
+            if scale is not None:
+                positions = positions * np.nan_to_num(panel.aligned(scale, fill=True))
+        else:
+            positions = self._time_series_positions(data)
+            if scale is not None:
+                positions = positions * scale
+            # 无K线的日期沿用上一根K线的持仓
+            positions = np.nan_to_num(panel.aligned(positions, fill=True))
+        self.positions = positions
+
+        # 收益记在各品种自身K线的日期上，无K线的日期为NaN(不参与组合权重归一化)
+        strategy_returns = positions * panel.aligned(returns)
+        self.symbol_returns = pl.DataFrame({
+            'Date': panel.dates,
+            **{symbol: strategy_returns[:, i] for i, symbol in enumerate(panel.symbols)}
+        }).fill_nan(None)
+        portfolio_returns = combine_returns(strategy_returns, symbol_weights(panel.symbols, self.weights))
+        self.portfolio = pl.DataFrame({
+            'Date': panel.dates,
+            'PortfolioReturn': portfolio_returns,
+            'CumulativeReturn': np.cumprod(1 + portfolio_returns)
+        })
+        return self.portfolio
+
+    def symbol_metrics(self):
+        """各品种的绩效指标表(按面板日历计算，无K线的日期收益为0)"""
+        if self.symbol_returns is None:
+            raise ValueError("请先调用run")
+        returns = np.nan_to_num(self.symbol_returns.drop('Date').to_numpy().astype(np.float64))
+        return metrics_table(returns.T, self.positions.T, labels=self.panel.symbols, label_name='Symbol')
+
@@ -0,0 +1,482 @@
+"""
+基于asyncio的模拟交易服务
+
+服务从可替换的行情源(feed)订阅K线，按品种增量推进TradingStrategyCore的信号
+(update，每根K线O(1))，维护模拟持仓与净值，并向订阅者发布委托与持仓事件。
+每个品种有独立的队列与协程，某个品种的积压或异常不会阻塞其他品种。
+
+行情源：
+    DirectoryFeed  轮询data/目录下的Parquet文件(含_delta增量分片)，推送新增的K线
+    SocketFeed     本地TCP服务，每行一个JSON格式的K线(Wind终端推送的替身)
+    ReplayFeed     按日期顺序全速(或按间隔)推送历史Parquet数据，用于压力测试
+
+行情源只需实现 async bars()，逐个产生(品种, K线)；可选实现 async history()，
+返回 品种 -> DataHandler 的历史数据，服务以此预热策略状态(不产生交易)。
+
+    python paper_trading.py --feed replay --data-dir data --strategy EWMA --span 30
+    python paper_trading.py --feed socket --port 9100 --log events.jsonl
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+from datetime import datetime
+import numpy as np
+import polars as pl
+
+from data_handler import DataHandler, dataset_files
+from strategy_core import TradingStrategyCore, _format_date
+
+BAR_FIELDS = ('open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+
+
+def _symbol_paths(data_dir, file_type='parquet', symbols=None):
+    """数据目录下的 品种 -> 文件路径"""
+    suffix = f'.{file_type}'
+    available = {
+        name[:-len(suffix)]: os.path.join(data_dir, name)
+        for name in sorted(os.listdir(data_dir)) if name.endswith(suffix)
+    }
+    if symbols is None:
+        return available
+    return {s: available[s] for s in symbols if s in available}
+
+
+def _bar_fields(data_handler):
+    """DataHandler中已加载的行情字段"""
+    fields = {'date': data_handler.dates}
+    fields.update({f: getattr(data_handler, f) for f in BAR_FIELDS if getattr(data_handler, f, None) is not None})
+    return fields
+
+
+def _bar(fields, i):
+    """第i行K线(dict)"""
+    return {f: values[i] if f == 'date' else float(values[i]) for f, values in fields.items()}
+
+
+class DirectoryFeed:
+    """Bar feed watching the Parquet files of a data directory.
+
+    Polls the size and modification time of every symbol file and its delta
+    parts (see wind_data.append_symbol_part); a changed symbol is reloaded in
+    a worker thread and the rows after the last pushed date are yielded.
+
+    Attributes:
+        data_dir: Directory of per-symbol data files
+        symbols: Symbols to watch, None for every file in data_dir
+        file_type: 'parquet' or 'csv'
+        interval: Polling interval in seconds
+    """
+    def __init__(self, data_dir='data', symbols=None, file_type='parquet', interval=1.0):
+        self.data_dir = data_dir
+        self.symbols = symbols
+        self.file_type = file_type
+        self.interval = interval
+        self._signatures = {}
+        self._last_dates = {}
+
+    @staticmethod
+    def _signature(path):
+        return [(p, os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in dataset_files(path)]
+
+    def _load(self, path):
+        data_handler = DataHandler(path, file_type=self.file_type)
+        data_handler.preprocess_data()
+        return data_handler
+
+    async def _refresh(self, symbol, path):
+        """文件有变化时重新加载，返回DataHandler，否则返回None"""
+        signature = await asyncio.to_thread(self._signature, path)
+        if signature == self._signatures.get(symbol):
+            return None
+        data_handler = await asyncio.to_thread(self._load, path)
+        self._signatures[symbol] = signature
+        return data_handler
+
+    async def history(self):
+        """加载现有数据作为预热历史，之后只推送新增的K线"""
+        result = {}
+        for symbol, path in _symbol_paths(self.data_dir, self.file_type, self.symbols).items():
+            data_handler = await self._refresh(symbol, path)
+            if data_handler is not None and len(data_handler.dates):
+                self._last_dates[symbol] = data_handler.dates[-1]
+                result[symbol] = data_handler
+        return result
+
+    async def bars(self):
+        while True:
+            for symbol, path in _symbol_paths(self.data_dir, self.file_type, self.symbols).items():
+                data_handler = await self._refresh(symbol, path)
+                if data_handler is None:
+                    continue
+                last = self._last_dates.get(symbol)
+                start = 0 if last is None else int(np.searchsorted(data_handler.dates, last, 'right'))
+                fields = _bar_fields(data_handler)
+                for i in range(start, len(data_handler.dates)):
+                    yield symbol, _bar(fields, i)
+                if len(data_handler.dates):
+                    self._last_dates[symbol] = data_handler.dates[-1]
+            await asyncio.sleep(self.interval)
+
+
+class SocketFeed:
+    """Local TCP stand-in for the Wind terminal push interface.
+
+    Every line received is one JSON bar, e.g.
+    {"symbol": "AUFI_WI", "date": "2025-05-21", "open": 780.1, "close": 785.3}.
+    Malformed lines are counted in errors and skipped.
+
+    Attributes:
+        host: Listening address
+        port: Listening port (0 picks a free port, see bound_port after start)
+        errors: Number of malformed lines
+        bound_port: Actual listening port once the server is running
+    """
+    def __init__(self, host='127.0.0.1', port=9100, queue_size=10_000):
+        self.host = host
+        self.port = port
+        self.errors = 0
+        self.bound_port = None
+        self._queue = asyncio.Queue(queue_size)
+        self._ready = asyncio.Event()
+
+    async def wait_ready(self):
+        """等待服务开始监听"""
+        await self._ready.wait()
+
+    async def _handle(self, reader, writer):
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                    symbol = message.pop('symbol')
+                    message['date'] = datetime.fromisoformat(message['date'])
+                    message['open'], message['close'] = float(message['open']), float(message['close'])
+                except (ValueError, KeyError, TypeError):
+                    self.errors += 1
+                    continue
+                await self._queue.put((symbol, message))
+        except asyncio.CancelledError:
+            pass  # 服务关闭时结束连接
+        finally:
+            writer.close()
+
+    async def bars(self):
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.bound_port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        async with server:
+            while True:
+                yield await self._queue.get()
+
+
+class ReplayFeed:
+    """Pushes historical Parquet data through as a feed for load testing.
+
+    Bars of all symbols are merged in date order and yielded at full speed,
+    or with interval seconds between dates when interval is set. The feed
+    ends after the last bar.
+
+    Attributes:
+        symbol_paths: Dict mapping symbol to data file path
+        file_type: 'parquet' or 'csv'
+        start_date: Optional first date to replay
+        end_date: Optional last date to replay
+        interval: Seconds between consecutive dates, None for full speed
+    """
+    def __init__(self, symbol_paths, file_type='parquet', start_date=None, end_date=None, interval=None):
+        self.symbol_paths = dict(symbol_paths)
+        self.file_type = file_type
+        self.start_date = start_date
+        self.end_date = end_date
+        self.interval = interval
+
+    @classmethod
+    def from_directory(cls, data_dir='data', symbols=None, file_type='parquet', **kwargs):
+        return cls(_symbol_paths(data_dir, file_type, symbols), file_type=file_type, **kwargs)
+
+    def _load(self, path):
+        data_handler = DataHandler(path, file_type=self.file_type)
+        data_handler.preprocess_data(start_date=self.start_date, end_date=self.end_date)
+        return data_handler
+
+    async def bars(self):
+        handlers = await asyncio.gather(*[asyncio.to_thread(self._load, path)
+                                          for path in self.symbol_paths.values()])
+        symbols = list(self.symbol_paths)
+        # 全部品种的K线按日期合并(同一日期内按品种顺序)
+        dates = np.concatenate([h.dates for h in handlers])
+        owner = np.repeat(np.arange(len(handlers)), [len(h.dates) for h in handlers])
+        row = np.concatenate([np.arange(len(h.dates)) for h in handlers])
+        order = np.lexsort((owner, dates))
+        fields = [_bar_fields(h) for h in handlers]
+        previous = None
+        for i in order:
+            if self.interval and previous is not None and dates[i] != previous:
+                await asyncio.sleep(self.interval)
+            previous = dates[i]
+            yield symbols[owner[i]], _bar(fields[owner[i]], row[i])
+
+
+class PaperAccount:
+    """Paper position and equity of one symbol driven by a streaming strategy.
+
+    Follows the backtest convention: the position of a bar is entered at that
+    bar's execution price and earns the execution-price return up to the next
+    bar, so equity / capital equals BacktestEngine's CumulativeReturn.
+
+    Attributes:
+        symbol: Symbol name
+        strategy: TradingStrategyCore used through update()
+        capital: Initial capital
+        equity: Current marked-to-market equity
+        position: Current position (1 long, 0 flat, -1 short)
+        price: Execution price of the last processed bar
+        bars: Number of live bars processed
+        orders: Number of orders issued
+        skipped: Number of bars ignored as not newer than the strategy state
+    """
+    def __init__(self, symbol, strategy, capital=1_000_000.0):
+        self.symbol = symbol
+        self.strategy = strategy
+        self.capital = capital
+        self.equity = capital
+        self.position = 0.0
+        self.price = None
+        self.bars = 0
+        self.orders = 0
+        self.skipped = 0
+
+    def warm_up(self, data_handler):
+        """在历史数据上批量生成信号，只取末根K线的策略状态(不产生交易)"""
+        history = TradingStrategyCore(data_handler, strategy_type=self.strategy.strategy_type,
+                                      **self.strategy.strategy_params)
+        history.generate_signals()
+        self.strategy.set_state(history.get_state())
+
+    def on_bar(self, bar):
+        """处理一根K线，返回产生的事件(委托与持仓)"""
+        state = self.strategy.state
+        date = _format_date(bar['date'])
+        if state is not None and np.datetime64(date) <= np.datetime64(state['last_date']):
+            self.skipped += 1
+            return []
+        row = self.strategy.update(bar)
+        price = row['ExecutionPrice']
+        # 上一根K线的持仓按执行价涨跌计入净值，再按本根K线的目标持仓调仓
+        if self.price is not None and self.position:
+            self.equity *= 1 + self.position * (price / self.price - 1)
+        self.price = price
+        self.bars += 1
+        events = []
+        target = row['Position']
+        if target != self.position:
+            self.orders += 1
+            events.append({'type': 'order', 'symbol': self.symbol, 'date': date,
+                           'side': 'buy' if target > self.position else 'sell',
+                           'quantity': abs(target - self.position), 'price': price, 'position': target})
+            self.position = target
+        events.append({'type': 'position', 'symbol': self.symbol, 'date': date, 'position': self.position,
+                       'price': price, 'equity': self.equity, 'signal': row['TradingSignal']})
+        return events
+
+    def snapshot(self):
+        return {'symbol': self.symbol, 'position': self.position, 'price': self.price,
+                'equity': self.equity, 'bars': self.bars, 'orders': self.orders,
+                'last_date': None if self.strategy.state is None else self.strategy.state['last_date']}
+
+
+class PaperTradingService:
+    """Long-running asyncio paper-trading service.
+
+    Reads (symbol, bar) pairs from a feed and dispatches each bar to the
+    symbol's own queue and worker task, so symbols advance
+    independently. Events (orders, positions, errors) are published to every
+    subscriber queue and optionally appended to a JSON Lines log. Per-bar
+    latency is measured from the moment the bar left the feed until its
+    events were published (including time queued behind earlier bars of the
+    same symbol); processing time covers the strategy and account update only.
+    Symbol queues are unbounded, so dispatch never waits on a slow symbol and
+    no bar is ever dropped (the streaming strategy state depends on every
+    bar); the deepest backlog of each symbol is kept in backlog. Backpressure
+    is applied by the feed itself, e.g. SocketFeed's bounded queue.
+
+    Attributes:
+        feed: Bar feed (DirectoryFeed, SocketFeed, ReplayFeed or compatible)
+        strategy_type: Streaming strategy type (see TradingStrategyCore.STREAMING_TYPES)
+        strategy_params: Strategy parameters passed to TradingStrategyCore
+        capital: Initial capital of every symbol's paper account
+        accounts: Dict mapping symbol to PaperAccount
+        latencies: Dict mapping symbol to list of per-bar latencies in seconds
+        processing: Dict mapping symbol to list of per-bar processing times in seconds
+        dropped: Number of events dropped because a subscriber queue was full
+        backlog: Dict mapping symbol to the largest number of bars queued for it
+    """
+    def __init__(self, feed, strategy_type='EWMA', capital=1_000_000.0,
+                 log_path=None, **kwargs):
+        if strategy_type not in TradingStrategyCore.STREAMING_TYPES:
+            raise ValueError(f"策略类型{strategy_type}不支持增量更新")
+        # 提前检查参数
+        TradingStrategyCore(None, strategy_type=strategy_type, **kwargs)
+        self.feed = feed
+        self.strategy_type = strategy_type
+        self.strategy_params = kwargs
+        self.capital = capital
+        self.log_path = log_path
+        self.accounts = {}
+        self.latencies = defaultdict(list)
+        self.processing = defaultdict(list)
+        self.dropped = 0
+        self.backlog = defaultdict(int)
+        self._subscribers = []
+        self._queues = {}
+        self._workers = {}
+        self._log = None
+        self.started = None
+        self.elapsed = None
+
+    def subscribe(self, maxsize=0):
+        """订阅事件，返回接收事件dict的asyncio.Queue(队列满时丢弃新事件并计入dropped)"""
+        queue = asyncio.Queue(maxsize)
+        self._subscribers.append(queue)
+        return queue
+
+    def account(self, symbol):
+        if symbol not in self.accounts:
+            strategy = TradingStrategyCore(None, strategy_type=self.strategy_type, **self.strategy_params)
+            self.accounts[symbol] = PaperAccount(symbol, strategy, self.capital)
+        return self.accounts[symbol]
+
+    async def run(self):
+        """运行服务，直到行情源结束(回放)或被取消"""
+        self.started = time.perf_counter()
+        self._log = open(self.log_path, 'a', encoding='utf-8') if self.log_path else None
+        try:
+            if hasattr(self.feed, 'history'):
+                for symbol, data_handler in (await self.feed.history()).items():
+                    self.account(symbol).warm_up(data_handler)
+            async for symbol, bar in self.feed.bars():
+                queue = self._queues.get(symbol)
+                if queue is None:
+                    queue = self._queues[symbol] = asyncio.Queue()
+                    self.account(symbol)
+                    self._workers[symbol] = asyncio.create_task(self._worker(symbol, queue))
+                # 队列不设上限：丢弃K线会破坏增量策略的状态，积压只记录最大深度
+                queue.put_nowait((bar, time.perf_counter()))
+                self.backlog[symbol] = max(self.backlog[symbol], queue.qsize())
+                # 让出事件循环，使各品种的协程在行情源不等待时(如全速回放)也能及时取走K线
+                await asyncio.sleep(0)
+            for queue in self._queues.values():
+                await queue.put(None)
+            await asyncio.gather(*self._workers.values())
+        finally:
+            for task in self._workers.values():
+                task.cancel()
+            if self._log is not None:
+                self._log.close()
+            self.elapsed = time.perf_counter() - self.started
+
+    async def _worker(self, symbol, queue):
+        """单个品种的处理协程：逐根推进策略与模拟账户"""
+        account = self.accounts[symbol]
+        latencies = self.latencies[symbol]
+        processing = self.processing[symbol]
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            bar, received = item
+            started = time.perf_counter()
+            try:
+                events = account.on_bar(bar)
+            except Exception as error:
+                # 单根K线出错只影响该品种的这一根K线
+                events = [{'type': 'error', 'symbol': symbol, 'date': _format_date(bar.get('date')),
+                           'error': repr(error)}]
+            for event in events:
+                self._publish(event)
+            finished = time.perf_counter()
+            processing.append(finished - started)
+            latencies.append(finished - received)
+
+    def _publish(self, event):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+        if self._log is not None:
+            self._log.write(json.dumps(event) + '\n')
+
+    def positions(self):
+        """各品种当前的模拟持仓与净值"""
+        return pl.DataFrame([account.snapshot() for account in self.accounts.values()],
+                            schema={'symbol': pl.String, 'position': pl.Float64, 'price': pl.Float64,
+                                    'equity': pl.Float64, 'bars': pl.Int64, 'orders': pl.Int64,
+                                    'last_date': pl.String})
+
+    def latency_stats(self):
+        """各品种(及全部品种ALL)的逐K线延迟：K线数、最大积压K线数、延迟均值/分位数/最大值与处理耗时均值/p99(微秒)"""
+        rows = []
+        symbols = [s for s in self.latencies if self.latencies[s]]
+        groups = {s: (self.latencies[s], self.processing[s]) for s in symbols}
+        if symbols:
+            groups['ALL'] = (np.concatenate([self.latencies[s] for s in symbols]),
+                             np.concatenate([self.processing[s] for s in symbols]))
+        for symbol, (latency, processing) in groups.items():
+            latency = np.asarray(latency) * 1e6
+            processing = np.asarray(processing) * 1e6
+            p50, p95, p99 = np.percentile(latency, [50, 95, 99])
+            backlog = max(self.backlog.values()) if symbol == 'ALL' else self.backlog.get(symbol, 0)
+            rows.append({'symbol': symbol, 'bars': len(latency), 'max_backlog': backlog, 'mean_us': latency.mean(),
+                         'p50_us': p50, 'p95_us': p95, 'p99_us': p99, 'max_us': latency.max(),
+                         'process_mean_us': processing.mean(),
+                         'process_p99_us': np.percentile(processing, 99)})
+        return pl.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="模拟交易服务")
+    parser.add_argument('--feed', choices=['directory', 'socket', 'replay'], default='directory')
+    parser.add_argument('--data-dir', default='data')
+    parser.add_argument('--symbols', nargs='+', help="品种(文件名，不含扩展名)，默认全部")
+    parser.add_argument('--file-type', choices=['parquet', 'csv'], default='parquet')
+    parser.add_argument('--strategy', default='EWMA', choices=TradingStrategyCore.STREAMING_TYPES)
+    parser.add_argument('--span', type=int, default=30)
+    parser.add_argument('--capital', type=float, default=1_000_000.0)
+    parser.add_argument('--interval', type=float, default=None,
+                        help="目录轮询间隔(默认1秒)；回放时为相邻日期间隔(默认全速)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9100)
+    parser.add_argument('--start-date', type=datetime.fromisoformat, help="回放起始日期")
+    parser.add_argument('--end-date', type=datetime.fromisoformat, help="回放结束日期")
+    parser.add_argument('--log', help="将委托与持仓事件追加到该JSON Lines文件")
+    args = parser.parse_args(argv)
+
+    if args.feed == 'directory':
+        feed = DirectoryFeed(args.data_dir, args.symbols, args.file_type, interval=args.interval or 1.0)
+    elif args.feed == 'socket':
+        feed = SocketFeed(args.host, args.port)
+    else:
+        feed = ReplayFeed.from_directory(args.data_dir, args.symbols, args.file_type, interval=args.interval,
+                                         start_date=args.start_date, end_date=args.end_date)
+    service = PaperTradingService(feed, strategy_type=args.strategy, capital=args.capital,
+                                  log_path=args.log, span=args.span)
+    try:
+        asyncio.run(service.run())
+    except KeyboardInterrupt:
+        pass
+    print(service.positions())
+    print(service.latency_stats())
+    bars = sum(len(values) for values in service.latencies.values())
+    if service.elapsed:
+        print(f"{bars}根K线，{service.elapsed:.2f}s，{bars / service.elapsed:,.0f}根/秒")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
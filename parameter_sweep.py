@@ -0,0 +1,98 @@
+import numpy as np
+import polars as pl
+
+from strategy_core import ewma_matrix, crossover_signals, signal_positions
+from metrics import compute_metrics
+from compute_graph import graph_for
+
+
+class ParameterSweep:
+    """Batched parameter sweep over EWMA spans.
+
+    Evaluates many spans of the EWMA crossover strategy on one dataset in a
+    single vectorized pass: the EWMA, signals, positions and backtest returns
+    are computed as (spans × bars) matrices instead of building a new
+    TradingStrategyCore and BacktestEngine per span.
+
+    Attributes:
+        dates: Array of trading dates
+        close_prices: Array of closing prices
+        execution_price: Array of execution prices, computed once
+        returns: Array of bar returns at execution price, computed once
+        strategy_type: 'EWMA' or 'EWMA_LONG_ONLY'
+        max_chunk_bytes: Upper bound of memory used by one span chunk
+    """
+    SUPPORTED_TYPES = ('EWMA', 'EWMA_LONG_ONLY')
+
+    def __init__(self, data_handler, strategy_type='EWMA', max_chunk_bytes=64 * 1024**2):
+        if strategy_type not in self.SUPPORTED_TYPES:
+            raise ValueError(f"不支持的策略类型: {strategy_type}")
+        self.dates = data_handler.dates
+        self.close_prices = data_handler.close
+        self.strategy_type = strategy_type
+        self.max_chunk_bytes = max_chunk_bytes
+        # 执行价格与单期收益只与数据有关，取自数据集的计算图(与其他策略和回测共用)
+        graph = graph_for(data_handler)
+        self.execution_price = graph.get('execution_price')
+        self.returns = graph.get('bar_returns')
+
+    def chunk_size(self, n_spans):
+        """根据内存上限计算每批处理的参数个数"""
+        n_bars = max(len(self.close_prices), 1)
+        # 每个参数同时存在约6个等长float64矩阵行(EWMA/信号/持仓/收益/净值/中间量)
+        per_span = 6 * 8 * n_bars
+        return int(max(1, min(n_spans, self.max_chunk_bytes // per_span)))
+
+    def run_chunk(self, spans):
+        """对一批参数计算持仓与策略收益矩阵
+
+        Returns:
+            dict: Position / StrategyReturn / CumulativeReturn 三个(参数数 × 长度)矩阵
+        """
+        ewma = ewma_matrix(self.close_prices, spans)
+        trading_signal = crossover_signals(self.close_prices, ewma)
+        position = signal_positions(trading_signal,
+                                    long_only=self.strategy_type == 'EWMA_LONG_ONLY')
+        # 与BacktestEngine.run_backtest相同的收益计算，按行广播
+        strategy_returns = position * self.returns
+        cumulative_returns = np.cumprod(1 + strategy_returns, axis=1)
+        return {
+            'Position': position,
+            'StrategyReturn': strategy_returns,
+            'CumulativeReturn': cumulative_returns
+        }
+
+    def run(self, spans):
+        """批量评估所有参数并返回每个参数的汇总指标
+
+        Args:
+            spans (Sequence[int]): 待评估的EWMA周期
+        Returns:
+            pl.DataFrame: 每行一个span的指标表
+        """
+        spans = np.asarray(spans, dtype=np.int64)
+        tables = []
+        step = self.chunk_size(len(spans))
+        for start in range(0, len(spans), step):
+            chunk = spans[start:start + step]
+            result = self.run_chunk(chunk)
+            metrics = summarize_runs(result['Position'], result['StrategyReturn'],
+                                     result['CumulativeReturn'])
+            tables.append(pl.DataFrame({'span': chunk, **metrics}))
+        if not tables:
+            return pl.DataFrame({'span': spans, **{name: np.empty(0) for name in METRIC_COLUMNS}},
+                                schema_overrides={'Trades': pl.Int64})
+        return pl.concat(tables)
+
+
+METRIC_COLUMNS = ('FinalReturn', 'AnnualReturn', 'AnnualVolatility', 'Sharpe', 'MaxDrawdown', 'Trades')
+
+
+def summarize_runs(position, strategy_returns, cumulative_returns):
+    """将(参数数 × 长度)的回测矩阵按行压缩为汇总指标
+
+    Returns:
+        dict: 指标名 -> 每行一个值的数组
+    """
+    metrics = compute_metrics(strategy_returns, position, cumulative_returns)
+    return {name: metrics[name] for name in METRIC_COLUMNS}
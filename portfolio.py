@@ -0,0 +1,171 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+
+from data_handler import DataHandler
+from strategy_core import TradingStrategyCore
+from backtest_engine import BacktestEngine
+from market_store import MarketDataStore
+
+# 工作进程内已打开的合并存储(同一进程的多个品种共用一次映射)
+_STORES = {}
+
+
+def run_symbol_backtest(task):
+    """单品种回测(进程池任务)
+
+    Args:
+        task (tuple): (symbol, data_path, file_type, start_date, end_date, strategy_type, params)
+    Returns:
+        tuple: (symbol, dates, strategy_returns)
+    """
+    symbol, data_path, file_type, start_date, end_date, strategy_type, params = task
+    if file_type == 'store':
+        if data_path not in _STORES:
+            _STORES[data_path] = MarketDataStore(data_path)
+        data_loader = DataHandler.from_store(_STORES[data_path], symbol, start_date, end_date)
+    else:
+        data_loader = DataHandler(data_path, file_type=file_type)
+        data_loader.preprocess_data(start_date=start_date, end_date=end_date)
+    strategy = TradingStrategyCore(data_loader, strategy_type=strategy_type, **params)
+    strategy.generate_signals()
+    result = BacktestEngine(strategy).run_backtest()
+    return symbol, data_loader.dates, result['StrategyReturn']
+
+
+def symbol_weights(symbols, weights=None):
+    """各品种权重数组，weights为None时等权，未列出的品种权重为0"""
+    if weights is None:
+        return np.ones(len(symbols))
+    return np.array([weights.get(s, 0.0) for s in symbols], dtype=np.float64)
+
+
+def combine_returns(returns, weights):
+    """按权重合成组合收益
+
+    每日只在当日有数据的品种之间按权重归一化，品种上市前或停牌日不占用仓位。
+
+    Args:
+        returns (np.ndarray): (日期数 × 品种数)收益矩阵，无数据处为NaN
+        weights (np.ndarray): 每个品种的权重
+    Returns:
+        np.ndarray: 每日组合收益
+    """
+    active = ~np.isnan(returns)
+    active_weights = np.where(active, weights, 0.0)
+    weight_sum = active_weights.sum(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        normalized = np.where(weight_sum > 0, active_weights / weight_sum, 0.0)
+    return (normalized * np.nan_to_num(returns)).sum(axis=1)
+
+
+class PortfolioBacktest:
+    """Multi-symbol portfolio backtest.
+
+    Runs the same strategy on every symbol file in a process pool and combines
+    the per-symbol StrategyReturn into a portfolio equity curve on the union
+    trading calendar of all symbols.
+
+    Attributes:
+        symbol_paths: Dict mapping symbol name to data file path
+        strategy_type: Strategy type passed to TradingStrategyCore
+        strategy_params: Strategy parameters passed to TradingStrategyCore
+        weights: Dict of symbol weights, None for equal weight
+        symbol_returns: Wide DataFrame of per-symbol returns (Date + one column per symbol)
+        portfolio: DataFrame with Date, PortfolioReturn and CumulativeReturn
+    """
+    def __init__(self, symbol_paths, strategy_type='EWMA', weights=None,
+                 file_type='parquet', **kwargs):
+        self.symbol_paths = dict(symbol_paths)
+        self.strategy_type = strategy_type
+        self.strategy_params = kwargs
+        self.file_type = file_type
+        self.weights = weights
+        self.symbol_returns = None
+        self.portfolio = None
+
+    @classmethod
+    def from_directory(cls, data_dir, symbols=None, strategy_type='EWMA', weights=None,
+                       file_type='parquet', **kwargs):
+        """从数据目录构建组合，symbols为文件名(不含扩展名)列表，默认使用目录下全部文件"""
+        suffix = f'.{file_type}'
+        available = {
+            name[:-len(suffix)]: os.path.join(data_dir, name)
+            for name in sorted(os.listdir(data_dir)) if name.endswith(suffix)
+        }
+        if symbols is not None:
+            missing = [s for s in symbols if s not in available]
+            if missing:
+                raise ValueError(f"数据目录中缺少品种文件: {missing}")
+            available = {s: available[s] for s in symbols}
+        return cls(available, strategy_type=strategy_type, weights=weights,
+                   file_type=file_type, **kwargs)
+
+    @classmethod
+    def from_store(cls, store_dir, symbols=None, strategy_type='EWMA', weights=None, **kwargs):
+        """从合并存储(MarketDataStore)构建组合，symbols默认使用存储中的全部品种"""
+        available = MarketDataStore(store_dir).symbols()
+        if symbols is not None:
+            missing = [s for s in symbols if s not in available]
+            if missing:
+                raise ValueError(f"合并存储中缺少品种: {missing}")
+            available = list(symbols)
+        return cls({s: store_dir for s in available}, strategy_type=strategy_type,
+                   weights=weights, file_type='store', **kwargs)
+
+    def run(self, start_date=None, end_date=None, max_workers=None, chunksize=1):
+        """并行回测全部品种并合成组合净值
+
+        Args:
+            start_date (datetime): 起始日期(可选)
+            end_date (datetime): 结束日期(可选)
+            max_workers (int): 进程数，默认使用全部CPU核心；为1时在当前进程内串行执行
+            chunksize (int): 每次分派给单个进程的品种数
+        Returns:
+            pl.DataFrame: 组合每日收益与累计净值
+        """
+        if not self.symbol_paths:
+            raise ValueError("没有可加载的品种")
+        tasks = [
+            (symbol, path, self.file_type, start_date, end_date,
+             self.strategy_type, self.strategy_params)
+            for symbol, path in self.symbol_paths.items()
+        ]
+        if max_workers == 1:
+            results = list(map(run_symbol_backtest, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                results = list(executor.map(run_symbol_backtest, tasks, chunksize=chunksize))
+
+        if not any(len(dates) for _, dates, _ in results):
+            raise ValueError(f"区间内没有任何品种的数据: {start_date} ~ {end_date}")
+        self.symbol_returns = self._align_returns(results)
+        self.portfolio = self._combine(self.symbol_returns)
+        return self.portfolio
+
+    @staticmethod
+    def _align_returns(results):
+        """将各品种收益对齐到所有品种交易日的并集，缺失日期(及区间内无数据的品种)保留为null"""
+        frames = [
+            pl.DataFrame({'Date': dates, 'Symbol': symbol, 'Return': returns})
+            for symbol, dates, returns in results if len(dates)
+        ]
+        long_frame = pl.concat(frames)
+        symbols = [symbol for symbol, _, _ in results]
+        wide = long_frame.pivot(on='Symbol', index='Date', values='Return').sort('Date')
+        return wide.select(['Date', *(pl.col(s) if s in wide.columns else pl.lit(None, pl.Float64).alias(s)
+                                      for s in symbols)])
+
+    def _combine(self, symbol_returns):
+        """按权重合成组合收益"""
+        symbols = symbol_returns.columns[1:]
+        portfolio_returns = combine_returns(symbol_returns.select(symbols).to_numpy(),
+                                            symbol_weights(symbols, self.weights))
+        return pl.DataFrame({
+            'Date': symbol_returns['Date'],
+            'PortfolioReturn': portfolio_returns,
+            'CumulativeReturn': np.cumprod(1 + portfolio_returns)
+        })
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows下改用msvcrt字节锁
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache")  # 默认缓存目录
+DEFAULT_MAX_BYTES = 1024**3  # 默认缓存上限1GB
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """计算文件内容哈希，作为数据源版本标识"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(**parts):
+    """由任意可JSON序列化的字段生成缓存键"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of strategy and backtest arrays.
+
+    Each entry is a directory of .npy files that is loaded back as read-only
+    memory-mapped arrays. Entries are keyed by a hash of the data source content,
+    the preprocessing date range and the strategy parameters, and evicted in
+    least-recently-used order once the total size exceeds max_bytes.
+
+    Reads never rewrite the index: a hit only touches the entry directory's
+    mtime, which eviction takes as the last access time. Index updates hold
+    an exclusive file lock (where available) and replace the file atomically,
+    so concurrent processes sharing a cache directory do not lose entries.
+
+    Attributes:
+        cache_dir: Root directory of the cache
+        max_bytes: Upper bound of total cached bytes
+        hits: Number of cache hits in this process
+        misses: Number of cache misses in this process
+    """
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = 'index.lock'
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def stats(self):
+        """命中统计"""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'entries': len(self._load_index()),
+            'bytes': sum(e['bytes'] for e in self._load_index().values())
+        }
+
+    def get(self, key):
+        """读取缓存，未命中返回None
+
+        Returns:
+            dict: 字段名 -> 只读内存映射数组
+        """
+        index = self._load_index()
+        entry_dir = os.path.join(self.cache_dir, key)
+        if key not in index or not os.path.isdir(entry_dir):
+            self.misses += 1
+            return None
+        try:
+            arrays = {
+                name: np.load(os.path.join(entry_dir, f'{i}.npy'), mmap_mode='r')
+                for i, name in enumerate(index[key]['fields'])
+            }
+        except (OSError, ValueError):
+            # 缓存文件损坏时按未命中处理并删除该条目
+            with self._locked():
+                index = self._load_index()
+                self._remove(index, key)
+                self._save_index(index)
+            self.misses += 1
+            return None
+        # 只更新条目目录的修改时间作为访问时间，读路径不改写索引
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            pass
+        self.hits += 1
+        return arrays
+
+    def put(self, key, arrays, source=None):
+        """写入缓存并按LRU淘汰超出容量的条目
+
+        Args:
+            key (str): 缓存键
+            arrays (dict): 字段名 -> numpy数组
+            source (str): 数据源文件路径，用于按文件失效
+        """
+        entry_dir = os.path.join(self.cache_dir, key)
+        tmp_dir = f'{entry_dir}.tmp{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        fields = list(arrays)
+        size = 0
+        for i, name in enumerate(fields):
+            path = os.path.join(tmp_dir, f'{i}.npy')
+            np.save(path, np.asarray(arrays[name]), allow_pickle=False)
+            size += os.path.getsize(path)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+
+        with self._locked():
+            index = self._load_index()
+            index[key] = {
+                'fields': fields,
+                'bytes': size,
+                'source': os.path.abspath(source) if source else None,
+                'last_access': time.time()
+            }
+            self._evict(index)
+            self._save_index(index)
+
+    def invalidate_source(self, source):
+        """删除由指定数据源文件生成的全部缓存条目"""
+        source = os.path.abspath(source)
+        with self._locked():
+            index = self._load_index()
+            for key in [k for k, e in index.items() if e.get('source') == source]:
+                self._remove(index, key)
+            self._save_index(index)
+
+    def clear(self):
+        """清空缓存"""
+        with self._locked():
+            index = self._load_index()
+            for key in list(index):
+                self._remove(index, key)
+            self._save_index(index)
+
+    def _evict(self, index):
+        """按最近访问时间从旧到新淘汰，直到总大小不超过上限"""
+        total = sum(e['bytes'] for e in index.values())
+        for key in sorted(index, key=lambda k: self._last_access(index, k)):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['bytes']
+            self._remove(index, key)
+
+    def _last_access(self, index, key):
+        """写入时间与命中时更新的条目目录修改时间中较晚者"""
+        try:
+            accessed = os.path.getmtime(os.path.join(self.cache_dir, key))
+        except OSError:
+            accessed = 0.0
+        return max(index[key]['last_access'], accessed)
+
+    @contextmanager
+    def _locked(self):
+        """修改索引期间持有的进程间排他锁"""
+        with open(os.path.join(self.cache_dir, self.LOCK_FILE), 'a+') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                # 锁定锁文件首字节；LK_LOCK重试约10秒后抛出OSError，此时继续等待
+                lock.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+                try:
+                    yield
+                finally:
+                    lock.seek(0)
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                yield
+
+    def _remove(self, index, key):
+        shutil.rmtree(os.path.join(self.cache_dir, key), ignore_errors=True)
+        index.pop(key, None)
+
+    def _load_index(self):
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f'{path}.tmp{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, path)
+
+
+def invalidate_source(source, cache_dir=DEFAULT_CACHE_DIR):
+    """数据文件被改写后调用，删除默认缓存目录中该文件的缓存"""
+    if os.path.isdir(cache_dir):
+        ResultCache(cache_dir).invalidate_source(source)
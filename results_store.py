@@ -0,0 +1,321 @@
+"""
+回测结果的列式存储
+
+每次回测的元数据(品种、策略类型、参数、日期区间、数据哈希)与绩效指标追加到
+按 strategy_type/symbol 分区(hive目录)的Parquet分片，净值曲线可选地写入同样
+分区的equity目录。查询返回polars LazyFrame：分区列上的过滤只扫描对应目录，
+其余列上的过滤下推到Parquet行组统计，在数十万次回测中筛选、排名、分组
+不需要读取全部数据，也不需要重新回测。
+
+    store = ResultsStore('results')
+    store.add(strategy, campaign='span_scan')
+    store.flush()
+    store.rank('Sharpe', by='symbol', top=5, strategy_type='EWMA')
+"""
+
+import os
+import glob
+import uuid
+import json
+from datetime import datetime
+from urllib.parse import quote
+import numpy as np
+import polars as pl
+
+from metrics import compute_metrics, METRIC_NAMES, POSITION_METRIC_NAMES
+from result_cache import make_key
+from instrumentation import symbol_from_path
+
+DEFAULT_RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")  # 默认结果存储目录
+PARTITION_COLUMNS = ('strategy_type', 'symbol')
+RUN_SCHEMA = {
+    'run_id': pl.String,
+    'campaign': pl.String,
+    'strategy_type': pl.String,
+    'symbol': pl.String,
+    'params': pl.String,  # 参数的JSON字符串(各策略参数不同)，按参数过滤见param()
+    'start_date': pl.Datetime('us'),
+    'end_date': pl.Datetime('us'),
+    'bars': pl.Int64,
+    'data_hash': pl.String,
+    'dtype': pl.String,
+    'created_at': pl.Datetime('us'),
+    **{name: pl.Float64 for name in (*METRIC_NAMES, *POSITION_METRIC_NAMES)}
+}
+EQUITY_SCHEMA = {
+    'run_id': pl.String,
+    'strategy_type': pl.String,
+    'symbol': pl.String,
+    'date': pl.Datetime('us'),
+    'equity': pl.Float64
+}
+
+
+def _to_datetime(value):
+    return np.datetime64(value, 'us').item()
+
+
+def run_record(strategy, symbol=None, campaign=None, equity=False):
+    """由已完成回测的策略生成一条运行记录(可在工作进程中调用)
+
+    Args:
+        strategy (TradingStrategyCore): 已执行generate_signals与run_backtest的策略
+        symbol (str): 品种名，默认取数据文件名
+        campaign (str): 所属批次(如一次参数扫描)的名称
+        equity (bool): 为True时同时返回净值曲线
+    Returns:
+        tuple: (运行记录dict, 净值曲线pl.DataFrame或None)
+    """
+    data = strategy.processed_data
+    if data is None or 'StrategyReturn' not in data:
+        raise ValueError("请先执行回测再记录结果")
+    handler = strategy.data_handler
+    symbol = symbol or symbol_from_path(getattr(handler, 'data_path', None))
+    if symbol is None:
+        raise ValueError("无法由数据源确定品种名，请指定symbol")
+    fingerprint = handler.fingerprint() if hasattr(handler, 'fingerprint') else None
+    params = json.dumps(strategy.strategy_params, sort_keys=True, default=str)
+    dates = data['Date']
+    data_hash = None if fingerprint is None else make_key(**fingerprint)[:16]
+    metrics = compute_metrics(data['StrategyReturn'], data['Position'], data['CumulativeReturn'])
+
+    record = {
+        'run_id': make_key(campaign=campaign, symbol=symbol, strategy_type=strategy.strategy_type,
+                           params=params, data=data_hash, dtype=strategy.dtype.name)[:16],
+        'campaign': campaign,
+        'strategy_type': strategy.strategy_type,
+        'symbol': symbol,
+        'params': params,
+        'start_date': _to_datetime(dates[0]) if len(dates) else None,
+        'end_date': _to_datetime(dates[-1]) if len(dates) else None,
+        'bars': len(dates),
+        'data_hash': data_hash,
+        'dtype': strategy.dtype.name,
+        'created_at': datetime.now(),
+        **{name: float(value) for name, value in metrics.items()}
+    }
+    curve = None
+    if equity:
+        curve = pl.DataFrame({
+            'run_id': record['run_id'],
+            'strategy_type': strategy.strategy_type,
+            'symbol': symbol,
+            'date': dates,
+            'equity': np.asarray(data['CumulativeReturn'], dtype=np.float64)
+        }, schema=EQUITY_SCHEMA)
+    return record, curve
+
+
+def _latest_runs(frame):
+    """同一run_id的多条运行记录只保留created_at最新的一条(DataFrame或LazyFrame)"""
+    return (frame.sort('created_at', nulls_last=False, maintain_order=True)
+                 .unique('run_id', keep='last', maintain_order=True))
+
+
+class ResultsStore:
+    """Partitioned Parquet store of backtest runs with a lazy query API.
+
+    Runs are buffered by add() and written by flush() as one new part file per
+    (strategy_type, symbol) partition, so concurrent writers never touch the
+    same file; compact() merges the parts of each partition. Queries scan all
+    parts lazily with hive partitioning, so filters on partition columns prune
+    directories and other filters are pushed down to Parquet statistics.
+    A run recorded more than once (same run_id) is stored once: flush()
+    removes the superseded rows from the partition's older parts (the only
+    case in which an existing part is rewritten), so queries need no
+    deduplication and keep their predicate pushdown.
+
+    Attributes:
+        root: Directory of the store ('runs' and 'equity' subdirectories)
+        batch_size: Number of buffered runs that triggers an automatic flush
+        pending: Buffered run records not yet written
+        pending_equity: Buffered equity curves not yet written
+    """
+    RUNS_DIR = 'runs'
+    EQUITY_DIR = 'equity'
+
+    def __init__(self, root=DEFAULT_RESULTS_DIR, batch_size=10_000):
+        self.root = root
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_equity = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, strategy, symbol=None, campaign=None, equity=False):
+        """记录一次已完成的回测(缓冲，达到batch_size时自动写入)
+
+        Returns:
+            str: 运行编号run_id
+        """
+        record, curve = run_record(strategy, symbol=symbol, campaign=campaign, equity=equity)
+        self.add_record(record, curve)
+        return record['run_id']
+
+    def add_record(self, record, equity=None):
+        """记录run_record生成的运行记录(如工作进程返回的结果)"""
+        self.pending.append(record)
+        if equity is not None:
+            self.pending_equity.append(equity)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """将缓冲的记录写入新分片
+
+        Returns:
+            int: 写入的运行数(同一run_id只计一次)
+        """
+        count = len(self.pending)
+        if self.pending:
+            runs = pl.DataFrame([{name: row.get(name) for name in RUN_SCHEMA} for row in self.pending],
+                                schema=RUN_SCHEMA)
+            runs = _latest_runs(runs)
+            count = runs.height
+            self._write(self.RUNS_DIR, runs.sort('campaign', 'created_at', nulls_last=True))
+            self.pending = []
+        if self.pending_equity:
+            curves = pl.concat(self.pending_equity).unique(['run_id', 'date'], keep='last')
+            self._write(self.EQUITY_DIR, curves.sort('run_id', 'date'))
+            self.pending_equity = []
+        return count
+
+    def _write(self, kind, frame):
+        """按分区写入分片(先写临时文件再改名，读者不会看到写了一半的分片)"""
+        for (strategy_type, symbol), part in frame.group_by(PARTITION_COLUMNS, maintain_order=True):
+            directory = self._partition_dir(kind, strategy_type, symbol)
+            os.makedirs(directory, exist_ok=True)
+            existing = sorted(glob.glob(os.path.join(directory, '*.parquet')))
+            name = f'part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet'
+            tmp = os.path.join(directory, f'.{name}.tmp')
+            part.drop(PARTITION_COLUMNS).write_parquet(tmp, statistics=True)
+            os.replace(tmp, os.path.join(directory, name))
+            self._drop_superseded(existing, part['run_id'].unique().to_list())
+
+    @staticmethod
+    def _drop_superseded(paths, run_ids):
+        """从已有分片中删除被新写入记录取代的运行(同一run_id只保留最新写入的一次)"""
+        for path in paths:
+            stale = (pl.scan_parquet(path, hive_partitioning=False)
+                       .filter(pl.col('run_id').is_in(run_ids)).select(pl.len()).collect().item())
+            if not stale:
+                continue
+            kept = pl.read_parquet(path, hive_partitioning=False).filter(~pl.col('run_id').is_in(run_ids))
+            if kept.height:
+                tmp = os.path.join(os.path.dirname(path), f'.{os.path.basename(path)}.tmp')
+                kept.write_parquet(tmp, statistics=True)
+                os.replace(tmp, path)
+            else:
+                os.remove(path)
+
+    def _partition_dir(self, kind, strategy_type, symbol):
+        return os.path.join(self.root, kind,
+                            f'strategy_type={quote(str(strategy_type), safe="")}',
+                            f'symbol={quote(str(symbol), safe="")}')
+
+    def _scan(self, kind, schema):
+        pattern = os.path.join(self.root, kind, '*', '*', '*.parquet')
+        if not glob.glob(pattern):
+            return pl.LazyFrame(schema=schema)
+        file_schema = {k: v for k, v in schema.items() if k not in PARTITION_COLUMNS}
+        return pl.scan_parquet(pattern, hive_partitioning=True, schema=file_schema,
+                               hive_schema={col: pl.String for col in PARTITION_COLUMNS},
+                               missing_columns='insert').select(list(schema))
+
+    @staticmethod
+    def _filter(frame, filters):
+        """列名=值(或值列表)的过滤条件"""
+        for column, value in filters.items():
+            if isinstance(value, (list, tuple, set)):
+                frame = frame.filter(pl.col(column).is_in(list(value)))
+            elif value is not None:
+                frame = frame.filter(pl.col(column) == value)
+        return frame
+
+    @staticmethod
+    def param(name, dtype=pl.Float64):
+        """按策略参数过滤或分组的表达式，如 store.scan().filter(ResultsStore.param('span') == 30)"""
+        return pl.col('params').str.json_path_match(f'$.{name}').cast(dtype)
+
+    def scan(self, **filters):
+        """全部运行记录的LazyFrame
+
+        Args:
+            **filters: 列名=值(或值列表)，如 strategy_type='EWMA', symbol=['AUFI_WI', 'AGFI_WI']
+        Returns:
+            pl.LazyFrame: 列见RUN_SCHEMA
+        """
+        return self._filter(self._scan(self.RUNS_DIR, RUN_SCHEMA), filters)
+
+    def equity(self, run_ids=None, **filters):
+        """净值曲线的LazyFrame(run_id, strategy_type, symbol, date, equity)
+
+        指定strategy_type/symbol时只扫描对应分区。
+        """
+        frame = self._filter(self._scan(self.EQUITY_DIR, EQUITY_SCHEMA), filters)
+        if run_ids is not None:
+            frame = frame.filter(pl.col('run_id').is_in(list(run_ids)))
+        return frame
+
+    def rank(self, metric='Sharpe', by=None, top=10, descending=True, **filters):
+        """按指标排名，by指定时为每组内的前top名
+
+        Returns:
+            pl.DataFrame: 运行记录，含Rank列
+        """
+        frame = self.scan(**filters).filter(pl.col(metric).is_not_nan() & pl.col(metric).is_not_null())
+        rank = pl.col(metric).rank('ordinal', descending=descending)
+        if by is None:
+            frame = frame.sort(metric, descending=descending).head(top).with_columns(rank.alias('Rank'))
+        else:
+            by = [by] if isinstance(by, str) else list(by)
+            frame = (frame.with_columns(rank.over(by).alias('Rank'))
+                          .filter(pl.col('Rank') <= top)
+                          .sort([*by, 'Rank']))
+        return frame.collect()
+
+    def summary(self, by, metrics=('FinalReturn', 'Sharpe', 'MaxDrawdown'), **filters):
+        """分组汇总：每组的运行数及各指标的均值、中位数与最大值
+
+        Args:
+            by (str | Sequence[str | pl.Expr]): 分组列(可包含param()表达式)
+        """
+        by = [by] if isinstance(by, (str, pl.Expr)) else list(by)
+        aggs = [pl.len().alias('Runs')]
+        for name in metrics:
+            aggs += [pl.col(name).mean().alias(f'{name}Mean'),
+                     pl.col(name).median().alias(f'{name}Median'),
+                     pl.col(name).max().alias(f'{name}Max')]
+        names = [key if isinstance(key, str) else key.meta.output_name() for key in by]
+        return self.scan(**filters).group_by(by).agg(aggs).sort(names).collect()
+
+    def compact(self):
+        """合并每个分区的全部分片为一个文件(同一run_id只保留created_at最新的记录)
+
+        Returns:
+            int: 合并前的分片数
+        """
+        self.flush()
+        merged = 0
+        for kind in (self.RUNS_DIR, self.EQUITY_DIR):
+            for directory in sorted(glob.glob(os.path.join(self.root, kind, '*', '*'))):
+                parts = sorted(glob.glob(os.path.join(directory, '*.parquet')))
+                merged += len(parts)
+                if len(parts) < 2:
+                    continue
+                frame = pl.read_parquet(parts, hive_partitioning=False)
+                if kind == self.RUNS_DIR:
+                    frame = _latest_runs(frame).sort('campaign', 'created_at', nulls_last=True)
+                else:
+                    frame = frame.unique(['run_id', 'date'], keep='last').sort('run_id', 'date')
+                name = f'part-{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.parquet'
+                tmp = os.path.join(directory, f'.{name}.tmp')
+                frame.write_parquet(tmp, statistics=True)
+                os.replace(tmp, os.path.join(directory, name))
+                for path in parts:
+                    os.remove(path)
+        return merged
@@ -0,0 +1,253 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+
+from strategy_core import TradingStrategyCore, ewma_rows, crossover_signals, signal_positions
+from backtest_engine import BacktestEngine
+from metrics import compute_metrics, METRIC_NAMES, POSITION_METRIC_NAMES
+
+METHODS = ('block', 'stationary')
+RESAMPLE_MODES = ('market', 'strategy')
+CI_METRICS = ('FinalReturn', 'Sharpe', 'MaxDrawdown', 'AnnualReturn', 'AnnualVolatility', 'Calmar')
+
+# 进程池中每个工作进程持有的数据(由initializer设置一次，各批次只传样本数与种子)
+_WORKER_STATE = {}
+
+
+def block_bootstrap_indices(rng, n_samples, length, block_size):
+    """移动块自助法(moving block bootstrap)的下标矩阵
+
+    每行由随机起点、长度为block_size的连续区块拼接而成，截取前length个。
+
+    Returns:
+        np.ndarray: (n_samples × length)的int64下标矩阵
+    """
+    block_size = max(1, min(block_size, length))
+    n_blocks = -(-length // block_size)
+    starts = rng.integers(0, length - block_size + 1, size=(n_samples, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_size)
+    return indices.reshape(n_samples, -1)[:, :length]
+
+
+def stationary_bootstrap_indices(rng, n_samples, length, block_size):
+    """平稳自助法(Politis-Romano)的下标矩阵
+
+    区块长度服从均值为block_size的几何分布，区块越过序列末尾时回绕到开头。
+    每个位置以概率1/block_size开始新区块，区块内下标逐一递增，整体为数组运算。
+
+    Returns:
+        np.ndarray: (n_samples × length)的int64下标矩阵
+    """
+    new_block = rng.random((n_samples, length)) < 1 / max(block_size, 1)
+    new_block[:, 0] = True
+    starts = rng.integers(0, length, size=(n_samples, length))
+    positions = np.arange(length)
+    # 每个位置所在区块的开始位置，及该区块的随机起点
+    block_start = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    origin = np.take_along_axis(starts, block_start, axis=1)
+    return (origin + positions - block_start) % length
+
+
+def bootstrap_indices(rng, n_samples, length, block_size, method='stationary'):
+    """按method生成自助法下标矩阵"""
+    if method == 'block':
+        return block_bootstrap_indices(rng, n_samples, length, block_size)
+    if method == 'stationary':
+        return stationary_bootstrap_indices(rng, n_samples, length, block_size)
+    raise ValueError(f"不支持的自助法: {method}")
+
+
+def sample_indices(seeds, length, block_size, method='stationary'):
+    """由每个样本各自的种子生成下标矩阵(每行只取决于该样本的种子，与分批方式无关)
+
+    Args:
+        seeds (Sequence[np.random.SeedSequence]): 每个样本一个种子
+    Returns:
+        np.ndarray: (len(seeds) × length)的int64下标矩阵
+    """
+    idx = np.empty((len(seeds), length), dtype=np.int64)
+    for row, seed in enumerate(seeds):
+        idx[row] = bootstrap_indices(np.random.default_rng(seed), 1, length, block_size, method)[0]
+    return idx
+
+
+def _init_worker(state):
+    """工作进程初始化：保存原始序列与抽样设置"""
+    _WORKER_STATE.clear()
+    _WORKER_STATE.update(state)
+
+
+def run_bootstrap_chunk(task):
+    """生成一批重抽样并批量计算指标(进程池任务)
+
+    Args:
+        task (tuple): (批次号, 批内各样本的SeedSequence列表)
+    Returns:
+        tuple: (批次号, 指标名 -> 每个样本一个值的数组)
+    """
+    chunk_id, seeds = task
+    state = _WORKER_STATE
+    n_samples = len(seeds)
+    if state['resample'] == 'strategy':
+        # 直接重抽样策略收益
+        idx = sample_indices(seeds, len(state['strategy_returns']), state['block_size'], state['method'])
+        return chunk_id, compute_metrics(state['strategy_returns'][idx])
+
+    # 重抽样行情：保持首根K线不变，其余K线的(收盘涨跌幅, 执行价/收盘价)成对抽取
+    close_returns, price_ratio = state['close_returns'], state['price_ratio']
+    idx = sample_indices(seeds, len(close_returns) - 1, state['block_size'], state['method']) + 1
+    growth = np.ones((n_samples, len(close_returns)))
+    growth[:, 1:] = 1 + close_returns[idx]
+    close = state['close0'] * np.cumprod(growth, axis=1)
+    ratio = np.empty_like(close)
+    ratio[:, 0] = price_ratio[0]
+    ratio[:, 1:] = price_ratio[idx]
+    execution_price = close * ratio
+    del growth, ratio, idx
+
+    # 在每条合成路径上重新运行策略与回测(与TradingStrategyCore/BacktestEngine相同的计算)
+    ewma = ewma_rows(close, state['span'])
+    trading_signal = crossover_signals(close, ewma)
+    position = signal_positions(trading_signal, long_only=state['long_only'])
+    del ewma, trading_signal, close
+    returns = np.zeros_like(execution_price)
+    returns[:, :-1] = execution_price[:, 1:] / execution_price[:, :-1] - 1
+    return chunk_id, compute_metrics(position * returns, position)
+
+
+class BootstrapRobustness:
+    """Block/stationary bootstrap robustness test of a strategy.
+
+    Draws thousands of resampled histories as index matrices and re-evaluates
+    the strategy on all of them as batched (samples × bars) matrix computations.
+    With resample='market' the bar returns of the price series are resampled
+    and the EWMA strategy is re-run on every synthetic path; with
+    resample='strategy' the backtest's StrategyReturn series is resampled
+    directly (works for any strategy type). The sample axis is split into
+    chunks bounded by max_chunk_bytes, each sample gets its own child seed of
+    one SeedSequence (results depend neither on the number of workers nor on
+    the chunk size), and chunks run in a process pool.
+
+    Attributes:
+        data_handler: Preprocessed DataHandler instance
+        strategy_type: Strategy type passed to TradingStrategyCore
+        strategy_params: Strategy parameters passed to TradingStrategyCore
+        method: 'block' (fixed-length blocks) or 'stationary' (geometric lengths)
+        block_size: Block length, mean block length for the stationary bootstrap
+        resample: 'market' or 'strategy'
+        max_chunk_bytes: Upper bound of memory used by one chunk of samples
+        observed: Metrics of the strategy on the original data
+        samples: Per-sample metrics table after run()
+    """
+    def __init__(self, data_handler, strategy_type='EWMA', method='stationary', block_size=20,
+                 resample='market', max_chunk_bytes=64 * 1024**2, **kwargs):
+        if method not in METHODS:
+            raise ValueError(f"不支持的自助法: {method}")
+        if resample not in RESAMPLE_MODES:
+            raise ValueError(f"不支持的重抽样方式: {resample}")
+        if resample == 'market' and strategy_type not in TradingStrategyCore.STREAMING_TYPES:
+            raise ValueError(f"resample='market'仅支持EWMA策略，{strategy_type}请使用resample='strategy'")
+        self.data_handler = data_handler
+        self.strategy_type = strategy_type
+        self.strategy_params = kwargs
+        self.method = method
+        self.block_size = block_size
+        self.resample = resample
+        self.max_chunk_bytes = max_chunk_bytes
+        self.observed = None
+        self.samples = None
+
+    def chunk_size(self, n_samples):
+        """根据内存上限计算每批样本数"""
+        n_bars = max(len(self.data_handler.dates), 1)
+        # 每个样本同时存在约8个等长float64/int64矩阵行(下标/价格/EWMA/信号/持仓/收益/净值/中间量)
+        per_sample = 8 * 8 * n_bars
+        return int(max(1, min(n_samples, self.max_chunk_bytes // per_sample)))
+
+    def _worker_state(self):
+        """原始数据上运行一次策略，并准备工作进程所需的数组"""
+        strategy = TradingStrategyCore(self.data_handler, strategy_type=self.strategy_type,
+                                       **self.strategy_params)
+        strategy.generate_signals()
+        result = BacktestEngine(strategy).run_backtest()
+        strategy_returns = np.asarray(result['StrategyReturn'], dtype=np.float64)
+        position = np.asarray(result['Position'], dtype=np.float64)
+        self.observed = compute_metrics(strategy_returns,
+                                        position if self.resample == 'market' else None)
+        state = {'method': self.method, 'block_size': self.block_size, 'resample': self.resample}
+        if self.resample == 'strategy':
+            state['strategy_returns'] = strategy_returns
+            return state
+        close = np.asarray(self.data_handler.close, dtype=np.float64)
+        execution_price = (self.data_handler.open + self.data_handler.close) / 2
+        close_returns = np.zeros_like(close)
+        close_returns[1:] = close[1:] / close[:-1] - 1
+        state.update(close0=close[0], close_returns=close_returns, price_ratio=execution_price / close,
+                     span=strategy.span, long_only=self.strategy_type == 'EWMA_LONG_ONLY')
+        return state
+
+    def run(self, n_samples=1000, seed=0, max_workers=None):
+        """生成n_samples个重抽样并计算每个样本的绩效指标
+
+        Args:
+            n_samples (int): 重抽样次数
+            seed (int): 随机种子，相同种子与参数得到相同结果(与进程数无关)
+            max_workers (int): 进程数，默认使用全部CPU核心；为1时在当前进程内串行执行
+        Returns:
+            pl.DataFrame: 每行一个样本的指标表
+        """
+        if n_samples < 1:
+            raise ValueError(f"重抽样次数必须至少为1: {n_samples}")
+        if len(self.data_handler.dates) < 2:
+            raise ValueError("数据长度不足以进行重抽样")
+        state = self._worker_state()
+        step = self.chunk_size(n_samples)
+        seeds = np.random.SeedSequence(seed).spawn(n_samples)
+        tasks = [(i, seeds[start:start + step]) for i, start in enumerate(range(0, n_samples, step))]
+
+        if max_workers == 1:
+            _init_worker(state)
+            results = list(map(run_bootstrap_chunk, tasks))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=(state,)) as executor:
+                results = list(executor.map(run_bootstrap_chunk, tasks))
+
+        results.sort(key=lambda item: item[0])
+        names = [name for name in (*METRIC_NAMES, *POSITION_METRIC_NAMES) if name in results[0][1]]
+        self.samples = pl.DataFrame({
+            'Sample': np.arange(n_samples),
+            **{name: np.concatenate([metrics[name] for _, metrics in results]) for name in names}
+        })
+        return self.samples
+
+    def confidence_intervals(self, level=0.95, metrics=CI_METRICS):
+        """各指标的百分位置信区间
+
+        Args:
+            level (float): 置信水平
+            metrics (Sequence[str]): 指标名
+        Returns:
+            pl.DataFrame: Metric、Observed(原始数据)、Mean、Median、Lower、Upper，
+                以及ProbBelowObserved(样本低于原始结果的比例)
+        """
+        if self.samples is None:
+            raise ValueError("请先调用run")
+        tail = (1 - level) / 2 * 100
+        rows = []
+        for name in metrics:
+            values = self.samples[name].to_numpy().astype(np.float64)
+            values = values[np.isfinite(values)]
+            observed = float(self.observed[name])
+            if values.size == 0:
+                lower = upper = mean = median = below = np.nan
+            else:
+                lower, median, upper = np.percentile(values, [tail, 50, 100 - tail])
+                mean = values.mean()
+                below = float((values < observed).mean())
+            rows.append({'Metric': name, 'Observed': observed, 'Mean': float(mean), 'Median': float(median),
+                         'Lower': float(lower), 'Upper': float(upper), 'ProbBelowObserved': below})
+        return pl.DataFrame(rows)
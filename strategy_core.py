@@ -1,26 +1,327 @@
 # will change and rich later
+import json
 import numpy as np
+import polars as pl
+
+from result_cache import make_key
+from strategy_result import StrategyResult, ACTION_BUY, ACTION_SELL, ACTION_HOLD
+from indicators import indicator_outputs, column_name, ewma_expr
+from compute_graph import register_node, graph_for
+from instrumentation import instrument, symbol_from_path
+
+
+def ewma_kernel(values, span):
+    """计算EWMA(递推形式: ewma[0]=x[0], ewma[i]=ewma[i-1]+alpha*(x[i]-ewma[i-1])，见ewma_expr)
+
+    Args:
+        values (np.ndarray): 一维价格序列
+        span (int): EWMA周期，alpha = 2 / (span + 1)
+    Returns:
+        np.ndarray: 与values等长的EWMA序列(float64)
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    # 递推由polars在原生代码中完成
+    return pl.DataFrame({'x': values}).select(ewma_expr(pl.col('x'), span))['x'].to_numpy()
+
+
+def ewma_matrix(values, spans):
+    """对同一价格序列批量计算多个周期的EWMA
+
+    每个周期的结果与ewma_kernel逐个计算完全一致。
+
+    Args:
+        values (np.ndarray): 一维价格序列
+        spans (Sequence[int]): EWMA周期列表
+    Returns:
+        np.ndarray: (len(spans) × len(values))的EWMA矩阵
+    """
+    values = pl.Series('x', np.asarray(values, dtype=np.float64))
+    if len(spans) == 0 or values.len() == 0:
+        return np.empty((len(spans), values.len()), dtype=np.float64)
+    # 所有周期放在同一个select中，由polars在一次查询内并行计算
+    frame = pl.DataFrame(values).select([
+        ewma_expr(pl.col('x'), int(span)).alias(str(i))
+        for i, span in enumerate(spans)
+    ])
+    return np.ascontiguousarray(frame.to_numpy().T)
+
+
+def ewma_rows(values, span):
+    """对矩阵的每一行(如多个品种或多条价格路径)计算同一周期的EWMA
+
+    每行的结果与ewma_kernel逐行计算完全一致，各行在同一次polars查询中完成。
+
+    Args:
+        values (np.ndarray): (行数 × 长度)价格矩阵
+        span (int): EWMA周期
+    Returns:
+        np.ndarray: 同形状的EWMA矩阵
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if values.size == 0:
+        return values.copy()
+    frame = pl.DataFrame(np.ascontiguousarray(values.T), schema=[str(i) for i in range(len(values))])
+    return np.ascontiguousarray(frame.select(ewma_expr(pl.all(), span)).to_numpy().T)
+
+
+def crossover_signals(close_prices, indicator):
+    """价格上穿指标记为1(买入)，下穿记为-1(卖出)，其余为0
+
+    indicator可以是与close_prices等长的一维数组，也可以是(参数数 × 长度)的
+    二维矩阵，此时按最后一维逐行生成信号。
+    """
+    # 价格相对指标的位置：1在上方，-1在下方，0重合
+    side = np.sign(close_prices - indicator)
+    change = side[..., 1:] - side[..., :-1]
+
+    trading_signal = np.zeros(np.shape(side), dtype=np.float64)
+    trading_signal[..., 1:][change == 2] = 1  # 买入信号(由下方穿至上方)
+    trading_signal[..., 1:][change == -2] = -1  # 卖出信号(由上方穿至下方)
+    return trading_signal
+
+
+def signal_positions(trading_signal, long_only=False):
+    """由交易信号生成持仓(信号隔日执行，无信号时保持原有持仓)
+
+    Args:
+        trading_signal (np.ndarray): 取值为1/0/-1的信号序列，二维时按最后一维逐行处理
+        long_only (bool): True时卖出信号平仓为0，否则做空为-1
+    Returns:
+        np.ndarray: 与trading_signal同形状的持仓
+    """
+    n = trading_signal.shape[-1]
+    # 信号整体后移一位，即第i日信号在第i+1日执行
+    executed = _shift_signal(trading_signal)
+    has_signal = executed != 0
+
+    # 每个位置向前找到最近一次信号的下标，再取该信号对应的目标持仓(前向填充)
+    target = np.maximum(executed, 0) if long_only else executed
+    last_signal_idx = np.maximum.accumulate(np.where(has_signal, np.arange(n), 0), axis=-1)
+    return np.take_along_axis(target, last_signal_idx, axis=-1)
+
+
+def signal_action_states(trading_signal):
+    """由交易信号生成隔日的行动状态('buy'/'sell'/'hold')"""
+    executed = _shift_signal(trading_signal)
+    return np.where(executed == 1, 'buy', np.where(executed == -1, 'sell', 'hold'))
+
+
+def signal_action_codes(trading_signal):
+    """由交易信号生成隔日的行动状态int8编码(ACTION_BUY/ACTION_SELL/ACTION_HOLD)"""
+    return _shift_signal(trading_signal).astype(np.int8)
+
+
+@register_node('ewma', inputs=('close',))
+def _ewma_node(close, span=30):
+    """计算图节点：收盘价的EWMA"""
+    return ewma_kernel(close, span)
+
+
+@register_node('ewma_crossover', inputs=lambda span=30: [('close', {}), ('ewma', {'span': span})])
+def _ewma_crossover_node(close, ewma, span=30):
+    """计算图节点：收盘价穿越EWMA的交易信号"""
+    return crossover_signals(close, ewma)
+
+
+def _previous(values):
+    """沿最后一维取前一根K线的值，首位为NaN"""
+    previous = np.full(np.shape(values), np.nan)
+    previous[..., 1:] = values[..., :-1]
+    return previous
+
+
+def _shift_signal(trading_signal):
+    """信号沿最后一维后移一位，首位补0"""
+    executed = np.zeros(trading_signal.shape, dtype=np.float64)
+    executed[..., 1:] = trading_signal[..., :-1]
+    return executed
+
+
+class StrategySpec:
+    """Indicator-driven strategy type plugged into TradingStrategyCore.generate_signals.
+
+    All indicators of a strategy are computed in one fused polars query, the
+    signal rule maps them to 1/0/-1 signals, and positions, actions and the
+    StrategyResult are built by the shared code path.
+
+    Attributes:
+        name: Strategy type name (e.g. 'SMA')
+        indicators: Callable params -> {key: (indicator name, indicator params)}
+        rule: Callable (data_handler, values, params) -> trading signal array
+        defaults: Default strategy parameters ('long_only' is always accepted)
+        primary: Indicator key, or (key, suffix) for multi-output indicators,
+            stored under indicator_name and plotted with the price
+        overlay: Whether the primary indicator is on the price scale
+    """
+    def __init__(self, name, indicators, rule, defaults, primary, overlay=True):
+        self.name = name
+        self.indicators = indicators
+        self.rule = rule
+        self.defaults = {'long_only': False, **defaults}
+        self.primary = primary if isinstance(primary, tuple) else (primary, None)
+        self.overlay = overlay
+
+    def params(self, kwargs):
+        """合并默认参数，参数名未知时报错"""
+        unknown = [key for key in kwargs if key not in self.defaults]
+        if unknown:
+            raise ValueError(f"策略{self.name}不支持参数: {unknown}")
+        return {**self.defaults, **kwargs}
+
+    def columns(self, params):
+        """(主指标列名, 其余指标列名)"""
+        names = []
+        primary = None
+        for key, (name, indicator_params) in self.indicators(params).items():
+            base, parts = indicator_outputs(name, **indicator_params)
+            for suffix in parts:
+                if (key, suffix) == self.primary:
+                    primary = column_name(base, suffix)
+                else:
+                    names.append(column_name(base, suffix))
+        return primary, tuple(name for name in dict.fromkeys(names) if name != primary)
+
+
+# 策略类型名 -> StrategySpec
+STRATEGIES = {}
+
+
+def register_strategy(name, indicators, defaults=None, primary=None, overlay=True):
+    """注册由指标驱动的策略类型，被装饰函数为信号规则rule(data_handler, values, params)
+
+    Args:
+        name (str): 策略类型名
+        indicators (Callable): params -> {键: (指标名, 指标参数)}，values按相同的键返回指标数组
+        defaults (dict): 策略参数默认值
+        primary: 主指标的键，多输出指标为(键, 后缀)，默认为第一个指标
+        overlay (bool): 主指标与价格同一量纲时为True(画图时与价格共用纵轴)
+    """
+    def decorator(rule):
+        main = primary
+        if main is None:
+            main = next(iter(indicators({'long_only': False, **(defaults or {})})))
+        STRATEGIES[name] = StrategySpec(name, indicators, rule, defaults or {}, main, overlay)
+        return rule
+    return decorator
+
+
+def _combine_signals(buy, sell):
+    """买入、卖出条件合成为1/0/-1信号(同时满足时不发出信号)"""
+    return np.where(buy & ~sell, 1.0, np.where(sell & ~buy, -1.0, 0.0))
+
+
+@register_strategy('SMA', lambda p: {'sma': ('SMA', {'span': p['span']})}, {'span': 30})
+def _sma_rule(data, values, params):
+    """价格上穿/下穿简单移动平均"""
+    return crossover_signals(data.close, values['sma'])
+
+
+@register_strategy('RSI', lambda p: {'rsi': ('RSI', {'period': p['period']})},
+                   {'period': 14, 'lower': 30.0, 'upper': 70.0}, overlay=False)
+def _rsi_rule(data, values, params):
+    """RSI由超卖区上穿lower时买入，由超买区下穿upper时卖出"""
+    rsi = values['rsi']
+    buy = crossover_signals(rsi, params['lower']) == 1
+    sell = crossover_signals(rsi, params['upper']) == -1
+    return _combine_signals(buy, sell)
+
+
+@register_strategy('BOLLINGER', lambda p: {'band': ('BOLLINGER', {'span': p['span'], 'k': p['k']})},
+                   {'span': 20, 'k': 2.0}, primary=('band', 'MID'))
+def _bollinger_rule(data, values, params):
+    """均值回归：价格由下轨外上穿下轨时买入，由上轨外下穿上轨时卖出"""
+    band = values['band']
+    buy = crossover_signals(data.close, band['LOWER']) == 1
+    sell = crossover_signals(data.close, band['UPPER']) == -1
+    return _combine_signals(buy, sell)
+
+
+def _donchian_indicators(params):
+    requests = {'channel': ('DONCHIAN', {'window': params['window']})}
+    if params['buffer']:
+        requests['atr'] = ('ATR', {'period': params['atr_period']})
+    return requests
+
+
+@register_strategy('DONCHIAN', _donchian_indicators, {'window': 20, 'buffer': 0.0, 'atr_period': 14},
+                   primary=('channel', 'MID'))
+def _donchian_rule(data, values, params):
+    """通道突破：收盘价上穿前一根K线的通道上轨(加buffer倍ATR)时买入，下穿下轨时卖出"""
+    channel = values['channel']
+    margin = params['buffer'] * values['atr'] if params['buffer'] else 0.0
+    upper = _previous(channel['UPPER']) + margin
+    lower = _previous(channel['LOWER']) - margin
+    buy = crossover_signals(data.close, upper) == 1
+    sell = crossover_signals(data.close, lower) == -1
+    return _combine_signals(buy, sell)
+
+
+@register_strategy('VWAP', lambda p: {'vwap': ('VWAP', {'window': p['window'], 'multiplier': p['multiplier']})},
+                   {'window': 20, 'multiplier': 1.0})
+def _vwap_rule(data, values, params):
+    """价格上穿/下穿成交量加权均价(multiplier须设为合约乘数)"""
+    return crossover_signals(data.close, values['vwap'])
+
+
+@register_strategy('EWMA_OI', lambda p: {'ewma': ('EWMA', {'span': p['span']}),
+                                         'oi': ('OI_MOMENTUM', {'period': p['oi_period']})},
+                   {'span': 30, 'oi_period': 5})
+def _ewma_oi_rule(data, values, params):
+    """EWMA穿越信号，仅在持仓量上升(增仓确认趋势)时发出"""
+    return crossover_signals(data.close, values['ewma']) * (values['oi'] > 0)
+
+
+def _format_date(value):
+    """将日期统一为ISO格式字符串，便于状态序列化"""
+    if isinstance(value, np.datetime64):
+        return str(np.datetime_as_string(value, unit='s'))
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
 
 class TradingStrategyCore:
     """Core trading strategy implementation module.
 
     Contains the main strategy logic including signal generation and technical
-    indicators calculation. Currently implements EWMA crossover strategy.
+    indicators calculation. Implements the EWMA crossover strategy and every
+    indicator-driven strategy type registered in STRATEGIES.
 
     Attributes:
         dates: Array of trading dates
         prices: Array of price data (open, close)
         strategy_type: Type of strategy (default: 'EWMA')
-        processed_data: Dictionary containing all processed strategy data
+        processed_data: StrategyResult holding all processed strategy data
+        extra_indicators: Column names of indicators stored besides indicator_name
+        indicator_overlay: Whether the indicator is on the price scale
+        dtype: Float dtype of stored result arrays (np.float64 or np.float32)
+        state: Streaming state after the last processed bar (see update())
+        cache: Optional ResultCache for generated signals
+        graph: ComputeGraph memoizing execution price, indicators and signals
+            (shared by every strategy on the same DataHandler by default)
     """
-    def __init__(self, data_handler, strategy_type='EWMA', **kwargs):
-        self.dates = data_handler.dates
-        self.open_prices = data_handler.open  # 明确命名
-        self.close_prices = data_handler.close
+    STREAMING_TYPES = ('EWMA', 'EWMA_LONG_ONLY')
+
+    def __init__(self, data_handler, strategy_type='EWMA', cache=None, dtype=np.float64, graph=None, **kwargs):
+        # data_handler可为None，此时仅用于增量更新(见from_state)
+        self.data_handler = data_handler
+        self.cache = cache
+        if graph is None and data_handler is not None:
+            graph = graph_for(data_handler)
+        self.graph = graph
+        self.dates = getattr(data_handler, 'dates', None)
+        self.open_prices = getattr(data_handler, 'open', None)  # 明确命名
+        self.close_prices = getattr(data_handler, 'close', None)
         self.strategy_type = strategy_type
         self.strategy_params = kwargs
+        self.dtype = np.dtype(dtype)  # float32时结果数组内存减半，精度降低
         self.processed_data = None
+        self.state = None
         self.indicator_name = strategy_type
+        self.extra_indicators = ()
+        self.indicator_overlay = True
         # EWMA策略参数设置
         if strategy_type == 'EWMA':
             self.span = kwargs.get('span', 30)
@@ -28,115 +329,243 @@ class TradingStrategyCore:
         elif strategy_type == 'EWMA_LONG_ONLY':
             self.span = kwargs.get('span', 30)
             self.indicator_name = f'EWMA_LONG_ONLY_{self.span}'
+        elif strategy_type in STRATEGIES:
+            spec = STRATEGIES[strategy_type]
+            self.strategy_params = spec.params(kwargs)
+            self.indicator_name, self.extra_indicators = spec.columns(self.strategy_params)
+            self.indicator_overlay = spec.overlay
 
+    @instrument('TradingStrategyCore.generate_signals',
+                symbol=lambda self: symbol_from_path(getattr(self.data_handler, 'data_path', None)),
+                rows=lambda result, self: None if result is None else len(result['Close']))
     def generate_signals(self):
-        """策略信号生成入口"""
+        """策略信号生成入口
+
+        已注册(STRATEGIES)的策略类型使用公共的指标驱动实现，
+        其余类型使用_generate_<类型>_signals方法。
+        """
         # 构建策略方法名
         method_name = f'_generate_{self.strategy_type.lower()}_signals'
         # 检查方法是否存在
-        if not hasattr(self, method_name):
+        if self.strategy_type not in STRATEGIES and not hasattr(self, method_name):
             raise ValueError(f"不支持的策略类型: {self.strategy_type}")
+        # 命中缓存时直接使用缓存结果
+        key = self.cache_key() if self.cache is not None else None
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.processed_data = StrategyResult.from_arrays(cached, self.indicator_name, self.dtype,
+                                                                 self.extra_indicators)
+                self._record_state()
+                return self.processed_data
         # 获取并执行策略方法
-        strategy_method = getattr(self, method_name)
-        return strategy_method()
+        if self.strategy_type in STRATEGIES:
+            result = self._generate_registered_signals(STRATEGIES[self.strategy_type])
+        else:
+            result = getattr(self, method_name)()
+        if key is not None:
+            self.cache.put(key, result.to_arrays(), source=self.data_handler.data_path)
+        return result
+
+    def cache_key(self):
+        """信号缓存键，数据来源未知时返回None"""
+        if not hasattr(self.data_handler, 'fingerprint'):
+            return None
+        fingerprint = self.data_handler.fingerprint()
+        if fingerprint is None:
+            return None
+        return make_key(stage='signals', data=fingerprint, strategy_type=self.strategy_type,
+                        params=self.strategy_params, dtype=self.dtype.name)
     
     def _generate_ewma_signals(self):
         """EWMA策略信号生成(允许做空)"""
-        close_prices = self.close_prices
-        # 计算执行价格，先取开盘和收盘的平均价（可修改）
-        execution_price = (self.open_prices + self.close_prices) / 2
-        
-        # 计算EWMA
-        alpha = 2 / (self.span + 1)
-        ewma = np.zeros_like(close_prices)
-        ewma[0] = close_prices[0]
-        for i in range(1, len(close_prices)):
-            ewma[i] = alpha * close_prices[i] + (1 - alpha) * ewma[i-1]
-        
-        # 向量化信号生成
-        prev_close = np.roll(close_prices, 1)
-        prev_ewma = np.roll(ewma, 1)
-        prev_close[0] = np.nan  # 第一个元素设为nan避免误判
-        prev_ewma[0] = np.nan
-        
-        # 生成交易信号
-        trading_signal = np.zeros_like(close_prices)
-        trading_signal[(close_prices > ewma) & (prev_close < prev_ewma)] = 1 # 买入信号
-        trading_signal[(close_prices < ewma) & (prev_close > prev_ewma)] = -1 # 卖出信号
-        
-        # 生成持仓信号(允许做空)和行动状态
-        position = np.zeros_like(close_prices)
-        n = close_prices.shape[0]  # 数据长度
-        action_states = np.array(['hold']*n)  # 初始化行动状态        
-        for i, signal in enumerate(trading_signal[:-1]):  # 少循环一次
-            if signal == 1:  # 买入信号
-                position[i+1] = 1
-                action_states[i+1] = 'buy'
-            elif signal == -1:  # 卖出信号
-                position[i+1] = -1
-                action_states[i+1] = 'sell'
-            else:
-                position[i+1] = position[i]  # 保持原有持仓
-        
-        # 生成回测与画图数据
-        self.processed_data = {
-            'Date': self.dates,
-            'Close': close_prices,
-            'ExecutionPrice': execution_price,  # 修改为ExecutionPrice
-            self.indicator_name: ewma,
-            'TradingSignal': trading_signal,
-            'Position': position,
-            'ActionStates': action_states  # 添加行动状态到数据中
-        }
-        return self.processed_data
+        return self._generate_ewma_crossover(long_only=False)
 
     def _generate_ewma_long_only_signals(self):
         """EWMA策略信号生成(仅做多)"""
-        close_prices = self.close_prices
-        # 计算执行价格，先取开盘和收盘的平均价（可修改）
-        execution_price = (self.open_prices + self.close_prices) / 2
-        
-        # 计算EWMA
-        alpha = 2 / (self.span + 1)
-        ewma = np.zeros_like(close_prices)
-        ewma[0] = close_prices[0]
-        for i in range(1, len(close_prices)):
-            ewma[i] = alpha * close_prices[i] + (1 - alpha) * ewma[i-1]
-        
-        # 向量化信号生成
-        prev_close = np.roll(close_prices, 1)
-        prev_ewma = np.roll(ewma, 1)
-        prev_close[0] = np.nan  # 第一个元素设为nan避免误判
-        prev_ewma[0] = np.nan
-        
-        # 生成交易信号(保留买卖信号)
-        trading_signal = np.zeros_like(close_prices)
-        trading_signal[(close_prices > ewma) & (prev_close < prev_ewma)] = 1
-        trading_signal[(close_prices < ewma) & (prev_close > prev_ewma)] = -1
-        
-        # 生成持仓信号(仅做多)和行动状态
-        position = np.zeros_like(close_prices)
-        n = close_prices.shape[0]  # 数据长度
-        action_states = np.array(['hold']*n)  # 初始化行动状态
-        for i, signal in enumerate(trading_signal[:-1]):  # 少循环一次
-            if signal == 1:  # 买入信号
-                position[i+1] = 1  # 隔日买入做多
-                action_states[i+1] = 'buy'
-            elif signal == -1:  # 卖出信号
-                position[i+1] = 0  # 隔日卖出平仓
-                action_states[i+1] = 'sell'
+        return self._generate_ewma_crossover(long_only=True)
+
+    def _generate_ewma_crossover(self, long_only):
+        """EWMA穿越策略公共实现
+
+        Args:
+            long_only (bool): True为仅做多(卖出信号平仓)，False为允许做空
+        """
+        # 执行价格、EWMA与交易信号取自计算图，同一数据集上相同span的策略只计算一次
+        execution_price = self.graph.get('execution_price', dtype=self.dtype.name)
+        ewma = self.graph.get('ewma', span=self.span)
+        trading_signal = self.graph.get('ewma_crossover', span=self.span)
+
+        self.processed_data = self._build_result(execution_price, trading_signal, long_only,
+                                                 {self.indicator_name: ewma})
+        self._record_state()
+        return self.processed_data
+
+    def _generate_registered_signals(self, spec):
+        """已注册策略类型的公共实现：一次查询计算未记忆的指标，再按信号规则生成信号"""
+        requests = spec.indicators(self.strategy_params)
+        values = self.graph.indicators(requests)
+        trading_signal = spec.rule(self.data_handler, values, self.strategy_params)
+        execution_price = self.graph.get('execution_price', dtype=self.dtype.name)
+
+        # 按列名展开全部指标输出，主指标存于indicator_name
+        indicators = {}
+        for key, (name, params) in requests.items():
+            base, _ = indicator_outputs(name, **params)
+            outputs = values[key] if isinstance(values[key], dict) else {None: values[key]}
+            indicators.update({column_name(base, suffix): output for suffix, output in outputs.items()})
+        self.processed_data = self._build_result(execution_price, trading_signal,
+                                                 self.strategy_params['long_only'], indicators)
+        return self.processed_data
+
+    def _build_result(self, execution_price, trading_signal, long_only, indicators):
+        """由信号生成持仓与行动状态(信号隔日执行)，并组装StrategyResult
+
+        Args:
+            indicators (dict): 指标列名 -> 数组，须包含indicator_name
+        """
+        position = signal_positions(trading_signal, long_only=long_only)
+        action_codes = signal_action_codes(trading_signal)
+
+        # 生成回测与画图数据(Date与Close引用数据源数组，信号/持仓/行动状态为int8)
+        result = StrategyResult(
+            self.indicator_name, self.dtype, self.extra_indicators,
+            Date=self.dates,
+            Close=self.close_prices,
+            ExecutionPrice=execution_price,  # 修改为ExecutionPrice
+            TradingSignal=trading_signal,
+            Position=position,
+            ActionCodes=action_codes  # 添加行动状态到数据中
+        )
+        result.update(indicators)
+        return result
+
+    def _record_state(self):
+        """记录末根K线的状态，供后续增量更新"""
+        data = self.processed_data
+        if self.strategy_type not in self.STREAMING_TYPES or len(data['Close']) == 0:
+            return
+        close = float(data['Close'][-1])
+        ewma = float(data[self.indicator_name][-1])
+        self.state = {
+            'strategy_type': self.strategy_type,
+            'span': self.span,
+            'bars': int(len(data['Close'])),
+            'last_date': _format_date(data['Date'][-1]),
+            'close': close,
+            'ewma': ewma,
+            'side': float(np.sign(close - ewma)),
+            'signal': float(data['TradingSignal'][-1]),
+            'position': float(data['Position'][-1])
+        }
+
+    def update(self, bar):
+        """追加一根K线并增量推进信号，每根K线O(1)
+
+        结果与对全部历史重新调用generate_signals的末行一致。行动状态与StrategyResult.to_arrays()
+        相同，为int8编码ActionCodes(需要字符串时用strategy_result.decode_actions解码)。
+
+        Args:
+            bar (Mapping): 至少包含'date'、'open'、'close'字段的单根K线
+        Returns:
+            dict: 与processed_data同名字段的单行结果
+        """
+        if self.strategy_type not in self.STREAMING_TYPES:
+            raise ValueError(f"策略类型{self.strategy_type}不支持增量更新")
+        close = float(bar['close'])
+        execution_price = (float(bar['open']) + close) / 2
+        state = self.state
+
+        if state is None:
+            # 首根K线：EWMA取收盘价，无信号、空仓
+            ewma = close
+            prev_side = np.nan
+            position, action = 0.0, ACTION_HOLD
+        else:
+            # 与ewma_expr相同的递推形式，结果与批量计算逐位一致
+            alpha = 2 / (self.span + 1)
+            ewma = state['ewma'] + alpha * (close - state['ewma'])
+            prev_side = state['side']
+            # 上一根K线的信号在本根K线执行
+            if state['signal'] == 1:
+                position, action = 1.0, ACTION_BUY
+            elif state['signal'] == -1:
+                position = 0.0 if self.strategy_type == 'EWMA_LONG_ONLY' else -1.0
+                action = ACTION_SELL
             else:
-                position[i+1] = position[i]  # 保持原有持仓
-
-      
-        # 生成回测与画图数据
-        self.processed_data = {
-            'Date': self.dates,
-            'Close': close_prices,
-            'ExecutionPrice': execution_price,  # 修改为ExecutionPrice
+                position, action = state['position'], ACTION_HOLD
+
+        side = float(np.sign(close - ewma))
+        if side - prev_side == 2:
+            signal = 1.0  # 买入信号
+        elif side - prev_side == -2:
+            signal = -1.0  # 卖出信号
+        else:
+            signal = 0.0
+
+        self.state = {
+            'strategy_type': self.strategy_type,
+            'span': self.span,
+            'bars': (state['bars'] if state else 0) + 1,
+            'last_date': _format_date(bar['date']),
+            'close': close,
+            'ewma': ewma,
+            'side': side,
+            'signal': signal,
+            'position': position
+        }
+        return {
+            'Date': bar['date'],
+            'Close': close,
+            'ExecutionPrice': execution_price,
             self.indicator_name: ewma,
-            'TradingSignal': trading_signal,
+            'TradingSignal': signal,
             'Position': position,
-            'ActionStates': action_states  # 添加行动状态到数据中
+            'ActionCodes': np.int8(action)
         }
-        return self.processed_data
+
+    def update_batch(self, bars):
+        """按顺序追加多根K线
+
+        Args:
+            bars (pl.DataFrame | Mapping[str, Sequence]): 含'date'、'open'、'close'列
+        Returns:
+            dict: 与processed_data同名字段的数组(ActionCodes为int8，见update)
+        """
+        if isinstance(bars, pl.DataFrame):
+            rows = bars.select(['date', 'open', 'close']).iter_rows(named=True)
+        else:
+            rows = ({'date': d, 'open': o, 'close': c}
+                    for d, o, c in zip(bars['date'], bars['open'], bars['close']))
+        results = [self.update(row) for row in rows]
+        keys = ['Date', 'Close', 'ExecutionPrice', self.indicator_name,
+                'TradingSignal', 'Position', 'ActionCodes']
+        arrays = {key: np.array([r[key] for r in results]) for key in keys}
+        arrays['ActionCodes'] = arrays['ActionCodes'].astype(np.int8, copy=False)  # 无K线时保持int8
+        return arrays
+
+    def get_state(self):
+        """返回可JSON序列化的增量状态"""
+        return None if self.state is None else dict(self.state)
+
+    def set_state(self, state):
+        """恢复增量状态(策略类型与参数须一致)"""
+        if state is not None and (state['strategy_type'] != self.strategy_type
+                                  or state['span'] != self.span):
+            raise ValueError("状态与当前策略类型或参数不一致")
+        self.state = None if state is None else dict(state)
+
+    def save_state(self, path):
+        """将增量状态写入JSON文件"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.get_state(), f, ensure_ascii=False)
+
+    @classmethod
+    def from_state(cls, state):
+        """由保存的状态(dict或JSON文件路径)构建仅用于增量更新的策略实例"""
+        if isinstance(state, str):
+            with open(state, encoding='utf-8') as f:
+                state = json.load(f)
+        strategy = cls(None, strategy_type=state['strategy_type'], span=state['span'])
+        strategy.set_state(state)
+        return strategy
@@ -0,0 +1,170 @@
+import numpy as np
+
+# 行动状态编码，与隔日执行的信号取值一致
+ACTION_SELL, ACTION_HOLD, ACTION_BUY = -1, 0, 1
+ACTION_LABELS = np.array(['sell', 'hold', 'buy'])
+
+
+def encode_actions(action_states):
+    """'buy'/'sell'/'hold'字符串数组转为int8编码"""
+    action_states = np.asarray(action_states)
+    codes = np.zeros(action_states.shape, dtype=np.int8)
+    codes[action_states == 'buy'] = ACTION_BUY
+    codes[action_states == 'sell'] = ACTION_SELL
+    return codes
+
+
+def decode_actions(codes):
+    """int8编码转为'buy'/'sell'/'hold'字符串数组"""
+    return ACTION_LABELS[np.asarray(codes, dtype=np.intp) + 1]
+
+
+class StrategyResult:
+    """Compact typed container for strategy and backtest arrays.
+
+    Replaces the processed_data dict while keeping its item access, so
+    ``result['Close']``, ``result[indicator_name]`` and ``result.update(...)``
+    work as before. Date and Close are stored as references to the
+    DataHandler arrays (no copy), signals, positions and actions as int8 codes,
+    and the remaining float arrays in float_dtype (float64, or float32 to halve
+    their memory at reduced precision).
+
+    ``result['ActionStates']`` decodes the action codes to strings on access;
+    ``result.action`` and ``result['ActionCodes']`` hold the int8 codes (see
+    ACTION_BUY/ACTION_SELL/ACTION_HOLD). Streaming rows from
+    TradingStrategyCore.update and chunked backtest output use the same
+    'ActionCodes' encoding; decode_actions is the one place codes become strings.
+    Strategies using several indicators keep the main one under indicator_name
+    and the others as extra float arrays under their column names.
+
+    Attributes:
+        indicator_name: Key of the indicator array (e.g. 'EWMA_30')
+        float_dtype: dtype of the float arrays
+        extras: Dict of additional indicator arrays (e.g. 'BOLLINGER_20_2_UPPER')
+        date, close, execution_price, indicator: Price and indicator arrays
+        signal, position, action: int8 trading signal, position and action codes
+        returns, strategy_returns, cumulative_returns: Backtest arrays, None before run_backtest
+    """
+    __slots__ = ('indicator_name', 'float_dtype', 'extras', 'date', 'close', 'execution_price', 'indicator',
+                 'signal', 'position', 'action', 'returns', 'strategy_returns', 'cumulative_returns')
+
+    # 字段名 -> 属性名(指标列与ActionStates单独处理)
+    FIELDS = {
+        'Date': 'date',
+        'Close': 'close',
+        'ExecutionPrice': 'execution_price',
+        'TradingSignal': 'signal',
+        'Position': 'position',
+        'ActionCodes': 'action',
+        'Return': 'returns',
+        'StrategyReturn': 'strategy_returns',
+        'CumulativeReturn': 'cumulative_returns'
+    }
+    SHARED_FIELDS = ('date', 'close')  # 引用数据源数组，不单独占用内存
+    FLOAT_FIELDS = ('execution_price', 'indicator', 'returns', 'strategy_returns', 'cumulative_returns')
+    CODE_FIELDS = ('signal', 'action')
+
+    def __init__(self, indicator_name, float_dtype=np.float64, extra_indicators=(), **arrays):
+        self.indicator_name = indicator_name
+        self.float_dtype = np.dtype(float_dtype)
+        self.extras = dict.fromkeys(extra_indicators)
+        for attr in self.__slots__[3:]:
+            setattr(self, attr, None)
+        self.update(arrays)
+
+    @classmethod
+    def from_arrays(cls, arrays, indicator_name, float_dtype=np.float64, extra_indicators=()):
+        """由缓存读出的数组字典构建(兼容以字符串保存ActionStates的旧缓存)"""
+        return cls(indicator_name, float_dtype, extra_indicators, **arrays)
+
+    def to_arrays(self):
+        """转为写入缓存的数组字典(行动状态保存为int8编码)"""
+        arrays = {}
+        for key in self.keys():
+            if key == 'ActionStates':
+                arrays['ActionCodes'] = self.action
+            else:
+                arrays[key] = self[key]
+        return arrays
+
+    def _attr(self, key):
+        if key == self.indicator_name:
+            return 'indicator'
+        if key == 'ActionStates':
+            return 'action'
+        if key in self.FIELDS:
+            return self.FIELDS[key]
+        raise KeyError(key)
+
+    def __getitem__(self, key):
+        if key in self.extras:
+            if self.extras[key] is None:
+                raise KeyError(key)
+            return self.extras[key]
+        value = getattr(self, self._attr(key))
+        if value is None:
+            raise KeyError(key)
+        return decode_actions(value) if key == 'ActionStates' else value
+
+    def __setitem__(self, key, value):
+        if key in self.extras:
+            self.extras[key] = np.asarray(value, dtype=self.float_dtype)
+            return
+        attr = self._attr(key)
+        if attr in self.SHARED_FIELDS:
+            value = np.asarray(value)
+        elif attr in self.FLOAT_FIELDS:
+            value = np.asarray(value, dtype=self.float_dtype)
+        elif key == 'ActionStates':
+            value = encode_actions(value)
+        elif attr in self.CODE_FIELDS:
+            value = np.asarray(value).astype(np.int8, copy=False)
+        else:
+            value = self._compact_position(value)
+        setattr(self, attr, value)
+
+    def _compact_position(self, position):
+        """持仓为-128~127的整数时以int8保存，否则使用float_dtype"""
+        position = np.asarray(position)
+        if position.dtype == np.int8:
+            return position
+        codes = position.astype(np.int8)
+        if np.array_equal(codes, position):
+            return codes
+        return position.astype(self.float_dtype, copy=False)
+
+    def __contains__(self, key):
+        if key in self.extras:
+            return self.extras[key] is not None
+        try:
+            return getattr(self, self._attr(key)) is not None
+        except KeyError:
+            return False
+
+    def keys(self):
+        keys = ['Date', 'Close', 'ExecutionPrice', self.indicator_name, *self.extras, 'TradingSignal',
+                'Position', 'ActionStates', 'Return', 'StrategyReturn', 'CumulativeReturn']
+        return [key for key in keys if key in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def update(self, arrays):
+        for key, value in arrays.items():
+            self[key] = value
+
+    @property
+    def nbytes(self):
+        """本结果单独占用的字节数(不含引用数据源的Date与Close)"""
+        arrays = [getattr(self, attr) for attr in self.__slots__[3:] if attr not in self.SHARED_FIELDS]
+        arrays += list(self.extras.values())
+        return sum(values.nbytes for values in arrays if values is not None)
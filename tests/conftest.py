@@ -0,0 +1,7 @@
+import os
+import sys
+
+# 模块位于仓库根目录(无安装包)，测试时加入导入路径
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
@@ -0,0 +1,38 @@
+"""
+向量化前TradingStrategyCore的逐K线EWMA/信号/持仓循环(回归测试的参照实现)
+
+只依赖NumPy，避免测试导入benchmark.py及其依赖(绘图、面板等)。
+"""
+
+import numpy as np
+
+
+def loop_ewma_positions(close_prices, span, long_only):
+    """原逐元素循环实现(基线代码的原样副本，勿改用新内核)
+
+    Returns:
+        tuple: (ewma, trading_signal, position)
+    """
+    alpha = 2 / (span + 1)
+    ewma = np.zeros_like(close_prices)
+    ewma[0] = close_prices[0]
+    for i in range(1, len(close_prices)):
+        ewma[i] = alpha * close_prices[i] + (1 - alpha) * ewma[i-1]
+
+    prev_close = np.roll(close_prices, 1)
+    prev_ewma = np.roll(ewma, 1)
+    prev_close[0] = np.nan  # 第一个元素设为nan避免误判
+    prev_ewma[0] = np.nan
+    trading_signal = np.zeros_like(close_prices)
+    trading_signal[(close_prices > ewma) & (prev_close < prev_ewma)] = 1  # 买入信号
+    trading_signal[(close_prices < ewma) & (prev_close > prev_ewma)] = -1  # 卖出信号
+
+    position = np.zeros_like(close_prices)
+    for i, signal in enumerate(trading_signal[:-1]):  # 少循环一次
+        if signal == 1:
+            position[i+1] = 1
+        elif signal == -1:
+            position[i+1] = 0 if long_only else -1
+        else:
+            position[i+1] = position[i]  # 保持原有持仓
+    return ewma, trading_signal, position
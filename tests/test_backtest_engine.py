@@ -0,0 +1,28 @@
+import numpy as np
+
+from backtest_engine import extract_round_trips, LEDGER_COLUMNS
+
+
+def _dates(n):
+    return np.datetime64('2024-01-01', 'us') + np.arange(n).astype('timedelta64[D]')
+
+
+def test_round_trips_empty_input():
+    empty = np.array([], dtype=np.float64)
+    ledger = extract_round_trips(_dates(0), empty, empty, empty)
+    full = extract_round_trips(_dates(3), np.array([1.0, 2.0, 3.0]), np.array([0.0, 1.0, 1.0]),
+                               np.array([0.0, 0.5, 0.0]))
+    assert ledger.height == 0
+    assert tuple(ledger.columns) == LEDGER_COLUMNS
+    assert ledger.schema == full.schema
+
+
+def test_round_trips_open_and_reversal():
+    price = np.array([10.0, 11.0, 12.0, 11.0, 10.0])
+    position = np.array([0.0, 1.0, 1.0, -1.0, -1.0])
+    returns = np.append(price[1:] / price[:-1] - 1, 0)
+    ledger = extract_round_trips(_dates(5), price, position, position * returns)
+    assert ledger['Side'].to_list() == [1, -1]
+    assert ledger['EntryPrice'].to_list() == [11.0, 11.0]
+    assert ledger['ExitPrice'].to_list() == [11.0, 10.0]
+    assert ledger['Open'].to_list() == [False, True]
@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from backtest_engine import BacktestEngine
+from chunked_backtest import ChunkedBacktest
+from data_handler import DataHandler
+from strategy_core import TradingStrategyCore
+
+COLUMNS = ('ExecutionPrice', 'TradingSignal', 'Position', 'Return', 'StrategyReturn', 'CumulativeReturn')
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+FULL = (datetime(2000, 1, 1), datetime(2030, 1, 1))
+MID = (datetime(2015, 3, 1), datetime(2019, 6, 30))
+
+
+@pytest.fixture(scope='module')
+def gappy_path(tmp_path_factory):
+    """含缺失值(null与NaN，包括开头)与平盘段的合成行情文件"""
+    rng = np.random.default_rng(11)
+    n = 600
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, n))
+    open_prices = close * (1 + rng.normal(0, 0.002, n))
+    for start in (40, 55, 200, 330, 331, 332, 500):
+        close[start:start + rng.integers(3, 12)] = close[start - 1]  # 平盘段
+    close[[0, 1, 57, 58, 59, 60, 61, 250, 251, 400]] = np.nan
+    open_prices[[0, 57, 58, 123, 400, 401]] = np.nan
+    dates = [(datetime(2016, 1, 1) + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(n)]
+    frame = pl.DataFrame({'date': dates, 'open': open_prices, 'high': close * 1.01, 'low': close * 0.99,
+                          'close': close, 'settle': close, 'volume': np.full(n, 1e5), 'oi': np.full(n, 2e4),
+                          'amt': np.full(n, 1e9)}).with_columns(
+        pl.when(pl.int_range(pl.len()) % 97 == 3).then(None).otherwise(pl.col('close')).alias('close'))
+    path = tmp_path_factory.mktemp('gappy') / 'GAPPY.parquet'
+    frame.write_parquet(path)
+    return str(path)
+
+
+def _in_memory(path, strategy_type, span, window):
+    handler = DataHandler(path, file_type='parquet')
+    handler.preprocess_data(start_date=window[0], end_date=window[1])
+    strategy = TradingStrategyCore(handler, strategy_type=strategy_type, span=span)
+    strategy.generate_signals()
+    BacktestEngine(strategy).run_backtest()
+    return strategy.processed_data, strategy.indicator_name
+
+
+# 块长7小于EWMA预热期与多数持仓区间，块边界落在预热期与持仓区间内部
+@pytest.mark.parametrize('chunk_rows', [7, 100, 100_000])
+@pytest.mark.parametrize('strategy_type', ['EWMA', 'EWMA_LONG_ONLY'])
+@pytest.mark.parametrize('source, window', [('aufi', FULL), ('aufi', MID), ('gappy', FULL),
+                                            ('gappy', (datetime(2016, 2, 20), datetime(2017, 3, 1)))])
+def test_chunked_matches_in_memory(source, window, chunk_rows, strategy_type, gappy_path):
+    path, span = (DATA_PATH if source == 'aufi' else gappy_path), 30
+    expected, indicator = _in_memory(path, strategy_type, span, window)
+    backtest = ChunkedBacktest(path, strategy_type=strategy_type, chunk_rows=chunk_rows, span=span)
+    chunks = list(backtest.iter_results(*window))
+    if chunk_rows < len(expected['Close']):
+        assert len(chunks) > 1
+
+    # 逐位一致(含平盘段上的EWMA)
+    for column in (*COLUMNS, indicator):
+        actual = np.concatenate([chunk[column] for chunk in chunks])
+        np.testing.assert_array_equal(actual, np.asarray(expected[column]), err_msg=column)
+    np.testing.assert_array_equal(np.concatenate([chunk['Date'] for chunk in chunks]),
+                                  np.asarray(expected['Date']))
+    assert backtest.summary['FinalReturn'] == float(expected['CumulativeReturn'][-1] - 1)
@@ -0,0 +1,42 @@
+import gc
+import weakref
+import numpy as np
+
+from compute_graph import graph_for
+from strategy_core import TradingStrategyCore
+from backtest_engine import BacktestEngine
+
+
+class _Handler:
+    """最小数据源：只有策略与回测用到的数组字段"""
+    def __init__(self, n=200, seed=0):
+        rng = np.random.default_rng(seed)
+        self.close = 100 * np.cumprod(1 + rng.normal(0, 0.01, n))
+        self.open = np.roll(self.close, 1)
+        self.open[0] = self.close[0]
+        self.dates = np.arange(n).astype('datetime64[D]')
+
+
+def test_handler_collected_after_del():
+    handler = _Handler()
+    strategy = TradingStrategyCore(handler, 'EWMA', span=10)
+    strategy.generate_signals()
+    BacktestEngine(strategy).run_backtest()
+    probe = weakref.ref(handler)
+    graph_probe = weakref.ref(graph_for(handler))
+    del handler, strategy
+    gc.collect()
+    assert probe() is None
+    assert graph_probe() is None
+
+
+def test_shared_nodes_computed_once():
+    handler = _Handler()
+    for strategy_type in ('EWMA', 'EWMA_LONG_ONLY'):
+        strategy = TradingStrategyCore(handler, strategy_type, span=10)
+        strategy.generate_signals()
+        BacktestEngine(strategy).run_backtest()
+    evaluations = graph_for(handler).evaluations
+    assert evaluations['ewma'] == 1
+    assert evaluations['execution_price'] == 1
+    assert evaluations['bar_returns'] == 1
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+import pytest
+
+from data_handler import DataHandler
+
+WINDOWS = [
+    (None, None),
+    (datetime(2020, 1, 1), datetime(2020, 3, 1)),  # 窗口开头落在缺失段内，需取窗口外的值补齐
+    (datetime(2020, 1, 20), datetime(2020, 1, 26)),  # 整个窗口都在缺失段内
+    (datetime(2019, 12, 1), datetime(2020, 6, 30)),  # 起始日早于数据
+    (datetime(2020, 4, 15), None),
+]
+
+
+@pytest.fixture(scope='module', params=['csv', 'parquet'])
+def gappy_file(request, tmp_path_factory):
+    """含null与NaN缺失(包括开头、结尾与连续缺失段)的合成行情文件"""
+    rng = np.random.default_rng(5)
+    n = 150
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, n))
+    frame = {'date': [(datetime(2020, 1, 1) + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(n)]}
+    for col in DataHandler.PRICE_COLUMNS:
+        values = close * (1 + rng.normal(0, 0.002, n))
+        values[rng.random(n) < 0.1] = np.nan
+        values[15:30] = np.nan
+        frame[col] = values
+    frame['close'][[0, 1, n - 1]] = np.nan
+    data = pl.DataFrame(frame).with_columns(
+        pl.when(pl.int_range(pl.len()) % 13 == 4).then(None).otherwise(pl.col('open')).alias('open'))
+    path = tmp_path_factory.mktemp('gappy') / f'GAPPY.{request.param}'
+    getattr(data, f'write_{request.param}')(path)
+    return str(path), request.param
+
+
+@pytest.mark.parametrize('start_date, end_date', WINDOWS)
+@pytest.mark.parametrize('columns', [None, ['open', 'close']])
+def test_lazy_matches_eager(gappy_file, start_date, end_date, columns):
+    path, file_type = gappy_file
+    eager = DataHandler(path, file_type=file_type).preprocess_data(start_date, end_date, columns)
+    lazy = DataHandler(path, file_type=file_type, lazy=True).preprocess_data(start_date, end_date, columns)
+    assert len(eager.dates) > 0
+    np.testing.assert_array_equal(lazy.dates, eager.dates)
+    for col in (columns or DataHandler.PRICE_COLUMNS):
+        np.testing.assert_array_equal(getattr(lazy, col), getattr(eager, col), err_msg=col)
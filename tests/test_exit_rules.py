@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_handler import DataHandler
+from exit_rules import (apply_exit_rules, EXIT_NONE, EXIT_SIGNAL, EXIT_STOP_LOSS, EXIT_TAKE_PROFIT,
+                        EXIT_TRAILING, EXIT_MAX_HOLDING, HAS_NUMBA)
+from strategy_core import TradingStrategyCore, ewma_matrix, crossover_signals, signal_positions
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+ENGINES = ['python', 'numpy'] + (['numba'] if HAS_NUMBA else [])
+# 0表示不启用该规则
+GRID = {'stop_loss': [0.02, 0.05, 0, 0.03], 'take_profit': [0, 0.1, 0.04, 0.08],
+        'trailing_stop': [0.03, 0, 0.06, 0.02], 'max_holding': [0, 20, 0, 5]}
+
+
+@pytest.fixture(scope='module')
+def market():
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    data.preprocess_data(start_date=datetime(2015, 1, 1), end_date=datetime(2021, 12, 31))
+    strategy = TradingStrategyCore(data, strategy_type='EWMA', span=20)
+    strategy.generate_signals()
+    execution_price = np.asarray(strategy.processed_data['ExecutionPrice'], dtype=np.float64)
+    return data, np.asarray(strategy.processed_data['TradingSignal'], dtype=np.float64), execution_price
+
+
+def _params(index):
+    return {key: values[index] for key, values in GRID.items()}
+
+
+@pytest.mark.parametrize('long_only', [False, True])
+def test_engines_bit_identical(market, long_only):
+    data, _, price = market
+    batch = crossover_signals(data.close, ewma_matrix(data.close, np.array([5, 20, 60, 120])))
+    grid = {key: np.array(values) for key, values in GRID.items()}
+    results = {engine: apply_exit_rules(batch, price, data.high, data.low, long_only=long_only,
+                                        engine=engine, **grid)
+               for engine in ENGINES}
+    position, reason = results['python']
+    assert position.shape == reason.shape == batch.shape
+    for code in (EXIT_STOP_LOSS, EXIT_TAKE_PROFIT, EXIT_TRAILING, EXIT_MAX_HOLDING):
+        assert (reason == code).any()
+    for engine in ENGINES[1:]:
+        np.testing.assert_array_equal(results[engine][0], position, err_msg=engine)
+        np.testing.assert_array_equal(results[engine][1], reason, err_msg=engine)
+
+    # 批量结果的每一行等于单组参数单独计算
+    for row in range(batch.shape[0]):
+        single = apply_exit_rules(batch[row], price, data.high, data.low, long_only=long_only,
+                                  engine='numpy', **_params(row))
+        np.testing.assert_array_equal(single[0], position[row])
+        np.testing.assert_array_equal(single[1], reason[row])
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('long_only', [False, True])
+def test_no_rules_equals_signal_positions(market, engine, long_only):
+    data, signal, price = market
+    position, reason = apply_exit_rules(signal, price, data.high, data.low, long_only=long_only, engine=engine)
+    np.testing.assert_array_equal(position, signal_positions(signal, long_only=long_only))
+    assert set(np.unique(reason)) <= {EXIT_NONE, EXIT_SIGNAL}
@@ -0,0 +1,131 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_handler import DataHandler
+from indicators import compute_indicators
+from strategy_core import TradingStrategyCore, crossover_signals
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+N = 400
+
+
+@pytest.fixture(scope='module')
+def market():
+    rng = np.random.default_rng(8)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.01, N))
+    close[100:110] = close[99]  # 平盘段：RSI无涨跌、ATR只有振幅
+    spread = np.abs(rng.normal(0, 0.005, N)) * close
+    volume = rng.integers(0, 5000, N).astype(np.float64)
+    volume[50:70] = 0
+    return {'close': close, 'high': close + spread, 'low': close - spread,
+            'volume': volume, 'amt': volume * close * 1000 * (1 + rng.normal(0, 0.001, N)),
+            'oi': rng.integers(1, 1000, N).astype(np.float64)}
+
+
+def _rolling(values, window, func):
+    out = np.full(len(values), np.nan)
+    for i in range(window - 1, len(values)):
+        out[i] = func(values[i - window + 1:i + 1])
+    return out
+
+
+def _wilder(values, alpha):
+    out = np.empty(len(values))
+    out[0] = values[0]
+    for i in range(1, len(values)):
+        out[i] = out[i - 1] + alpha * (values[i] - out[i - 1])
+    return out
+
+
+def _reference(market):
+    close, high, low = market['close'], market['high'], market['low']
+    change = np.append(0, np.diff(close))
+    gain, loss = _wilder(np.maximum(change, 0), 1 / 14), _wilder(np.maximum(-change, 0), 1 / 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = np.where(loss > 0, 100 - 100 / (1 + gain / loss), np.where(gain > 0, 100.0, 50.0))
+    prev_close = np.append(np.nan, close[:-1])
+    true_range = np.fmax(high - low, np.fmax(np.abs(high - prev_close), np.abs(low - prev_close)))
+    mid = _rolling(close, 20, np.mean)
+    width = 2 * _rolling(close, 20, lambda x: np.std(x, ddof=1))
+    amt, volume = _rolling(market['amt'], 10, np.sum), _rolling(market['volume'], 10, np.sum)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(volume > 0, amt / volume / 1000, np.nan)
+        cum_vwap = np.where(np.cumsum(market['volume']) > 0,
+                            np.cumsum(market['amt']) / np.cumsum(market['volume']) / 1000, np.nan)
+    prev_oi = np.append(np.full(5, np.nan), market['oi'][:-5])
+    return {
+        'sma': _rolling(close, 20, np.mean),
+        'ewma': _wilder(close, 2 / 31),
+        'rsi': rsi,
+        'band': {'MID': mid, 'UPPER': mid + width, 'LOWER': mid - width},
+        'atr': _wilder(true_range, 1 / 14),
+        'channel': {'UPPER': _rolling(high, 20, np.max), 'LOWER': _rolling(low, 20, np.min),
+                    'MID': (_rolling(high, 20, np.max) + _rolling(low, 20, np.min)) / 2},
+        'vwap': vwap,
+        'cum_vwap': cum_vwap,
+        'oi': np.where(prev_oi > 0, market['oi'] / prev_oi - 1, np.nan),
+    }
+
+
+REQUESTS = {
+    'sma': ('SMA', {'span': 20}),
+    'ewma': ('EWMA', {'span': 30}),
+    'rsi': ('RSI', {'period': 14}),
+    'band': ('BOLLINGER', {'span': 20, 'k': 2.0}),
+    'atr': ('ATR', {'period': 14}),
+    'channel': ('DONCHIAN', {'window': 20}),
+    'vwap': ('VWAP', {'window': 10, 'multiplier': 1000.0}),
+    'cum_vwap': ('VWAP', {'window': 0, 'multiplier': 1000.0}),
+    'oi': ('OI_MOMENTUM', {'period': 5}),
+}
+
+
+def _assert_close(actual, expected):
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected)
+        for suffix in expected:
+            _assert_close(actual[suffix], expected[suffix])
+        return
+    np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-9)
+
+
+def test_fused_indicators_match_reference_loops(market):
+    values = compute_indicators(market, REQUESTS)
+    expected = _reference(market)
+    for key in REQUESTS:
+        _assert_close(values[key], expected[key])
+
+
+def test_fused_query_equals_separate_queries(market):
+    fused = compute_indicators(market, REQUESTS)
+    for key, request in REQUESTS.items():
+        _assert_close(fused[key], compute_indicators(market, {key: request})[key])
+
+
+def test_panel_rows_computed_separately(market):
+    # 两个序列首尾相接时，第二个序列的窗口不得跨入第一个序列
+    reversed_market = {col: values[::-1].copy() for col, values in market.items()}
+    panel = {col: np.vstack([market[col], reversed_market[col]]) for col in market}
+    values = compute_indicators(panel, REQUESTS)
+    for row, source in enumerate((market, reversed_market)):
+        single = compute_indicators(source, REQUESTS)
+        for key in REQUESTS:
+            if isinstance(single[key], dict):
+                for suffix in single[key]:
+                    np.testing.assert_array_equal(values[key][suffix][row], single[key][suffix])
+            else:
+                np.testing.assert_array_equal(values[key][row], single[key])
+
+
+def test_registered_strategy_uses_indicator():
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    data.preprocess_data(start_date=datetime(2018, 1, 1), end_date=datetime(2020, 12, 31))
+    strategy = TradingStrategyCore(data, strategy_type='SMA', span=20)
+    strategy.generate_signals()
+    sma = _rolling(data.close, 20, np.mean)
+    np.testing.assert_allclose(strategy.processed_data['SMA_20'], sma, rtol=1e-12)
+    np.testing.assert_array_equal(strategy.processed_data['TradingSignal'],
+                                  crossover_signals(data.close, strategy.processed_data['SMA_20']))
@@ -0,0 +1,26 @@
+import pytest
+
+import instrumentation
+
+
+@pytest.fixture
+def enabled():
+    was_enabled = instrumentation.is_enabled()
+    instrumentation.reset()
+    instrumentation.enable(max_records=5)
+    yield
+    instrumentation.enable(max_records=instrumentation.DEFAULT_MAX_RECORDS)
+    instrumentation.reset()
+    if not was_enabled:
+        instrumentation.disable()
+
+
+def test_records_are_bounded_and_summary_is_complete(enabled):
+    for i in range(12):
+        with instrumentation.stage('work', symbol='A', rows=1, index=i):
+            pass
+    records = instrumentation.records()
+    assert [r['index'] for r in records] == list(range(7, 12))
+    (total,) = instrumentation.summary()
+    assert total['calls'] == 12
+    assert total['rows'] == 12
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from reference_loop import loop_ewma_positions
+from indicators import compute_indicators
+from strategy_core import TradingStrategyCore, ewma_kernel, ewma_matrix, crossover_signals, signal_positions
+
+
+def _walk(n=5000, seed=7):
+    rng = np.random.default_rng(seed)
+    return 100 * np.cumprod(1 + rng.normal(0, 0.02, n))
+
+
+def _flat():
+    # 含平盘段(如停牌前向填充)：收盘价与EWMA相等
+    return np.concatenate([np.full(20, 50.0), np.linspace(50, 60, 30), np.full(20, 60.0), [10.0, 90.0, 10.0],
+                           _walk(200, seed=1), np.full(40, 75.0)])
+
+
+@pytest.mark.parametrize('long_only', [False, True])
+@pytest.mark.parametrize('span', [2, 30, 250])
+def test_kernels_match_baseline_loop(span, long_only):
+    for close in (_walk(), _walk(2)):
+        expected_ewma, expected_signal, expected_position = loop_ewma_positions(close, span, long_only)
+        ewma = ewma_kernel(close, span)
+        signal = crossover_signals(close, ewma)
+        np.testing.assert_allclose(ewma, expected_ewma, rtol=1e-12, atol=0)
+        np.testing.assert_array_equal(signal, expected_signal)
+        np.testing.assert_array_equal(signal_positions(signal, long_only=long_only), expected_position)
+
+
+@pytest.mark.parametrize('span', [2, 30, 250])
+def test_flat_runs_are_exact_ties(span):
+    """平盘段上内核的EWMA精确等于收盘价(无信号)；原循环的舍入噪声会在平盘后产生穿越信号，
+    除这些K线外两者信号一致"""
+    close = _flat()
+    expected_ewma, expected_signal, _ = loop_ewma_positions(close, span, False)
+    ewma = ewma_kernel(close, span)
+    signal = crossover_signals(close, ewma)
+    np.testing.assert_allclose(ewma, expected_ewma, rtol=1e-12, atol=0)
+    assert np.all(ewma[1:20] == 50.0)
+    differs = np.flatnonzero(signal != expected_signal)
+    # 仅在上一根K线为原循环的舍入级"假穿越"(价格与EWMA相差不超过若干ULP)时不同
+    prev_gap = np.abs(close[differs - 1] - expected_ewma[differs - 1])
+    assert np.all(prev_gap <= 1e-12 * close[differs - 1])
+
+
+@pytest.mark.parametrize('span', [2, 30, 250])
+def test_one_kernel_everywhere(span):
+    close = np.concatenate([_flat(), _walk(500)])
+    ewma = ewma_kernel(close, span)
+    # 从任意K线的EWMA接续递推与整段计算逐位一致
+    for k in (1, 21, 57, 300):
+        resumed = ewma_kernel(np.concatenate(([ewma[k - 1]], close[k:])), span)[1:]
+        np.testing.assert_array_equal(resumed, ewma[k:])
+    np.testing.assert_array_equal(ewma_matrix(close, [span])[0], ewma)
+
+    indicator = compute_indicators({'close': close}, {'ewma': ('EWMA', {'span': span})})['ewma']
+    np.testing.assert_array_equal(indicator, ewma)
+
+    strategy = TradingStrategyCore(None, strategy_type='EWMA', span=span)
+    dates = np.datetime64('2020-01-01') + np.arange(len(close)).astype('timedelta64[D]')
+    rows = strategy.update_batch({'date': dates, 'open': close, 'close': close})
+    np.testing.assert_array_equal(rows[strategy.indicator_name], ewma)
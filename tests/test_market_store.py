@@ -0,0 +1,51 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+import pytest
+
+from data_handler import DataHandler
+from market_store import MarketDataStore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+WINDOWS = [(None, None), (datetime(2015, 3, 1), datetime(2019, 6, 30)), (datetime(2021, 1, 4), None)]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return MarketDataStore.build(DATA_DIR, str(tmp_path / 'store'))
+
+
+def _assert_same(handler, expected):
+    np.testing.assert_array_equal(handler.dates, expected.dates)
+    for col in DataHandler.PRICE_COLUMNS:
+        np.testing.assert_array_equal(getattr(handler, col), getattr(expected, col), err_msg=col)
+
+
+@pytest.mark.parametrize('symbol', ['AUFI_WI', 'AGFI_WI'])
+@pytest.mark.parametrize('start_date, end_date', WINDOWS)
+def test_round_trip_matches_files(store, symbol, start_date, end_date):
+    expected = DataHandler(os.path.join(DATA_DIR, f'{symbol}.parquet'), file_type='parquet')
+    expected.preprocess_data(start_date=start_date, end_date=end_date)
+    _assert_same(DataHandler.from_store(store, symbol, start_date, end_date), expected)
+
+
+def test_delta_overrides_and_compacts(store):
+    full = pl.read_parquet(os.path.join(DATA_DIR, 'AUFI_WI.parquet'))
+    # 修订最后10行并追加2根新K线：以后写入的数据为准
+    revised = full.tail(10).with_columns(pl.col('close') * 2)
+    new_bars = full.tail(2).with_columns(pl.Series('date', ['2031-01-02', '2031-01-03']))
+    store.append(pl.concat([revised, new_bars]), symbol='AUFI_WI')
+    assert len(store.parts) == 2
+    expected = pl.concat([full.head(full.height - 10), revised, new_bars])
+    before = store.symbol_frame('AUFI_WI')
+    np.testing.assert_array_equal(before['close'].to_numpy(), expected['close'].to_numpy())
+    assert before.height == full.height + 2
+
+    agfi = DataHandler.from_store(store, 'AGFI_WI')
+    store.compact()
+    assert len(store.parts) == 1
+    assert store.symbol_frame('AUFI_WI').equals(before)
+    _assert_same(DataHandler.from_store(store, 'AGFI_WI'), agfi)
+    assert store.compact() is store and len(store.parts) == 1
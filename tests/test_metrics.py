@@ -0,0 +1,37 @@
+import numpy as np
+
+from metrics import compute_metrics
+
+
+def test_drawdown_measured_from_initial_capital():
+    metrics = compute_metrics(np.array([-0.5, 0.0, 0.1]))
+    assert np.isclose(metrics['MaxDrawdown'], -0.5)
+    assert metrics['MaxDrawdownDuration'] == 3
+    assert np.isfinite(metrics['Calmar'])
+
+
+def test_drawdown_after_new_high():
+    metrics = compute_metrics(np.array([0.1, -0.1, 0.0, 0.25]))
+    assert np.isclose(metrics['MaxDrawdown'], -0.1)
+    assert metrics['MaxDrawdownDuration'] == 2
+
+
+def test_rows_match_single_runs():
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.01, (4, 300))
+    batch = compute_metrics(returns)
+    for i, row in enumerate(returns):
+        single = compute_metrics(row)
+        for name, value in single.items():
+            np.testing.assert_allclose(batch[name][i], value)
+
+
+def test_empty_window():
+    empty = np.array([], dtype=np.float64)
+    metrics = compute_metrics(empty, empty, empty)
+    assert metrics['FinalReturn'] == 0 and metrics['MaxDrawdown'] == 0
+    assert metrics['MaxDrawdownDuration'] == 0 and metrics['Trades'] == 0
+    for name in ('AnnualReturn', 'AnnualVolatility', 'Sharpe', 'Sortino', 'Calmar', 'HitRate', 'Turnover'):
+        assert np.isnan(metrics[name])
+    batch = compute_metrics(np.empty((3, 0)))
+    assert batch['FinalReturn'].shape == (3,)
@@ -0,0 +1,18 @@
+import pytest
+
+from panel import PanelBacktest
+
+
+@pytest.mark.parametrize('params', [
+    {'lookback': 0}, {'lookback': -5}, {'lookback': 2.5}, {'rebalance': 0},
+    {'quantile': 0}, {'quantile': 0.6}, {'quantile': 1.5, 'long_only': True},
+])
+def test_xs_momentum_rejects_invalid_params(params):
+    with pytest.raises(ValueError):
+        PanelBacktest(None, strategy_type='XS_MOMENTUM', **params)
+
+
+def test_xs_momentum_accepts_minimal_params():
+    backtest = PanelBacktest(None, strategy_type='XS_MOMENTUM', lookback=1, rebalance=1, quantile=0.8,
+                             long_only=True)
+    assert backtest.strategy_params['lookback'] == 1
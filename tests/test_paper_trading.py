@@ -0,0 +1,44 @@
+import asyncio
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from data_handler import DataHandler
+from paper_trading import PaperTradingService, ReplayFeed
+from strategy_core import TradingStrategyCore
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+START, END = datetime(2018, 1, 1), datetime(2021, 12, 31)
+
+
+def _backtest(path, strategy_type, span):
+    handler = DataHandler(path, file_type='parquet')
+    handler.preprocess_data(start_date=START, end_date=END)
+    strategy = TradingStrategyCore(handler, strategy_type=strategy_type, span=span)
+    strategy.generate_signals()
+    return BacktestEngine(strategy).run_backtest()
+
+
+@pytest.mark.parametrize('strategy_type', ['EWMA', 'EWMA_LONG_ONLY'])
+def test_replay_equity_matches_backtest(strategy_type):
+    feed = ReplayFeed.from_directory(DATA_DIR, start_date=START, end_date=END)
+    service = PaperTradingService(feed, strategy_type=strategy_type, capital=1.0, span=20)
+    events = service.subscribe()
+    asyncio.run(service.run())
+
+    equity = {}
+    while not events.empty():
+        event = events.get_nowait()
+        assert event['type'] != 'error', event
+        if event['type'] == 'position':
+            equity.setdefault(event['symbol'], []).append(event['equity'])
+    assert set(equity) == set(feed.symbol_paths)
+    for symbol, path in feed.symbol_paths.items():
+        expected = _backtest(path, strategy_type, span=20)['CumulativeReturn']
+        # 第i根K线处理后的净值含截至第i根K线的收益，即回测第i-1根K线的累计净值
+        np.testing.assert_allclose(equity[symbol][1:], expected[:-1], rtol=1e-12)
+        assert equity[symbol][0] == 1.0
+        assert service.accounts[symbol].bars == len(expected)
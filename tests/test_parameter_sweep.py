@@ -0,0 +1,46 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from data_handler import DataHandler
+from metrics import compute_metrics
+from parameter_sweep import ParameterSweep, METRIC_COLUMNS
+from strategy_core import TradingStrategyCore
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+SPANS = [2, 5, 20, 60, 250]
+
+
+@pytest.fixture(scope='module')
+def handler():
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    data.preprocess_data(start_date=datetime(2012, 1, 1), end_date=datetime(2020, 12, 31))
+    return data
+
+
+@pytest.mark.parametrize('strategy_type', ['EWMA', 'EWMA_LONG_ONLY'])
+def test_sweep_matches_single_runs(handler, strategy_type):
+    sweep = ParameterSweep(handler, strategy_type=strategy_type)
+    batch = sweep.run_chunk(np.array(SPANS))
+    table = sweep.run(SPANS)
+    assert table['span'].to_list() == SPANS
+    for row, span in enumerate(SPANS):
+        strategy = TradingStrategyCore(handler, strategy_type=strategy_type, span=span)
+        strategy.generate_signals()
+        result = BacktestEngine(strategy).run_backtest()
+        for column in ('Position', 'StrategyReturn', 'CumulativeReturn'):
+            np.testing.assert_array_equal(batch[column][row], np.asarray(result[column], dtype=np.float64))
+        expected = compute_metrics(np.asarray(result['StrategyReturn'], dtype=np.float64),
+                                   np.asarray(result['Position'], dtype=np.float64))
+        for name in METRIC_COLUMNS:
+            np.testing.assert_allclose(table[name][row], expected[name], rtol=1e-12)
+
+
+def test_chunking_does_not_change_results(handler):
+    whole = ParameterSweep(handler).run(SPANS)
+    per_span = ParameterSweep(handler, max_chunk_bytes=1)
+    assert per_span.chunk_size(len(SPANS)) == 1
+    assert per_span.run(SPANS).equals(whole)
@@ -0,0 +1,30 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from portfolio import PortfolioBacktest
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+
+
+def test_empty_universe():
+    with pytest.raises(ValueError, match='没有可加载的品种'):
+        PortfolioBacktest({}, span=20).run(max_workers=1)
+
+
+def test_range_without_bars():
+    portfolio = PortfolioBacktest.from_directory(DATA_DIR, span=20)
+    with pytest.raises(ValueError, match='没有任何品种的数据'):
+        portfolio.run(datetime(1990, 1, 1), datetime(1990, 12, 31), max_workers=1)
+
+
+def test_symbol_without_bars_in_range():
+    # AGFI_WI在2012年5月才开始有数据，区间内只有AUFI_WI参与组合
+    portfolio = PortfolioBacktest.from_directory(DATA_DIR, span=20)
+    result = portfolio.run(datetime(2010, 1, 1), datetime(2011, 12, 31), max_workers=1)
+    assert portfolio.symbol_returns.columns == ['Date', 'AGFI_WI', 'AUFI_WI']
+    assert portfolio.symbol_returns['AGFI_WI'].null_count() == portfolio.symbol_returns.height
+    np.testing.assert_array_equal(result['PortfolioReturn'].to_numpy(),
+                                  portfolio.symbol_returns['AUFI_WI'].to_numpy())
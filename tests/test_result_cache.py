@@ -0,0 +1,64 @@
+import os
+
+import numpy as np
+
+import result_cache
+from result_cache import ResultCache
+
+
+def test_hit_does_not_rewrite_index(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', {'x': np.arange(3.0)})
+    index_path = tmp_path / ResultCache.INDEX_FILE
+    before = index_path.stat().st_mtime_ns
+    os.utime(index_path, ns=(before - 10**9, before - 10**9))
+    stamped = index_path.stat().st_mtime_ns
+
+    np.testing.assert_array_equal(cache.get('a')['x'], np.arange(3.0))
+    assert index_path.stat().st_mtime_ns == stamped
+    assert cache.hits == 1
+
+
+def test_eviction_uses_last_hit(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put('old', {'x': np.zeros(100)})
+    cache.put('new', {'x': np.zeros(100)})
+    # 'old'写入较早但最近被命中，应淘汰'new'
+    past = os.path.getmtime(tmp_path / 'new') - 100
+    os.utime(tmp_path / 'new', (past, past))
+    os.utime(tmp_path / 'old', (past, past))
+    cache.get('old')
+    index = cache._load_index()
+    for key in index:
+        index[key]['last_access'] = past
+    cache._save_index(index)
+
+    cache.max_bytes = index['old']['bytes'] + index['new']['bytes'] // 2
+    cache.put('third', {'x': np.zeros(1)})
+    assert cache.get('old') is not None
+    assert cache.get('new') is None
+
+
+def test_msvcrt_lock_without_fcntl(tmp_path, monkeypatch):
+    """无fcntl(Windows)时以msvcrt锁定锁文件"""
+    calls = []
+
+    class FakeMsvcrt:
+        LK_LOCK, LK_UNLCK = 1, 0
+
+        def __init__(self):
+            self.busy = 1  # 首次加锁超时一次
+
+        def locking(self, fd, mode, nbytes):
+            calls.append((mode, nbytes))
+            if mode == self.LK_LOCK and self.busy:
+                self.busy -= 1
+                raise OSError('deadlock avoided')
+
+    monkeypatch.setattr(result_cache, 'fcntl', None)
+    monkeypatch.setattr(result_cache, 'msvcrt', FakeMsvcrt())
+    cache = ResultCache(str(tmp_path))
+    cache.put('a', {'x': np.arange(3.0)})
+    np.testing.assert_array_equal(cache.get('a')['x'], np.arange(3.0))
+    assert calls[:3] == [(1, 1), (1, 1), (0, 1)]
+    assert len(calls) % 2 == 1 and calls.count((0, 1)) == calls.count((1, 1)) - 1
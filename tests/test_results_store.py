@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import polars as pl
+
+from results_store import ResultsStore, EQUITY_SCHEMA
+
+
+def _record(run_id, created_at, sharpe, symbol='AUFI_WI'):
+    return {'run_id': run_id, 'campaign': 'scan', 'strategy_type': 'EWMA', 'symbol': symbol,
+            'params': '{"span": 30}', 'bars': 100, 'created_at': created_at, 'Sharpe': sharpe}
+
+
+def _curve(run_id, value, symbol='AUFI_WI'):
+    return pl.DataFrame({'run_id': run_id, 'strategy_type': 'EWMA', 'symbol': symbol,
+                         'date': [datetime(2024, 1, 1), datetime(2024, 1, 2)], 'equity': [1.0, value]},
+                        schema=EQUITY_SCHEMA)
+
+
+def test_duplicate_run_ids_stored_once(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.add_record(_record('a', datetime(2024, 1, 1), 1.0), _curve('a', 1.1))
+    store.add_record(_record('b', datetime(2024, 1, 1), 0.5), _curve('b', 0.9))
+    store.add_record(_record('a', datetime(2024, 1, 2), 2.0), _curve('a', 1.2))  # 同一缓冲内重复
+    assert store.flush() == 2
+    store.add_record(_record('b', datetime(2024, 1, 3), 0.7), _curve('b', 0.8))  # 已写入分片中的重复
+    store.add_record(_record('c', datetime(2024, 1, 3), 0.1, symbol='AGFI_WI'))
+    store.flush()
+
+    runs = store.scan().collect().sort('run_id')
+    assert runs['run_id'].to_list() == ['a', 'b', 'c']
+    assert runs['Sharpe'].to_list() == [2.0, 0.7, 0.1]
+    assert store.summary('symbol')['Runs'].to_list() == [1, 2]
+    assert store.rank('Sharpe')['run_id'].to_list() == ['a', 'b', 'c']
+    curves = store.equity().collect().sort('run_id', 'date')
+    assert curves['equity'].to_list() == [1.0, 1.2, 1.0, 0.8]
+
+    store.compact()
+    assert sorted(store.scan().collect()['Sharpe'].to_list()) == [0.1, 0.7, 2.0]
+    assert len(list((tmp_path / 'runs').rglob('*.parquet'))) == 2
+
+
+def test_metric_filters_pushed_down(tmp_path):
+    store = ResultsStore(str(tmp_path))
+    store.add_record(_record('a', datetime(2024, 1, 1), 1.0))
+    store.flush()
+    plan = store.scan(strategy_type='EWMA').filter(pl.col('Sharpe') > 3).explain()
+    assert plan.lstrip().startswith('Parquet SCAN')
+    assert 'SELECTION' in plan and 'Sharpe' in plan and 'UNIQUE' not in plan
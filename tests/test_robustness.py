@@ -0,0 +1,54 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from data_handler import DataHandler
+from robustness import BootstrapRobustness, block_bootstrap_indices, stationary_bootstrap_indices
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+
+
+@pytest.fixture(scope='module')
+def handler():
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    data.preprocess_data(start_date=datetime(2018, 1, 1), end_date=datetime(2019, 12, 31))
+    return data
+
+
+@pytest.mark.parametrize('generator', [block_bootstrap_indices, stationary_bootstrap_indices])
+@pytest.mark.parametrize('length,block_size', [(1, 1), (7, 20), (250, 1), (250, 20)])
+def test_index_shape_and_bounds(generator, length, block_size):
+    idx = generator(np.random.default_rng(0), 50, length, block_size)
+    assert idx.shape == (50, length)
+    assert np.issubdtype(idx.dtype, np.integer)
+    assert idx.min() >= 0 and idx.max() < length
+
+
+def test_block_indices_are_contiguous_blocks():
+    idx = block_bootstrap_indices(np.random.default_rng(1), 20, 100, 10)
+    steps = np.diff(idx, axis=1)
+    assert (steps[:, np.arange(99) % 10 != 9] == 1).all()
+
+
+@pytest.mark.parametrize('resample', ['market', 'strategy'])
+def test_same_seed_same_intervals(handler, resample):
+    def intervals(max_chunk_bytes, max_workers):
+        test = BootstrapRobustness(handler, method='stationary', resample=resample,
+                                   max_chunk_bytes=max_chunk_bytes, span=20)
+        test.run(n_samples=30, seed=7, max_workers=max_workers)
+        return test
+
+    reference = intervals(64 * 1024**2, 1)
+    assert reference.chunk_size(30) == 30
+    for chunk_bytes, workers in [(8 * 8 * len(handler.dates) * 4, 1), (1, 2)]:
+        other = intervals(chunk_bytes, workers)
+        assert other.samples.equals(reference.samples)
+        assert other.confidence_intervals().equals(reference.confidence_intervals())
+
+
+@pytest.mark.parametrize('n_samples', [0, -1])
+def test_rejects_empty_sample_count(handler, n_samples):
+    with pytest.raises(ValueError):
+        BootstrapRobustness(handler).run(n_samples=n_samples, max_workers=1)
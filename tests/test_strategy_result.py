@@ -0,0 +1,67 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from data_handler import DataHandler
+from strategy_core import TradingStrategyCore, signal_action_states
+from strategy_result import StrategyResult, decode_actions, encode_actions
+from reference_loop import loop_ewma_positions
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+
+
+@pytest.fixture(scope='module')
+def handler():
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    return data.preprocess_data(start_date=datetime(2012, 1, 1), end_date=datetime(2021, 12, 31))
+
+
+def _run(handler, dtype=np.float64, span=20):
+    strategy = TradingStrategyCore(handler, strategy_type='EWMA', span=span, dtype=dtype)
+    strategy.generate_signals()
+    BacktestEngine(strategy).run_backtest()
+    return strategy.processed_data
+
+
+def test_compact_types_and_shared_arrays(handler):
+    result = _run(handler)
+    assert isinstance(result, StrategyResult)
+    assert result['Date'] is handler.dates and result['Close'] is handler.close
+    assert result.signal.dtype == result.action.dtype == result.position.dtype == np.int8
+    # 与逐K线基准循环一致，ActionStates解码为隔日执行的行动状态
+    _, trading_signal, position = loop_ewma_positions(handler.close, 20, False)
+    np.testing.assert_array_equal(result['TradingSignal'], trading_signal)
+    np.testing.assert_array_equal(result['Position'], position)
+    np.testing.assert_array_equal(result['ActionStates'], signal_action_states(trading_signal))
+    assert result.nbytes < 6 * 8 * len(handler.dates)
+
+
+def test_float32_mode(handler):
+    full, half = _run(handler), _run(handler, np.float32)
+    assert half.nbytes < full.nbytes
+    for key in ('ExecutionPrice', 'EWMA_20', 'StrategyReturn', 'CumulativeReturn'):
+        assert half[key].dtype == np.float32
+        np.testing.assert_allclose(half[key], full[key], rtol=1e-5, atol=1e-6)
+    np.testing.assert_array_equal(half['Position'], full['Position'])
+
+
+def test_cache_round_trip(handler):
+    result = _run(handler)
+    arrays = result.to_arrays()
+    assert 'ActionStates' not in arrays and arrays['ActionCodes'].dtype == np.int8
+    restored = StrategyResult.from_arrays(arrays, result.indicator_name)
+    assert restored.keys() == result.keys()
+    for key in result.keys():
+        np.testing.assert_array_equal(restored[key], result[key])
+    # 旧缓存以字符串保存ActionStates
+    legacy = {**arrays, 'ActionStates': result['ActionStates']}
+    del legacy['ActionCodes']
+    np.testing.assert_array_equal(StrategyResult.from_arrays(legacy, result.indicator_name).action, result.action)
+
+
+def test_action_codes_round_trip():
+    states = np.array(['hold', 'buy', 'sell', 'hold', 'sell'])
+    np.testing.assert_array_equal(decode_actions(encode_actions(states)), states)
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from strategy_core import TradingStrategyCore
+from strategy_result import decode_actions
+
+
+class _Handler:
+    def __init__(self, dates, open_prices, close_prices):
+        self.dates = dates
+        self.open = open_prices
+        self.close = close_prices
+
+
+def _prices(n=400, seed=1):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.015, n))
+    open_prices = close * (1 + rng.normal(0, 0.003, n))
+    dates = np.datetime64('2020-01-01') + np.arange(n).astype('timedelta64[D]')
+    return dates, open_prices, close
+
+
+@pytest.mark.parametrize('strategy_type', ['EWMA', 'EWMA_LONG_ONLY'])
+def test_streaming_matches_full_recompute(tmp_path, strategy_type):
+    dates, open_prices, close = _prices()
+    split = 150
+    full = TradingStrategyCore(_Handler(dates, open_prices, close), strategy_type, span=20)
+    expected = full.generate_signals()
+
+    prefix = TradingStrategyCore(_Handler(dates[:split], open_prices[:split], close[:split]),
+                                 strategy_type, span=20)
+    prefix.generate_signals()
+    path = tmp_path / 'state.json'
+    prefix.save_state(str(path))
+
+    streaming = TradingStrategyCore.from_state(str(path))
+    rows = streaming.update_batch({'date': dates[split:], 'open': open_prices[split:],
+                                   'close': close[split:]})
+
+    np.testing.assert_array_equal(rows['TradingSignal'], np.asarray(expected['TradingSignal'])[split:])
+    np.testing.assert_array_equal(rows['Position'], np.asarray(expected['Position'])[split:])
+    # 行动状态与批量结果使用相同的int8编码，无需转换即可比较
+    assert rows['ActionCodes'].dtype == expected['ActionCodes'].dtype == np.int8
+    np.testing.assert_array_equal(rows['ActionCodes'], expected['ActionCodes'][split:])
+    np.testing.assert_array_equal(decode_actions(rows['ActionCodes']), expected['ActionStates'][split:])
+    np.testing.assert_allclose(rows[full.indicator_name],
+                               np.asarray(expected[full.indicator_name])[split:], rtol=1e-12)
+    assert streaming.get_state()['bars'] == len(dates)
@@ -0,0 +1,63 @@
+import os
+from datetime import datetime
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from data_handler import DataHandler
+from strategy_core import TradingStrategyCore
+from visualization import (StrategyVisualizer, lttb_indices, minmax_indices, position_steps,
+                           render_reports)
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+WINDOW = (datetime(2015, 1, 1), datetime(2020, 12, 31))
+
+
+def test_downsampling_keeps_shape():
+    rng = np.random.default_rng(2)
+    y = np.cumsum(rng.normal(size=20_000))
+    x = np.arange(len(y))
+    idx = lttb_indices(x, y, 500)
+    assert len(idx) == 500 and idx[0] == 0 and idx[-1] == len(y) - 1
+    assert (np.diff(idx) > 0).all()
+    idx = minmax_indices(y, 500)
+    assert len(idx) <= 502 and (np.diff(idx) > 0).all()
+    assert np.argmax(y) in idx and np.argmin(y) in idx
+
+
+def test_position_steps_reproduce_positions():
+    rng = np.random.default_rng(4)
+    position = np.repeat(rng.choice([-1.0, 0.0, 1.0], size=300), rng.integers(1, 30, size=300))
+    dates = np.arange(len(position))
+    step_dates, step_values = position_steps(dates, position)
+    assert len(step_dates) < len(position) / 5
+    # 阶梯图(where='post')在每根K线上的取值与逐K线持仓一致
+    filled = step_values[np.searchsorted(step_dates, dates, side='right') - 1]
+    np.testing.assert_array_equal(filled, position)
+
+
+@pytest.mark.parametrize('fmt, expected', [('png', 3), ('svg', 3), ('pdf', 1)])
+def test_headless_writes_files(tmp_path, fmt, expected):
+    data = DataHandler(os.path.join(DATA_DIR, 'AUFI_WI.parquet'), file_type='parquet')
+    data.preprocess_data(*WINDOW)
+    strategy = TradingStrategyCore(data, strategy_type='EWMA', span=20)
+    strategy.generate_signals()
+    BacktestEngine(strategy).run_backtest()
+    open_figures = plt.get_fignums()
+    paths = StrategyVisualizer(strategy, data, output_dir=str(tmp_path), fmt=fmt, max_points=300).plot_results()
+    assert len(paths) == expected
+    assert all(path.endswith(f'.{fmt}') and os.path.getsize(path) > 0 for path in paths)
+    assert plt.get_fignums() == open_figures  # 无界面模式不经过pyplot
+
+
+@pytest.mark.parametrize('max_workers', [1, 2])
+def test_render_reports(tmp_path, max_workers):
+    runs = [(f'{symbol}_{span}', os.path.join(DATA_DIR, f'{symbol}.parquet'), 'EWMA', {'span': span})
+            for symbol in ('AUFI_WI', 'AGFI_WI') for span in (10, 40)]
+    paths = render_reports(runs, str(tmp_path), fmt='pdf', start_date=WINDOW[0], end_date=WINDOW[1],
+                           max_workers=max_workers)
+    assert list(paths) == [name for name, *_ in runs]
+    for name, files in paths.items():
+        assert files == [os.path.join(str(tmp_path), f'{name}.pdf')] and os.path.getsize(files[0]) > 0
@@ -0,0 +1,62 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from backtest_engine import BacktestEngine
+from data_handler import DataHandler
+from metrics import compute_metrics
+from strategy_core import TradingStrategyCore
+from walk_forward import WalkForwardOptimizer
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'AUFI_WI.parquet')
+SPANS = [5, 20, 60]
+START, END = datetime(2014, 1, 1), datetime(2019, 12, 31)
+
+
+def _load(start_date, end_date):
+    data = DataHandler(DATA_PATH, file_type='parquet')
+    return data.preprocess_data(start_date=start_date, end_date=end_date)
+
+
+def _backtest(start_date, end_date, span, strategy_type):
+    """按日期区间重新加载数据并直接回测"""
+    strategy = TradingStrategyCore(_load(start_date, end_date), strategy_type=strategy_type, span=span)
+    strategy.generate_signals()
+    return BacktestEngine(strategy).run_backtest()
+
+
+def _as_datetime(value):
+    return value.astype('datetime64[us]').item()
+
+
+@pytest.mark.parametrize('strategy_type', ['EWMA', 'EWMA_LONG_ONLY'])
+@pytest.mark.parametrize('anchored', [False, True])
+def test_folds_match_direct_windowed_backtests(strategy_type, anchored):
+    data = _load(START, END)
+    optimizer = WalkForwardOptimizer(data, SPANS, strategy_type=strategy_type)
+    folds = optimizer.run(train_size=500, test_size=250, anchored=anchored, max_workers=1)
+    dates = data.dates
+    expected_returns = []
+    for fold_id, train_start, test_start, test_end in optimizer.split(500, 250, anchored=anchored):
+        # 样本内：逐个span回测，按Sharpe选优
+        train_window = (_as_datetime(dates[train_start]), _as_datetime(dates[test_start - 1]))
+        sharpe = []
+        for span in SPANS:
+            result = _backtest(*train_window, span, strategy_type)
+            sharpe.append(compute_metrics(np.asarray(result['StrategyReturn'], dtype=np.float64),
+                                          np.asarray(result['Position'], dtype=np.float64))['Sharpe'])
+        best = int(np.argmax(np.nan_to_num(sharpe, nan=-np.inf)))
+        assert folds['BestSpan'][fold_id] == SPANS[best]
+        np.testing.assert_allclose(folds['InSampleSharpe'][fold_id], sharpe[best], rtol=1e-12)
+
+        # 样本外：从样本内起点回测至测试区间后一根K线，只取测试区间
+        stop = min(test_end, len(dates) - 1)
+        result = _backtest(train_window[0], _as_datetime(dates[stop]), SPANS[best], strategy_type)
+        offset = test_start - train_start
+        expected_returns.append(np.asarray(result['StrategyReturn'])[offset:offset + test_end - test_start])
+
+    np.testing.assert_array_equal(optimizer.oos_equity['StrategyReturn'].to_numpy(),
+                                  np.concatenate(expected_returns))
+    assert optimizer.oos_equity['Date'].to_numpy()[0] == dates[500]
@@ -0,0 +1,109 @@
+import glob
+import os
+from datetime import date
+
+import polars as pl
+import pytest
+
+import wind_data
+from market_store import MarketDataStore
+from wind_source import WindPySource, FakeWindPy
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+SYMBOLS = ['AUFI.WI', 'AGFI.WI']
+
+
+@pytest.fixture
+def local(tmp_path, monkeypatch):
+    """截至2019年底的本地数据与合并存储；模拟Wind由完整数据提供"""
+    data_dir = tmp_path / 'data'
+    data_dir.mkdir()
+    for name in ('AUFI_WI', 'AGFI_WI'):
+        frame = pl.read_parquet(os.path.join(DATA_DIR, f'{name}.parquet'))
+        frame.filter(pl.col('date') <= '2019-12-31').write_parquet(data_dir / f'{name}.parquet')
+    store_dir = str(data_dir / 'store')
+    MarketDataStore.build(str(data_dir), store_dir)
+    monkeypatch.setattr(wind_data, 'SYMBOLS', SYMBOLS)
+    monkeypatch.setattr(wind_data, 'DATA_DIR', str(data_dir))
+    monkeypatch.setattr(wind_data, 'MANIFEST_PATH', str(data_dir / '_manifest.json'))
+    monkeypatch.setattr(wind_data, 'DEFAULT_STORE_DIR', store_dir)
+    return data_dir, store_dir
+
+
+def _update(end_date):
+    wind_data.main(end_date, source=WindPySource(FakeWindPy(DATA_DIR)), max_workers=1)
+
+
+def _parts(store_dir):
+    return glob.glob(os.path.join(store_dir, MarketDataStore.PART_PATTERN))
+
+
+def test_one_store_part_per_update_run(local):
+    data_dir, store_dir = local
+    _update(date(2020, 12, 31))
+    assert len(_parts(store_dir)) == 2  # 构建时的分片 + 本次更新的一个分片(含两个品种)
+    _update(date(2021, 12, 31))
+    assert len(_parts(store_dir)) == 3
+
+    store = MarketDataStore(store_dir)
+    for symbol in ('AUFI_WI', 'AGFI_WI'):
+        expected = pl.read_parquet(os.path.join(DATA_DIR, f'{symbol}.parquet')).filter(pl.col('date') <= '2021-12-31')
+        assert store.symbol_frame(symbol).height == expected.height
+
+
+def test_store_compacted_over_threshold(local, monkeypatch):
+    data_dir, store_dir = local
+    monkeypatch.setattr(wind_data, 'COMPACT_THRESHOLD', 2)
+    _update(date(2020, 12, 31))
+    assert len(_parts(store_dir)) == 2
+    _update(date(2021, 12, 31))
+    assert len(_parts(store_dir)) == 1
+    expected = pl.read_parquet(os.path.join(DATA_DIR, 'AUFI_WI.parquet')).filter(pl.col('date') <= '2021-12-31')
+    assert MarketDataStore(store_dir).symbol_frame('AUFI_WI').height == expected.height
+
+
+def test_compact_releases_mappings_before_delete(local, monkeypatch):
+    """模拟Windows：仍被映射的分片删除失败时保留至下次刷新，读取不受影响"""
+    data_dir, store_dir = local
+    _update(date(2020, 12, 31))
+    store = MarketDataStore(store_dir)
+    held = store.load('AUFI_WI')['close']  # 调用方仍持有映射内存的视图
+    real_remove = os.remove
+    blocked = set()
+
+    def remove(path):
+        if path.endswith('.arrow') and store._maps:
+            raise AssertionError('删除分片前未释放映射')
+        if os.path.basename(path) in blocked:
+            raise PermissionError(path)
+        real_remove(path)
+
+    monkeypatch.setattr(os, 'remove', remove)
+    blocked.add('part-00000.arrow')
+    store.compact()
+    monkeypatch.setattr(os, 'remove', real_remove)
+    assert sorted(os.path.basename(p) for p in _parts(store_dir)) == ['part-00000.arrow', 'part-00002.arrow']
+    assert len(store.parts) == 1
+    assert store.load('AUFI_WI')['close'][:len(held)].tolist() == held.tolist()
+
+    del held
+    reopened = MarketDataStore(store_dir)
+    assert [os.path.basename(p) for p in _parts(store_dir)] == ['part-00002.arrow']
+    assert not os.path.exists(os.path.join(store_dir, MarketDataStore.STALE_FILE))
+    expected = pl.read_parquet(os.path.join(DATA_DIR, 'AUFI_WI.parquet')).filter(pl.col('date') <= '2020-12-31')
+    assert reopened.symbol_frame('AUFI_WI').height == expected.height
+
+
+@pytest.mark.parametrize('threshold', [2, 100])
+def test_incremental_store_matches_rebuild(local, monkeypatch, tmp_path, threshold):
+    """增量追加(含合并)后的存储与由更新后文件重新构建的存储内容一致"""
+    data_dir, store_dir = local
+    monkeypatch.setattr(wind_data, 'COMPACT_THRESHOLD', threshold)
+    for end_date in (date(2020, 6, 30), date(2020, 12, 31), date(2021, 12, 31)):
+        _update(end_date)
+    store = MarketDataStore(store_dir)
+    assert len(store.parts) == (2 if threshold == 2 else 4)  # 阈值2时第二次更新后合并，第三次再追加一个分片
+    rebuilt = MarketDataStore.build(str(data_dir), str(tmp_path / 'rebuilt'))
+    assert store.symbols() == rebuilt.symbols() == ['AGFI_WI', 'AUFI_WI']
+    for symbol in store.symbols():
+        assert store.symbol_frame(symbol).equals(rebuilt.symbol_frame(symbol))
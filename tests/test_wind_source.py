@@ -0,0 +1,65 @@
+import os
+from datetime import date
+
+import pytest
+
+from wind_source import FakeWindPy, WindFetchError, WindPySource, fetch_many
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data')
+START, END = date(2021, 1, 1), date(2021, 3, 31)
+
+
+def _collect(source, start_dates, **kwargs):
+    frames, errors = {}, {}
+    for symbol, frame, exc in fetch_many(source, start_dates, END, backoff=0, **kwargs):
+        assert symbol not in frames and symbol not in errors
+        if exc is None:
+            frames[symbol] = frame
+        else:
+            errors[symbol] = exc
+    return frames, errors
+
+
+@pytest.fixture(scope='module')
+def expected():
+    frames, errors = _collect(WindPySource(FakeWindPy(DATA_DIR)), {'AUFI.WI': START, 'AGFI.WI': START},
+                              batch_size=1, max_workers=1)
+    assert not errors
+    return frames
+
+
+@pytest.mark.parametrize('batch_size', [1, 3])
+def test_bad_symbol_does_not_fail_its_batch(expected, batch_size):
+    fake = FakeWindPy(DATA_DIR)
+    start_dates = {'AUFI.WI': START, 'MISSING.WI': START, 'AGFI.WI': START}
+    frames, errors = _collect(WindPySource(fake), start_dates, batch_size=batch_size, retries=2)
+    assert set(errors) == {'MISSING.WI'}
+    assert isinstance(errors['MISSING.WI'], WindFetchError)
+    for symbol, frame in expected.items():
+        assert frames[symbol].equals(frame)
+
+
+def test_transient_failures_are_retried(expected):
+    fake = FakeWindPy(DATA_DIR, failure_rate=0.3, seed=3)
+    frames, errors = _collect(WindPySource(fake), {'AUFI.WI': START, 'AGFI.WI': START},
+                              batch_size=1, max_workers=2, retries=10)
+    assert not errors
+    assert fake.calls > 2  # 至少有一次请求失败后重试
+    for symbol, frame in expected.items():
+        assert frames[symbol].equals(frame)
+
+
+def test_exhausted_retries_only_affect_that_symbol(expected):
+    class FlakyAgfi(FakeWindPy):
+        """AGFI.WI的请求总是失败"""
+        def wsd(self, codes, fields, beginTime, endTime, options=""):
+            if 'AGFI.WI' in codes.split(','):
+                self.calls += 1
+                return self._error(-40520007, "模拟网络错误")
+            return super().wsd(codes, fields, beginTime, endTime, options)
+
+    fake = FlakyAgfi(DATA_DIR)
+    frames, errors = _collect(WindPySource(fake), {'AUFI.WI': START, 'AGFI.WI': START},
+                              batch_size=2, retries=2)
+    assert set(errors) == {'AGFI.WI'} and set(frames) == {'AUFI.WI'}
+    assert frames['AUFI.WI'].equals(expected['AUFI.WI'])
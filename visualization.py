@@ -1,4 +1,91 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_pdf import PdfPages
+
+from data_handler import DataHandler
+from strategy_core import TradingStrategyCore
+from backtest_engine import BacktestEngine
+from strategy_result import ACTION_BUY, ACTION_SELL
+from instrumentation import instrument, symbol_from_path
+
+DEFAULT_MAX_POINTS = 2000  # 每条曲线绘制的最大点数
+OUTPUT_FORMATS = ('png', 'svg', 'pdf')
+
+
+def lttb_indices(x, y, n_out):
+    """Largest-Triangle-Three-Buckets降采样，返回保留点的下标
+
+    首尾点固定保留，其余点均分为n_out-2个桶，每个桶保留与上一个保留点、
+    下一个桶均值构成三角形面积最大的点，保留曲线的峰谷形态。
+    """
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            avg_x = x[hi:edges[i + 2]].mean()
+            avg_y = y[hi:edges[i + 2]].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, n_out):
+    """按桶保留最小值与最大值点的降采样(整块数组运算)，返回排序后的下标"""
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    n_buckets = n_out // 2
+    size = -(-n // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    valid = ~np.all(np.isnan(buckets), axis=1)
+    base = np.arange(n_buckets)[valid] * size
+    lows = base + np.nanargmin(buckets[valid], axis=1)
+    highs = base + np.nanargmax(buckets[valid], axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample_indices(dates, values, max_points=DEFAULT_MAX_POINTS, method='lttb'):
+    """选择绘图保留点；method为'lttb'、'minmax'或None(不降采样)"""
+    if method is None or max_points is None or len(values) <= max_points:
+        return np.arange(len(values))
+    if method == 'minmax':
+        return minmax_indices(values, max_points)
+    if method == 'lttb':
+        return lttb_indices(np.asarray(dates).astype('datetime64[us]').astype(np.int64), values, max_points)
+    raise ValueError(f"不支持的降采样方法: {method}")
+
+
+def position_steps(dates, position, max_points=None):
+    """持仓只在变化点取值，返回阶梯图所需的(日期, 持仓)，与逐K线持仓完全一致
+
+    变化点多于max_points时(超出图像分辨率)改为按桶保留持仓的最小值与最大值。
+    """
+    if len(position) == 0:
+        return dates, position
+    changes = np.flatnonzero(np.diff(position)) + 1
+    if max_points is not None and len(changes) + 2 > max_points:
+        idx = minmax_indices(position, max_points)
+    else:
+        idx = np.concatenate(([0], changes, [len(position) - 1]))
+    return dates[idx], position[idx]
+
 
 class StrategyVisualizer:
     """Visualization module for trading strategy results.
@@ -6,76 +93,199 @@ class StrategyVisualizer:
     Generates plots showing price series, technical indicators, trading signals,
     and performance metrics. Uses matplotlib for rendering.
 
+    With output_dir set the visualizer is headless: figures are drawn on Agg
+    canvases without pyplot and written as PNG/SVG files, or as one multi-page
+    PDF. Long series are downsampled (LTTB or min/max buckets) to max_points
+    and positions are drawn as step regions from their change points.
+
     Attributes:
         strategy: Reference to strategy core instance
         dates: Array of dates for x-axis
         prices: Array of price data for plotting
         signals: Array of trading signals
+        output_dir: Directory for rendered files, None for interactive windows
+        fmt: Output format, one of OUTPUT_FORMATS
+        max_points: Maximum points drawn per line, None to draw every bar
+        downsample: Downsampling method, 'lttb', 'minmax' or None
     """
-    def __init__(self, strategy_core, data_handler):
+    FIGSIZE = (14, 7)
+
+    def __init__(self, strategy_core, data_handler, output_dir=None, fmt='png',
+                 max_points=DEFAULT_MAX_POINTS, downsample='lttb', name=None):
+        if fmt not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {fmt}")
         self.strategy = strategy_core
         self.data_handler = data_handler
+        self.output_dir = output_dir
+        self.fmt = fmt
+        self.max_points = max_points
+        self.downsample = downsample
+        self.name = name or strategy_core.indicator_name
+        self._pdf = None
+
+    @property
+    def headless(self):
+        return self.output_dir is not None
 
     def plot_price_indicator(self):
         """绘制价格和指标趋势图"""
         if self.strategy.processed_data is None:
             return
+        fig, ax = self._new_figure()
         dates = self.data_handler.dates
         close_prices = self.strategy.processed_data['Close']
         ewma = self.strategy.processed_data[self.strategy.indicator_name]
-        plt.figure(figsize=(14, 7))
-        plt.plot(dates, close_prices, label='Price')
-        plt.plot(dates, ewma, label=self.strategy.indicator_name)
-        plt.title(f'Price and {self.strategy.indicator_name} Trend')
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
+        # 价格与指标共用同一组保留点，保证两条曲线对齐
+        idx = downsample_indices(dates, close_prices, self.max_points, self.downsample)
+        ax.plot(dates[idx], close_prices[idx], label='Price')
+        if getattr(self.strategy, 'indicator_overlay', True):
+            ax.plot(dates[idx], ewma[idx], label=self.strategy.indicator_name)
+            ax.legend()
+        else:
+            # 与价格量纲不同的指标(如RSI)使用右侧纵轴
+            indicator_ax = ax.twinx()
+            indicator_ax.plot(dates[idx], ewma[idx], label=self.strategy.indicator_name, color='C1')
+            handles = ax.get_legend_handles_labels()
+            indicator_handles = indicator_ax.get_legend_handles_labels()
+            ax.legend(handles[0] + indicator_handles[0], handles[1] + indicator_handles[1])
+        ax.set_title(f'Price and {self.strategy.indicator_name} Trend')
+        return self._finish(fig, 'price')
 
     def plot_returns_signals(self):
         """绘制收益和交易信号图"""
         if self.strategy.processed_data is None:
             return
+        fig, ax = self._new_figure()
         dates = self.data_handler.dates
-        action_states = self.strategy.processed_data['ActionStates']
+        action_states = self.strategy.processed_data.action
         cumulative_returns = self.strategy.processed_data['CumulativeReturn']
-        
+
         # 确保数据长度一致
         min_len = min(len(dates), len(cumulative_returns), len(action_states))
         dates = dates[:min_len]
         cumulative_returns = cumulative_returns[:min_len]
         action_states = action_states[:min_len]
-        
-        plt.figure(figsize=(14, 7))
-        plt.plot(dates, cumulative_returns, label='Strategy Returns', color='green')
-        buy_mask = action_states == 'buy'
-        sell_mask = action_states == 'sell'
-        plt.scatter(dates[buy_mask], cumulative_returns[buy_mask],
+
+        idx = downsample_indices(dates, cumulative_returns, self.max_points, self.downsample)
+        ax.plot(dates[idx], cumulative_returns[idx], label='Strategy Returns', color='green')
+        # 买卖点只在信号处绘制，不参与降采样
+        buy_mask = action_states == ACTION_BUY
+        sell_mask = action_states == ACTION_SELL
+        ax.scatter(dates[buy_mask], cumulative_returns[buy_mask],
                    marker='o', color='red', s=30, label='Buy')
-        plt.scatter(dates[sell_mask], cumulative_returns[sell_mask],
+        ax.scatter(dates[sell_mask], cumulative_returns[sell_mask],
                    marker='o', color='lime', s=30, label='Sell')
-        plt.title('Cumulative Returns with Trading Signals')
-        plt.legend()
-        plt.tight_layout()
-        plt.show()
+        ax.set_title('Cumulative Returns with Trading Signals')
+        ax.legend(loc='upper left')  # 信号点很多时loc='best'的搜索很慢
+        return self._finish(fig, 'returns')
 
     def plot_positions(self):
-        """绘制持仓图"""
+        """绘制持仓图(按持仓变化点绘制阶梯区域)"""
         if self.strategy.processed_data is None:
             return
-        dates = self.data_handler.dates
-        position = self.strategy.processed_data['Position']
-        plt.figure(figsize=(14, 7))
-        plt.scatter(dates, position, label='Position', color='blue', s=1)
-        plt.axhline(0, color='gray', linestyle='--')
-        plt.title('Position Holding')
-        plt.legend()
-        plt.grid(axis='y')
-        plt.yticks([0, 1])
-        plt.tight_layout()
-        plt.show()
+        fig, ax = self._new_figure()
+        dates, position = position_steps(self.data_handler.dates,
+                                         self.strategy.processed_data['Position'],
+                                         self.max_points if self.downsample else None)
+        ax.step(dates, position, where='post', label='Position', color='blue', linewidth=0.8)
+        ax.fill_between(dates, position, step='post', color='blue', alpha=0.2)
+        ax.axhline(0, color='gray', linestyle='--')
+        ax.set_title('Position Holding')
+        ax.legend(loc='upper left')
+        ax.grid(axis='y')
+        ax.set_yticks([-1, 0, 1] if (position < 0).any() else [0, 1])
+        return self._finish(fig, 'positions')
 
+    @instrument('StrategyVisualizer.plot_results',
+                symbol=lambda self: symbol_from_path(getattr(self.data_handler, 'data_path', None)),
+                rows=lambda result, self: len(self.data_handler.dates))
     def plot_results(self):
-        """一次性绘制所有图表"""
-        self.plot_price_indicator()
-        self.plot_returns_signals()
-        self.plot_positions()
+        """一次性绘制所有图表
+
+        Returns:
+            list: 无界面模式下写入的文件路径
+        """
+        if self.headless:
+            os.makedirs(self.output_dir, exist_ok=True)
+        if self.headless and self.fmt == 'pdf':
+            # 全部图表写入同一个多页PDF
+            path = os.path.join(self.output_dir, f'{self.name}.pdf')
+            with PdfPages(path) as self._pdf:
+                self.plot_price_indicator()
+                self.plot_returns_signals()
+                self.plot_positions()
+            self._pdf = None
+            return [path]
+        paths = [self.plot_price_indicator(), self.plot_returns_signals(), self.plot_positions()]
+        return [path for path in paths if path is not None]
+
+    def _new_figure(self):
+        if self.headless:
+            # 不经过pyplot，直接使用Agg画布，不打开窗口也不依赖全局后端
+            fig = Figure(figsize=self.FIGSIZE)
+        else:
+            fig = plt.figure(figsize=self.FIGSIZE)
+        return fig, fig.add_subplot()
+
+    @instrument('StrategyVisualizer.render')
+    def _finish(self, fig, suffix):
+        """显示或保存图表，返回写入的文件路径"""
+        fig.tight_layout()
+        if not self.headless:
+            plt.show()
+            return None
+        if self._pdf is not None:
+            self._pdf.savefig(fig)
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f'{self.name}_{suffix}.{self.fmt}')
+        fig.savefig(path)
+        return path
+
+
+def render_run(task):
+    """单次回测并写出图表(进程池任务)
+
+    Args:
+        task (tuple): (name, data_path, file_type, start_date, end_date, strategy_type,
+                       params, output_dir, fmt, max_points)
+    Returns:
+        list: 写入的文件路径
+    """
+    (name, data_path, file_type, start_date, end_date, strategy_type,
+     params, output_dir, fmt, max_points) = task
+    data_loader = DataHandler(data_path, file_type=file_type)
+    data_loader.preprocess_data(start_date=start_date, end_date=end_date)
+    strategy = TradingStrategyCore(data_loader, strategy_type=strategy_type, **params)
+    strategy.generate_signals()
+    BacktestEngine(strategy).run_backtest()
+    visualizer = StrategyVisualizer(strategy, data_loader, output_dir=output_dir, fmt=fmt,
+                                    max_points=max_points, name=name)
+    return visualizer.plot_results()
+
+
+def render_reports(runs, output_dir, fmt='pdf', start_date=None, end_date=None,
+                   file_type='parquet', max_points=DEFAULT_MAX_POINTS, max_workers=None):
+    """并行渲染多个品种或多组参数的报告
+
+    Args:
+        runs (Iterable[tuple]): (name, data_path, strategy_type, params)，
+            多品种时每个品种一项，参数扫描时同一文件的每组参数一项
+        output_dir (str): 输出目录
+        fmt (str): 'png'、'svg'或'pdf'(每项一个多页PDF)
+        max_workers (int): 进程数，默认使用全部CPU核心；为1时在当前进程内串行执行
+    Returns:
+        dict: name -> 写入的文件路径列表
+    """
+    tasks = [
+        (name, data_path, file_type, start_date, end_date, strategy_type,
+         params, output_dir, fmt, max_points)
+        for name, data_path, strategy_type, params in runs
+    ]
+    if max_workers == 1:
+        results = list(map(render_run, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            results = list(executor.map(render_run, tasks))
+    return {task[0]: paths for task, paths in zip(tasks, results)}
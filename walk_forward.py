@@ -0,0 +1,154 @@
+import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import polars as pl
+
+from strategy_core import TradingStrategyCore
+from backtest_engine import BacktestEngine
+from parameter_sweep import ParameterSweep, summarize_runs
+
+# 进程池中每个工作进程持有的数据(由initializer设置一次，各fold只传行号)
+_WORKER_STATE = {}
+
+
+def _init_worker(data_handler, strategy_type, spans, metric):
+    """工作进程初始化：保存共享数据与优化设置"""
+    _WORKER_STATE.update(data=data_handler, strategy_type=strategy_type,
+                         spans=spans, metric=metric)
+
+
+def run_fold(fold):
+    """执行单个fold：样本内选参，样本外评估(进程池任务)
+
+    Args:
+        fold (tuple): (fold_id, train_start, test_start, test_end) 行号区间
+    Returns:
+        dict: fold结果，含样本外每日收益
+    """
+    fold_id, train_start, test_start, test_end = fold
+    data = _WORKER_STATE['data']
+    strategy_type = _WORKER_STATE['strategy_type']
+    metric = _WORKER_STATE['metric']
+
+    # 样本内：批量扫描全部span并按指标选优
+    train = data.window(train_start, test_start)
+    table = ParameterSweep(train, strategy_type).run(_WORKER_STATE['spans'])
+    scores = np.nan_to_num(table[metric].to_numpy(), nan=-np.inf)
+    best = int(np.argmax(scores))
+    best_span = int(table['span'][best])
+
+    # 样本外：从样本内起点开始计算以保留指标预热与持仓，只统计测试区间；
+    # 多取一根K线使测试区间最后一天的收益得以计算
+    stop = min(test_end + 1, len(data.dates))
+    strategy = TradingStrategyCore(data.window(train_start, stop),
+                                   strategy_type=strategy_type, span=best_span)
+    strategy.generate_signals()
+    result = BacktestEngine(strategy).run_backtest()
+    offset = test_start - train_start
+    length = test_end - test_start
+    test_returns = result['StrategyReturn'][offset:offset + length]
+    test_position = result['Position'][offset:offset + length]
+    test_metrics = summarize_runs(test_position[None], test_returns[None],
+                                  np.cumprod(1 + test_returns)[None])
+
+    return {
+        'Fold': fold_id,
+        'TrainStart': data.dates[train_start].item(),
+        'TrainEnd': data.dates[test_start - 1].item(),
+        'TestStart': data.dates[test_start].item(),
+        'TestEnd': data.dates[test_end - 1].item(),
+        'BestSpan': best_span,
+        f'InSample{metric}': float(table[metric][best]),
+        **{f'OutOfSample{name}': value[0] for name, value in test_metrics.items()},
+        'Dates': data.dates[test_start:test_end],
+        'StrategyReturn': test_returns
+    }
+
+
+class WalkForwardOptimizer:
+    """Walk-forward optimization of the EWMA span.
+
+    Splits the preprocessed data of one DataHandler into in-sample/out-of-sample
+    folds (rolling or anchored), picks the best span in-sample with a batched
+    ParameterSweep and scores it out-of-sample. Folds slice the already-loaded
+    arrays as zero-copy views and run in parallel worker processes.
+
+    Attributes:
+        data_handler: Preprocessed DataHandler instance
+        strategy_type: 'EWMA' or 'EWMA_LONG_ONLY'
+        spans: Candidate EWMA spans
+        metric: Sweep metric column used to rank spans in-sample
+        folds: Per-fold result table after run()
+        oos_equity: Stitched out-of-sample returns and equity curve after run()
+    """
+    def __init__(self, data_handler, spans, strategy_type='EWMA', metric='Sharpe'):
+        self.data_handler = data_handler
+        self.spans = list(spans)
+        self.strategy_type = strategy_type
+        self.metric = metric
+        self.folds = None
+        self.oos_equity = None
+
+    def split(self, train_size, test_size, step=None, anchored=False):
+        """生成fold行号区间
+
+        Args:
+            train_size (int): 样本内长度(锚定模式下为首个fold的样本内长度)
+            test_size (int): 样本外长度
+            step (int): 相邻fold的滚动步长，默认等于test_size
+            anchored (bool): True时样本内起点固定在第0行
+        Returns:
+            list: [(fold_id, train_start, test_start, test_end), ...]
+        """
+        n = len(self.data_handler.dates)
+        step = step or test_size
+        folds = []
+        test_start = train_size
+        while test_start < n:
+            test_end = min(test_start + test_size, n)
+            train_start = 0 if anchored else test_start - train_size
+            folds.append((len(folds), train_start, test_start, test_end))
+            test_start += step
+        return folds
+
+    def run(self, train_size, test_size, step=None, anchored=False, max_workers=None):
+        """执行滚动/锚定前推分析
+
+        Args:
+            max_workers (int): 进程数，默认使用全部CPU核心；为1时在当前进程内串行执行
+        Returns:
+            pl.DataFrame: 每个fold一行的结果表
+        """
+        folds = self.split(train_size, test_size, step=step, anchored=anchored)
+        if not folds:
+            raise ValueError("数据长度不足以划分样本内/样本外区间")
+        # 只向工作进程传递数组，不传原始DataFrame
+        shared = self.data_handler.window(0, len(self.data_handler.dates))
+        shared.raw_data = None
+        init_args = (shared, self.strategy_type, self.spans, self.metric)
+
+        if max_workers == 1:
+            _init_worker(*init_args)
+            results = list(map(run_fold, folds))
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                     mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=_init_worker, initargs=init_args) as executor:
+                results = list(executor.map(run_fold, folds))
+
+        self.folds = pl.DataFrame([
+            {k: v for k, v in r.items() if k not in ('Dates', 'StrategyReturn')}
+            for r in results
+        ])
+        # 拼接样本外收益(步长小于test_size时区间重叠，保留较早fold的结果)
+        dates = np.concatenate([r['Dates'] for r in results])
+        returns = np.concatenate([r['StrategyReturn'] for r in results])
+        _, first = np.unique(dates, return_index=True)
+        dates, returns = dates[first], returns[first]
+        self.oos_equity = pl.DataFrame({
+            'Date': dates,
+            'StrategyReturn': returns,
+            'CumulativeReturn': np.cumprod(1 + returns)
+        })
+        return self.folds
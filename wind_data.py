@@ -9,14 +9,21 @@ Wind金融数据获取与存储模块(Parquet版本)
 - 从Wind获取AG(T+D)和AU(T+D)的OHLC等市场数据
 - 数据存储到本地Parquet文件
 - 支持增量更新数据
-- 支持多品种并行处理
+- 支持多品种分批并发获取(失败重试，单品种错误不影响其他品种)
 """
 
 from datetime import datetime, timedelta
+import json
 import os
-import re
 import polars as pl
-from WindPy import w
+import pyarrow.parquet as pq
+
+from wind_source import WindPySource, WindFetchError, clean_symbol_name, fetch_many
+from result_cache import invalidate_source
+from market_store import MarketDataStore, DEFAULT_STORE_DIR, normalize_frame
+from data_handler import DELTA_DIR, dataset_files
+import instrumentation
+from instrumentation import instrument
 
 # 配置参数
 SYMBOLS = [
@@ -38,6 +45,9 @@ SYMBOLS = [
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")  # 数据存储目录
 DEFAULT_START_DATE = datetime(1990, 1, 1).date()  # 默认起始日期
+MANIFEST_PATH = os.path.join(DATA_DIR, "_manifest.json")  # 各品种最后日期等元数据
+COMPACT_THRESHOLD = 50  # 增量分片数(及合并存储的分片数)超过该值时合并
+NUMERIC_COLS = ['open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt']
 
 def ensure_data_dir():
     """确保数据存储目录存在，如不存在则创建"""
@@ -45,35 +55,111 @@ def ensure_data_dir():
 
 def get_parquet_path(symbol):
     """获取Parquet文件路径"""
-    clean_symbol = re.sub(r'[^\w]', '_', symbol)
-    return os.path.join(DATA_DIR, f"{clean_symbol}.parquet")
+    return os.path.join(DATA_DIR, f"{clean_symbol_name(symbol)}.parquet")
 
-def fetch_wind_data(symbol, start_date, end_date):
-    """从Wind API获取指定品种的市场数据"""
+def fetch_wind_data(symbol, start_date, end_date, source=None):
+    """从Wind API获取指定品种的市场数据，失败时抛出WindFetchError"""
     print(f"正在获取 {symbol} 数据({start_date} 至 {end_date})...")
-    data = w.wsd(
-        symbol,
-        "open,high,low,close,settle,volume,oi,amt",
-        start_date.strftime("%Y-%m-%d"),
-        end_date.strftime("%Y-%m-%d"),
-        "unit=1"
-    )
-    if data.ErrorCode != 0:
-        print(f"警告: {symbol} 数据获取错误 - {data.Data[0][0]}")
+    source = source or WindPySource()
+    return source.fetch([symbol], start_date, end_date)[symbol]
+
+def load_manifest():
+    """读取元数据清单"""
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    """原子写入元数据清单"""
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+def files_signature(paths):
+    """数据文件签名(文件名、大小、修改时间)，用于判断清单是否过期"""
+    return [[os.path.basename(p), os.path.getsize(p), os.stat(p).st_mtime_ns] for p in paths]
+
+def last_row_is_valid(row):
+    """单行数值列是否全部非空且非NaN"""
+    return all(row.get(col) is not None and row[col] == row[col] for col in NUMERIC_COLS)
+
+def scan_symbol_meta(paths):
+    """从Parquet尾部元数据与最后一个行组获取最后日期与最后一行有效性(不读取全部历史)"""
+    last_file = pq.ParquetFile(paths[-1])
+    meta = last_file.metadata
+    if meta.num_rows == 0:
         return None
-    
-    return pl.DataFrame({
-        "date": [d.strftime('%Y-%m-%d') for d in data.Times],
-        **{field.lower(): values for field, values in zip(data.Fields, data.Data)}
-    })
+    last_group = last_file.read_row_group(meta.num_row_groups - 1)
+    last_row = last_group.slice(last_group.num_rows - 1).to_pylist()[0]
+    return {
+        'last_date': last_row['date'],
+        'last_row_valid': last_row_is_valid(last_row)
+    }
+
+def get_symbol_meta(symbol):
+    """获取品种元数据(优先读取清单，清单缺失或文件已变化时读取Parquet尾部)"""
+    parquet_path = get_parquet_path(symbol)
+    if not os.path.exists(parquet_path):
+        return None
+    paths = dataset_files(parquet_path)
+    signature = files_signature(paths)
+    manifest = load_manifest()
+    entry = manifest.get(clean_symbol_name(symbol))
+    if entry and entry.get('files') == signature:
+        return entry
+    entry = scan_symbol_meta(paths)
+    if entry is not None:
+        entry['files'] = signature
+        manifest[clean_symbol_name(symbol)] = entry
+        save_manifest(manifest)
+    return entry
+
+def record_symbol_meta(symbol, last_row):
+    """写入数据后按最后一行更新清单"""
+    paths = dataset_files(get_parquet_path(symbol))
+    manifest = load_manifest()
+    manifest[clean_symbol_name(symbol)] = {
+        'last_date': last_row['date'],
+        'last_row_valid': last_row_is_valid(last_row),
+        'files': files_signature(paths)
+    }
+    save_manifest(manifest)
 
 def get_last_date(symbol):
-    """从Parquet文件中获取最后交易日"""
+    """获取最后交易日(来自清单或Parquet尾部元数据)"""
+    meta = get_symbol_meta(symbol)
+    if meta is None:
+        return None
+    return datetime.strptime(meta['last_date'], '%Y-%m-%d').date()
+
+def append_symbol_part(symbol, new_data):
+    """将新数据写为增量分片，不改写已有历史"""
+    delta_dir = os.path.join(DATA_DIR, DELTA_DIR, clean_symbol_name(symbol))
+    os.makedirs(delta_dir, exist_ok=True)
+    parts = dataset_files(get_parquet_path(symbol))[1:]
+    numbers = [int(os.path.basename(p)[5:-8]) for p in parts]
+    part_path = os.path.join(delta_dir, f"part-{max(numbers, default=-1) + 1:05d}.parquet")
+    new_data.write_parquet(part_path)
+    if len(parts) + 1 > COMPACT_THRESHOLD:
+        compact_symbol_data(symbol)
+
+def compact_symbol_data(symbol):
+    """将增量分片合并回主文件"""
     parquet_path = get_parquet_path(symbol)
-    if os.path.exists(parquet_path):
-        df = pl.read_parquet(parquet_path)
-        return datetime.strptime(df["date"].max(), '%Y-%m-%d').date()
-    return None
+    paths = dataset_files(parquet_path)
+    if len(paths) <= 1:
+        return
+    combined_data = pl.read_parquet(paths).unique("date", keep='last').sort("date")
+    combined_data.write_parquet(parquet_path)
+    for path in paths[1:]:
+        os.remove(path)
+    record_symbol_meta(symbol, combined_data.tail(1).to_dicts()[0])
+    print(f"{symbol} 已合并{len(paths) - 1}个增量分片")
 
 def preprocess_dataframe(df):
     """预处理数据框，删除除date列外全为NULL或NaN的行"""
@@ -86,67 +172,94 @@ def preprocess_dataframe(df):
     ])
     return df.filter(~null_or_nan_condition)
 
-def update_symbol_data(symbol, end_date):
-    """更新指定品种的市场数据(增量版本)"""
+def plan_update(symbol, end_date):
+    """计算品种需要获取的起始日期，已是最新时返回None"""
     if not isinstance(end_date, datetime) and not str(type(end_date)) == "<class 'datetime.date'>":
         raise ValueError("end_date必须是日期类型")
-        
+
     last_date = get_last_date(symbol)
-    start_date = last_date + timedelta(days=1) if last_date else DEFAULT_START_DATE
-    parquet_path = get_parquet_path(symbol)
-    
     if last_date and end_date <= last_date:
         print(f"{symbol} 数据已是最新(已有数据至{last_date})")
-        return
-    
-    new_data = fetch_wind_data(symbol, start_date, end_date)
+        return None
+    return last_date + timedelta(days=1) if last_date else DEFAULT_START_DATE
+
+@instrument('wind.store_symbol_data', symbol=lambda symbol, *args: clean_symbol_name(symbol),
+            rows=lambda result, symbol, new_data, *args: new_data.height)
+def store_symbol_data(symbol, new_data, end_date, store_batch=None):
+    """清洗获取到的数据并追加写入(新数据写为增量分片)
+
+    Args:
+        store_batch (list): 指定时新数据只加入该列表，由append_to_store统一写入合并存储；
+            默认立即追加(单品种更新)
+    """
+    last_date = get_last_date(symbol)
+    parquet_path = get_parquet_path(symbol)
     # 修改类型转换逻辑，添加错误处理
     new_data = new_data.with_columns([
         pl.col(col).cast(pl.Float64, strict=False).alias(col)
-        for col in ['open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt']
+        for col in NUMERIC_COLS
     ])
     
     new_data = preprocess_dataframe(new_data)
-    
+    if last_date:
+        # 只追加晚于已有数据的日期，保证历史文件无需改写
+        new_data = new_data.filter(pl.col("date") > last_date.strftime('%Y-%m-%d'))
+    new_data = new_data.unique("date", keep='last').sort("date")
+    if new_data.is_empty():
+        print(f"{symbol} 没有新的有效数据")
+        return
+
     if os.path.exists(parquet_path):
-        existing_data = pl.read_parquet(parquet_path)
-        combined_data = pl.concat([existing_data, new_data]) \
-                        .unique("date") \
-                        .sort("date")
+        append_symbol_part(symbol, new_data)
     else:
-        combined_data = new_data
-
-    combined_data.write_parquet(parquet_path)
+        new_data.write_parquet(parquet_path)
+    record_symbol_meta(symbol, new_data.tail(1).to_dicts()[0])
+    invalidate_source(parquet_path)  # 文件已改写，清除基于旧数据的缓存
+    # 已建立合并存储时同步追加新数据
+    store_frame = normalize_frame(new_data, clean_symbol_name(symbol))
+    if store_batch is not None:
+        store_batch.append(store_frame)
+    else:
+        append_to_store([store_frame])
     print(f"{symbol} 数据已成功更新至 {end_date}")
 
-def pre_update_validation(symbol):
-    """更新前校验最后一行数据完整性"""
-    parquet_path = get_parquet_path(symbol)
-    if not os.path.exists(parquet_path):
+def append_to_store(frames):
+    """将一次更新中各品种的新数据作为一个分片追加到合并存储(未建立存储时跳过)"""
+    if not frames or not os.path.isdir(DEFAULT_STORE_DIR):
         return
-    
-    df = pl.read_parquet(parquet_path)
-    if df.is_empty():
+    MarketDataStore(DEFAULT_STORE_DIR).append(pl.concat(frames), compact_threshold=COMPACT_THRESHOLD)
+
+def update_symbol_data(symbol, end_date, source=None):
+    """更新指定品种的市场数据(增量版本，新数据写为增量分片)"""
+    start_date = plan_update(symbol, end_date)
+    if start_date is None:
         return
-    # 只检查数值列
-    numeric_cols = ['open','high','low','close','settle','volume','oi','amt']
-    # 转换数值列类型
-    df = df.with_columns([
-        pl.col(col).cast(pl.Float64, strict=False)
-        for col in numeric_cols
-    ])
-    
-    last_row = df.tail(1)
-    # 只检查数值列是否有空值
-    has_invalid = last_row.select(
-        pl.any_horizontal([pl.col(col).is_null() | pl.col(col).is_nan() for col in numeric_cols])
-    ).item()
-    
-    if has_invalid:
+    try:
+        new_data = fetch_wind_data(symbol, start_date, end_date, source)
+    except WindFetchError as exc:
+        print(f"警告: {exc}")
+        return
+    store_symbol_data(symbol, new_data, end_date)
+
+@instrument('wind.pre_update_validation', symbol=lambda symbol: clean_symbol_name(symbol))
+def pre_update_validation(symbol):
+    """更新前校验最后一行数据完整性(依据清单，仅在需要清理时读取最后一个文件)"""
+    meta = get_symbol_meta(symbol)
+    if meta is None:
+        return
+
+    if not meta['last_row_valid']:
         print(f"发现{symbol}最后交易日数据不完整，正在清理...")
-        cleaned_df = df.head(-1)
-        cleaned_df.write_parquet(parquet_path)
-        new_last_date = cleaned_df["date"].max()
+        # 最后一行位于最新的分片(或主文件)中，只改写该文件
+        last_path = dataset_files(get_parquet_path(symbol))[-1]
+        cleaned_df = pl.read_parquet(last_path).head(-1)
+        if cleaned_df.is_empty() and last_path != get_parquet_path(symbol):
+            os.remove(last_path)
+        else:
+            cleaned_df.write_parquet(last_path)
+        invalidate_source(get_parquet_path(symbol))
+        new_meta = get_symbol_meta(symbol)
+        new_last_date = new_meta['last_date'] if new_meta else None
         print(f"已清理空值，最新有效数据日期：{new_last_date}")
     else:
         print(f"{symbol} 最新数据校验通过")
@@ -158,24 +271,48 @@ def validate_date_input(date_str):
     except ValueError:
         return None
 
-def main(end_date):
-    """主执行函数"""
-    if not w.start():
-        print("WindPy启动失败")
-        return
-    if not w.isconnected():
-        print("WindPy连接未建立")
+def main(end_date, source=None, batch_size=10, max_workers=8):
+    """主执行函数
+
+    Args:
+        end_date (datetime.date): 截止日期
+        source: 数据源，默认WindPySource()；可传入WindPySource(FakeWindPy(...))离线运行
+        batch_size (int): 每次请求的品种数
+        max_workers (int): 并发请求数
+    """
+    source = source or WindPySource()
+    try:
+        source.start()
+    except WindFetchError as exc:
+        print(exc)
         return
         
     ensure_data_dir()
     # 先执行数据校验
     for symbol in SYMBOLS:
         pre_update_validation(symbol)            
-    # 再执行数据更新
+    # 再分批并发获取，获取完成的品种在主线程中依次写入
+    start_dates = {}
     for symbol in SYMBOLS:
-        update_symbol_data(symbol, end_date)
+        start_date = plan_update(symbol, end_date)
+        if start_date is not None:
+            start_dates[symbol] = start_date
+    failed = []
+    store_batch = []  # 各品种的新数据在全部写入后一次追加到合并存储
+    for symbol, new_data, error in fetch_many(source, start_dates, end_date,
+                                              batch_size=batch_size, max_workers=max_workers):
+        if error is not None:
+            print(f"警告: {error}")
+            failed.append(symbol)
+            continue
+        store_symbol_data(symbol, new_data, end_date, store_batch)
+    append_to_store(store_batch)
+    if failed:
+        print(f"以下品种获取失败，可稍后重新运行: {failed}")
         
-    w.stop()
+    source.stop()
+    if instrumentation.is_enabled():
+        instrumentation.export(os.path.join(DATA_DIR, "wind_update_profile"))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+行情数据源与并发批量获取
+
+数据源接口(WindPySource)包装WindPy的w对象，也可包装FakeWindPy——
+以本地Parquet文件模拟w.wsd的替身，无需Wind终端即可驱动测试与基准。
+
+fetch_many将品种按起始日期分组、分批，通过有界线程池并发请求，
+失败时按指数退避重试；整批仍失败时拆分为单品种请求，单个品种的错误
+只记录在errors中，不影响其他品种。
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from types import SimpleNamespace
+import polars as pl
+
+from instrumentation import stage
+
+WIND_FIELDS = ('open', 'high', 'low', 'close', 'settle', 'volume', 'oi', 'amt')
+
+
+class WindFetchError(Exception):
+    """行情获取失败"""
+
+
+def clean_symbol_name(symbol):
+    """品种代码转为文件名(合并存储中的品种名与之相同)"""
+    return re.sub(r'[^\w]', '_', symbol)
+
+
+class WindPySource:
+    """WindPy-compatible data source.
+
+    Wraps an object with the WindPy ``w`` interface (start/isconnected/stop/wsd).
+    A single symbol is fetched with one wsd call for all fields; a batch of
+    symbols uses one wsd call per field, since wsd only accepts several codes
+    together with a single field.
+
+    Attributes:
+        w: WindPy ``w`` object or a stand-in such as FakeWindPy
+    """
+    def __init__(self, w=None):
+        if w is None:
+            from WindPy import w
+        self.w = w
+
+    def start(self):
+        """启动并检查连接，失败时抛出WindFetchError"""
+        if not self.w.start():
+            raise WindFetchError("WindPy启动失败")
+        if not self.w.isconnected():
+            raise WindFetchError("WindPy连接未建立")
+
+    def stop(self):
+        self.w.stop()
+
+    def fetch(self, symbols, start_date, end_date):
+        """获取一批品种在[start_date, end_date]内的行情
+
+        Returns:
+            dict: 品种代码 -> pl.DataFrame(date为'%Y-%m-%d'字符串及各行情列)
+        """
+        start, end = start_date.strftime("%Y-%m-%d"), end_date.strftime("%Y-%m-%d")
+        if len(symbols) == 1:
+            data = self._wsd(symbols[0], ",".join(WIND_FIELDS), start, end)
+            return {symbols[0]: pl.DataFrame({
+                "date": [d.strftime('%Y-%m-%d') for d in data.Times],
+                **{field.lower(): values for field, values in zip(data.Fields, data.Data)}
+            })}
+
+        dates = None
+        columns = {symbol: {} for symbol in symbols}
+        for field in WIND_FIELDS:
+            data = self._wsd(",".join(symbols), field, start, end)
+            dates = [d.strftime('%Y-%m-%d') for d in data.Times]
+            for code, values in zip(data.Codes, data.Data):
+                columns[code][field] = values
+        return {
+            symbol: pl.DataFrame({"date": dates, **columns[symbol]},
+                                 schema_overrides={f: pl.Float64 for f in WIND_FIELDS})
+            for symbol in symbols
+        }
+
+    def _wsd(self, codes, fields, start, end):
+        data = self.w.wsd(codes, fields, start, end, "unit=1")
+        if data.ErrorCode != 0:
+            raise WindFetchError(f"{codes} 数据获取错误 - {data.Data[0][0]}")
+        return data
+
+
+class FakeWindPy:
+    """Local file-backed stand-in for the WindPy ``w`` object.
+
+    Serves wsd requests from per-symbol Parquet files in data_dir (same layout
+    as data/, file name from clean_symbol_name). Optional latency per request
+    and a random failure rate emulate network round trips and transient errors.
+
+    Attributes:
+        data_dir: Directory holding <symbol>.parquet files
+        latency: Seconds slept per wsd call
+        failure_rate: Probability that a wsd call returns an error code
+        calls: Number of wsd calls served
+    """
+    def __init__(self, data_dir, latency=0.0, failure_rate=0.0, seed=0):
+        self.data_dir = data_dir
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        return True
+
+    def isconnected(self):
+        return True
+
+    def stop(self):
+        pass
+
+    def wsd(self, codes, fields, beginTime, endTime, options=""):
+        """与w.wsd相同的调用方式与返回结构(ErrorCode/Codes/Fields/Times/Data)"""
+        with self._lock:
+            self.calls += 1
+            failed = self._random.random() < self.failure_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if failed:
+            return self._error(-40520007, "模拟网络错误")
+
+        codes = codes.split(",")
+        fields = [f.lower() for f in fields.split(",")]
+        if len(codes) > 1 and len(fields) > 1:
+            return self._error(-40522003, "多品种请求只支持单个指标")
+        frames = {}
+        for code in codes:
+            frame = self._load(code)
+            if frame is None:
+                return self._error(-40522017, f"品种代码不存在: {code}")
+            frames[code] = frame.filter(pl.col('date').is_between(pl.lit(beginTime), pl.lit(endTime)))
+
+        # 多品种时按全部品种交易日的并集对齐，缺失为None
+        dates = pl.concat([f.select('date') for f in frames.values()]).unique().sort('date')
+        aligned = {code: dates.join(f, on='date', how='left') for code, f in frames.items()}
+        if len(codes) == 1:
+            data = [aligned[codes[0]][f].to_list() for f in fields]
+        else:
+            data = [aligned[code][fields[0]].to_list() for code in codes]
+        return SimpleNamespace(
+            ErrorCode=0, Codes=codes, Fields=[f.upper() for f in fields],
+            Times=[datetime.strptime(d, '%Y-%m-%d').date() for d in dates['date']],
+            Data=data)
+
+    def _load(self, code):
+        with self._lock:
+            if code not in self._frames:
+                path = os.path.join(self.data_dir, f"{clean_symbol_name(code)}.parquet")
+                self._frames[code] = pl.read_parquet(path) if os.path.exists(path) else None
+            return self._frames[code]
+
+    @staticmethod
+    def _error(code, message):
+        return SimpleNamespace(ErrorCode=code, Codes=[], Fields=[], Times=[], Data=[[message]])
+
+
+def fetch_with_retry(source, symbols, start_date, end_date, retries=3, backoff=0.5):
+    """带指数退避重试的单次批量请求"""
+    for attempt in range(retries + 1):
+        try:
+            with stage('wind.fetch', symbol=','.join(map(clean_symbol_name, symbols)), attempt=attempt) as s:
+                results = source.fetch(symbols, start_date, end_date)
+                s.rows = sum(frame.height for frame in results.values())
+            return results
+        except WindFetchError:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _fetch_batch(source, symbols, start_date, end_date, retries, backoff):
+    """获取一批品种；整批失败时逐个品种重试，返回(结果, 错误)"""
+    try:
+        return fetch_with_retry(source, symbols, start_date, end_date, retries, backoff), {}
+    except WindFetchError as exc:
+        if len(symbols) == 1:
+            return {}, {symbols[0]: exc}
+    results, errors = {}, {}
+    for symbol in symbols:
+        try:
+            results.update(fetch_with_retry(source, [symbol], start_date, end_date, retries, backoff))
+        except WindFetchError as exc:
+            errors[symbol] = exc
+    return results, errors
+
+
+def fetch_many(source, start_dates, end_date, batch_size=10, max_workers=8,
+               retries=3, backoff=0.5):
+    """并发批量获取多个品种的行情
+
+    Args:
+        source: 数据源(WindPySource)
+        start_dates (dict): 品种代码 -> 起始日期
+        end_date (datetime.date): 截止日期
+        batch_size (int): 每次请求的品种数(起始日期相同的品种才合并为一批)
+        max_workers (int): 并发请求数
+        retries (int): 每次请求失败后的重试次数
+        backoff (float): 首次重试前的等待秒数，之后逐次加倍
+    Yields:
+        tuple: (品种代码, pl.DataFrame或None, WindFetchError或None)，按请求完成顺序
+    """
+    groups = defaultdict(list)
+    for symbol, start_date in start_dates.items():
+        groups[start_date].append(symbol)
+    batches = [
+        (symbols[i:i + batch_size], start_date)
+        for start_date, symbols in groups.items()
+        for i in range(0, len(symbols), batch_size)
+    ]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_fetch_batch, source, symbols, start_date, end_date, retries, backoff)
+            for symbols, start_date in batches
+        ]
+        for future in as_completed(futures):
+            results, errors = future.result()
+            for symbol, frame in results.items():
+                yield symbol, frame, None
+            for symbol, exc in errors.items():
+                yield symbol, None, exc